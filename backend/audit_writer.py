@@ -0,0 +1,173 @@
+# audit_writer.py - Write-behind batching for audit inserts (log_queries, access_logs)
+
+import time
+import queue
+import sqlite3
+import atexit
+import threading
+from typing import Dict, Any, List, Tuple
+from config import Config
+from db_pool import ConnectionPool
+
+# INSERT statement per audit table
+AUDIT_TABLES = {
+    'log_queries': 'INSERT INTO log_queries (client_id, query, response, timestamp, executed_code) VALUES (?, ?, ?, ?, ?)',
+    'access_logs': 'INSERT INTO access_logs (client_id, accessed_resource, timestamp, ip_address) VALUES (?, ?, ?, ?)'
+}
+
+_STOP = object()
+
+def _is_locked(error: Exception) -> bool:
+    """True for SQLite busy/locked errors, which go away once the other writer finishes"""
+    return isinstance(error, sqlite3.OperationalError) and 'locked' in str(error)
+
+class AuditWriter:
+    """Queues audit rows and inserts them from a background thread in batches
+    
+    A batch is written in one transaction when it reaches AUDIT_BATCH_SIZE
+    rows or its oldest row is AUDIT_FLUSH_INTERVAL seconds old, so requests
+    never wait for a disk sync. When the queue (AUDIT_QUEUE_SIZE) is full,
+    submit() blocks for up to AUDIT_ENQUEUE_TIMEOUT seconds and then writes
+    the row itself rather than dropping it. Pending rows are flushed at exit.
+    
+    A batch that hits a locked database is retried AUDIT_WRITE_RETRIES times
+    with exponential backoff (AUDIT_RETRY_BACKOFF). A batch rejected for any
+    other reason is written row by row, so one bad row costs only itself;
+    rows that still cannot be written are counted as dropped.
+    """
+    
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        self._queue = queue.Queue(maxsize=Config.AUDIT_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {"queued": 0, "written": 0, "batches": 0, "sync_writes": 0, "errors": 0, "retries": 0, "dropped": 0}
+    
+    def submit(self, table: str, row: Tuple[Any, ...]):
+        """Queue one row for table (written synchronously when write-behind is disabled)"""
+        if not Config.AUDIT_WRITE_BEHIND:
+            self._write([(table, row)])
+            return
+        
+        self._ensure_started()
+        try:
+            self._queue.put((table, row), timeout=Config.AUDIT_ENQUEUE_TIMEOUT)
+            with self._lock:
+                self.stats["queued"] += 1
+        except queue.Full:
+            # Backpressure: the caller pays for its own write instead of losing it
+            with self._lock:
+                self.stats["sync_writes"] += 1
+            self._write([(table, row)])
+    
+    def flush(self, timeout: float = None) -> bool:
+        """Block until everything queued so far has been written
+        
+        Returns False when that did not happen within timeout seconds,
+        including time spent waiting for room in a full queue.
+        """
+        if self._thread is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(None if deadline is None else max(deadline - time.monotonic(), 0))
+    
+    def close(self):
+        """Flush pending rows and stop the writer thread"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+    
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+    
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = max(deadline - time.monotonic(), 0) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            
+            if item is _STOP or isinstance(item, threading.Event):
+                if batch:
+                    self._write(batch)
+                    batch = []
+                if item is _STOP:
+                    return
+                item.set()
+                continue
+            
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + Config.AUDIT_FLUSH_INTERVAL
+                batch.append(item)
+            
+            if batch and (len(batch) >= Config.AUDIT_BATCH_SIZE or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+    
+    def _write(self, batch: List[Tuple[str, Tuple[Any, ...]]]):
+        rows = {}
+        for table, row in batch:
+            rows.setdefault(table, []).append(row)
+        try:
+            self._insert(rows)
+            with self._lock:
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+            return
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            if _is_locked(e):
+                # Still locked after every retry; writing row by row would only wait longer
+                with self._lock:
+                    self.stats["dropped"] += len(batch)
+                print(f"[DEBUG] Audit write of {len(batch)} rows failed, rows dropped: {e}")
+                return
+            print(f"[DEBUG] Audit write of {len(batch)} rows failed, writing row by row: {e}")
+        
+        # One bad row must not take the rest of the batch with it
+        written = 0
+        for table, row in batch:
+            try:
+                self._insert({table: [row]})
+                written += 1
+            except Exception as e:
+                print(f"[DEBUG] Audit row for {table} dropped: {e}")
+        with self._lock:
+            self.stats["written"] += written
+            self.stats["dropped"] += len(batch) - written
+    
+    def _insert(self, rows: Dict[str, List[Tuple[Any, ...]]]):
+        """Insert rows in one transaction, backing off and retrying while the database is locked"""
+        for attempt in range(Config.AUDIT_WRITE_RETRIES + 1):
+            try:
+                with self.pool.transaction() as conn:
+                    for table, table_rows in rows.items():
+                        conn.executemany(AUDIT_TABLES[table], table_rows)
+                return
+            except sqlite3.OperationalError as e:
+                if attempt == Config.AUDIT_WRITE_RETRIES or not _is_locked(e):
+                    raise
+                with self._lock:
+                    self.stats["retries"] += 1
+                time.sleep(Config.AUDIT_RETRY_BACKOFF * 2 ** attempt)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "pending": self._queue.qsize()}
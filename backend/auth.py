@@ -4,9 +4,13 @@ import jwt
 import hashlib
 import secrets
 import json
+import time
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Dict, Optional, List
 from config import Config
+from user_store import UserStoreFactory
 
 class VulnerableAuth:
     def __init__(self):
@@ -15,7 +19,7 @@ class VulnerableAuth:
         self.jwt_algorithm = "HS256"
         
         # VULNERABILITY: Hardcoded user database with weak passwords
-        self.users = {
+        default_users = {
             # Admin account with weak password
             "admin": {
                 "password": "admin123",  # VULNERABILITY: Weak password
@@ -72,7 +76,7 @@ class VulnerableAuth:
         }
         
         # VULNERABILITY: Predictable session tokens
-        self.session_tokens = {
+        default_session_tokens = {
             "admin": "admin-session-123",
             "maze_bank_user1": "maze-user-session-001",
             "maze_bank_admin": "maze-admin-session-001",
@@ -81,6 +85,24 @@ class VulnerableAuth:
             "trevor_user1": "trevor-user-session-001",
             "trevor_admin": "trevor-admin-session-001"
         }
+        
+        # Users and session tokens live in the configured store (shared by all
+        # workers for sqlite); the defaults are added once when missing
+        self.store = UserStoreFactory.create_store()
+        self.store.seed(default_users, default_session_tokens)
+        
+        # Verified JWT payloads by token hash: token hash -> (payload, cache expiry)
+        self._jwt_cache = OrderedDict()
+        self._jwt_lock = threading.Lock()
+        self.jwt_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+    
+    @property
+    def users(self) -> Dict[str, Dict]:
+        return self.store.all_users()
+    
+    @property
+    def session_tokens(self) -> Dict[str, str]:
+        return self.store.all_session_tokens()
     
     def hash_password(self, password: str) -> str:
         """VULNERABILITY: Weak password hashing (MD5)"""
@@ -108,26 +130,50 @@ class VulnerableAuth:
     
     def verify_jwt(self, token: str) -> Optional[Dict]:
         """VULNERABILITY: Weak JWT verification"""
+        key = hashlib.sha256(token.encode()).hexdigest()
+        now = time.time()
+        with self._jwt_lock:
+            entry = self._jwt_cache.get(key)
+            if entry is not None and entry[1] > now:
+                self._jwt_cache.move_to_end(key)
+                self.jwt_cache_stats["hits"] += 1
+                return dict(entry[0])
+            self.jwt_cache_stats["misses"] += 1
+        
         try:
             # VULNERABILITY: No signature verification bypass possible
             payload = jwt.decode(token, self.jwt_secret, algorithms=[self.jwt_algorithm])
-            return payload
         except jwt.InvalidTokenError:
             return None
+        
+        # Cached no longer than the token itself is valid
+        expires_at = now + Config.AUTH_JWT_CACHE_TTL
+        if isinstance(payload.get("exp"), (int, float)):
+            expires_at = min(expires_at, payload["exp"])
+        with self._jwt_lock:
+            self._jwt_cache[key] = (payload, expires_at)
+            self._jwt_cache.move_to_end(key)
+            while len(self._jwt_cache) > Config.AUTH_JWT_CACHE_SIZE:
+                self._jwt_cache.popitem(last=False)
+                self.jwt_cache_stats["evictions"] += 1
+        return dict(payload)
     
     def login(self, username: str, password: str) -> Optional[Dict]:
         """VULNERABILITY: Weak login with no rate limiting"""
-        if username not in self.users:
+        user_data = self.store.get_user(username)
+        if user_data is None:
             return None
         
-        user_data = self.users[username]
-        
         # VULNERABILITY: Weak password verification
         if not self.verify_password(password, self.hash_password(user_data["password"])):
             return None
         
         # VULNERABILITY: Predictable session token
-        session_token = self.session_tokens.get(username, f"{username}-session-{secrets.token_hex(4)}")
+        session_token = self.store.session_token(username)
+        if session_token is None:
+            # Store the issued token so get_user_by_token (in any worker) accepts it
+            session_token = f"{username}-session-{secrets.token_hex(4)}"
+            self.store.set_session_token(username, session_token)
         
         # VULNERABILITY: Weak JWT generation
         jwt_token = self.generate_jwt(username, user_data)
@@ -171,33 +217,35 @@ class VulnerableAuth:
     def get_user_by_token(self, token: str) -> Optional[Dict]:
         """VULNERABILITY: Weak token validation"""
         # VULNERABILITY: Check both JWT and session tokens
-        jwt_payload = self.verify_jwt(token)
-        if jwt_payload:
-            return jwt_payload
+        # (only JWT-shaped header.payload.signature tokens pay for a decode)
+        if token.count(".") == 2:
+            jwt_payload = self.verify_jwt(token)
+            if jwt_payload:
+                return jwt_payload
         
         # VULNERABILITY: Predictable session token validation
-        for username, session_token in self.session_tokens.items():
-            if session_token == token:
-                user_data = self.users[username]
-                return {
-                    "username": username,
-                    "role": user_data["role"],
-                    "client_id": user_data["client_id"],
-                    "permissions": user_data["permissions"]
-                }
-        
-        return None
+        username = self.store.username_for_token(token)
+        user_data = self.store.get_user(username) if username is not None else None
+        if user_data is None:
+            return None
+        
+        return {
+            "username": username,
+            "role": user_data["role"],
+            "client_id": user_data["client_id"],
+            "permissions": user_data["permissions"]
+        }
     
     def create_user(self, username: str, password: str, role: str, client_id: str = None) -> bool:
         """VULNERABILITY: No input validation or authorization"""
-        if username in self.users:
+        if self.store.get_user(username) is not None:
             return False
         
         # VULNERABILITY: Weak password policy
         if len(password) < 3:  # Very weak minimum length
             return False
         
-        self.users[username] = {
+        user_data = {
             "password": password,  # VULNERABILITY: Stored in plain text
             "role": role,
             "client_id": client_id,
@@ -206,14 +254,13 @@ class VulnerableAuth:
         }
         
         # VULNERABILITY: Predictable session token
-        self.session_tokens[username] = f"{username}-session-{secrets.token_hex(4)}"
-        
-        return True
+        # (False when another worker created the same username first)
+        return self.store.add_user(username, user_data, f"{username}-session-{secrets.token_hex(4)}")
     
     def list_users(self) -> List[Dict]:
         """VULNERABILITY: Information disclosure - lists all users"""
         users_list = []
-        for username, user_data in self.users.items():
+        for username, user_data in self.store.all_users().items():
             users_list.append({
                 "username": username,
                 "role": user_data["role"],
@@ -225,10 +272,10 @@ class VulnerableAuth:
     
     def get_user_details(self, username: str) -> Optional[Dict]:
         """VULNERABILITY: BOPLA - No authorization check"""
-        if username not in self.users:
+        user_data = self.store.get_user(username)
+        if user_data is None:
             return None
         
-        user_data = self.users[username]
         return {
             "username": username,
             "role": user_data["role"],
@@ -237,6 +284,11 @@ class VulnerableAuth:
             "created_at": user_data["created_at"]
             # VULNERABILITY: Exposes all user details without authorization
         }
+    
+    def get_cache_stats(self) -> Dict:
+        with self._jwt_lock:
+            jwt_stats = {**self.jwt_cache_stats, "jwt_cache_size": len(self._jwt_cache)}
+        return {**jwt_stats, "user_store": self.store.get_stats()}
 
 # Initialize the vulnerable authentication system
 auth = VulnerableAuth() 
\ No newline at end of file
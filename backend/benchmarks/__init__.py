@@ -0,0 +1,7 @@
+# benchmarks - Reproducible performance measurements for the backend
+#
+#   synthetic.py      deterministic app_logs / network_logs / syslog generator
+#   mock_services.py  local S3 and LLM API stand-ins with injectable latency
+#   micro.py          fetch, parse, search, filter, insight, correlation and SQL timings
+#   e2e.py            /api/chat load scenarios against the app served in-process
+#   run.py            entry point: python -m benchmarks.run --help (from backend/)
@@ -0,0 +1,61 @@
+# e2e.py - End-to-end /api/chat load scenarios
+#
+# The Flask app is served in-process on a threaded werkzeug server (with
+# its LLM and S3 traffic going to MockServices), or --url points at an
+# already running backend. Each scenario ramps the concurrency levels with
+# load_test.run_level, so results have the same shape as load_test.py's.
+
+import asyncio
+import logging
+import argparse
+import threading
+from typing import Dict, Any, List, Callable
+
+SCENARIOS = {
+    # Classified as chat: one classification call plus one chat completion
+    "chat": ["Hello, what can you do?", "Explain the log formats you support", "Who are you?"],
+    # Classified as query: log types, filter query generation and execution on the datasets
+    "query": ["Show me all ERROR entries in the app logs", "Are there failed logins in syslog?",
+              "Which IPs had rejected network connections?", "Find SQL injection attempts against app endpoints"],
+    # The default load_test.py mix
+    "mixed": None
+}
+
+class InProcessServer:
+    """The Flask app on a threaded werkzeug server in a background thread"""
+    
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, access_log: bool = False):
+        import app as backend
+        from werkzeug.serving import make_server
+        if not access_log:
+            logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        self.readiness = backend.readiness
+        self._server = make_server(host, port, backend.app, threaded=True)
+        self.url = f"http://{host}:{self._server.server_port}"
+    
+    def start(self) -> str:
+        # Load components up front so the first level does not pay for imports
+        self.readiness.warm_up(wait=True)
+        threading.Thread(target=self._server.serve_forever, name="benchmark-server", daemon=True).start()
+        return self.url
+    
+    def stop(self):
+        self._server.shutdown()
+
+def run_scenarios(url: str, scenarios: List[str], levels: List[int], duration: float, slo: float, timeout: float,
+                  client_id: str, session_token: str, progress: Callable[[str], None] = None) -> Dict[str, Any]:
+    """load_test levels for each scenario: {scenario: {"levels": [...], "max_sustained_concurrency": n}}"""
+    from load_test import DEFAULT_MESSAGES, run_level
+    
+    report = {}
+    for scenario in scenarios:
+        args = argparse.Namespace(url=url, duration=duration, slo=slo, timeout=timeout, client_id=client_id,
+                                  session_token=session_token, messages=SCENARIOS[scenario] or DEFAULT_MESSAGES)
+        results = []
+        for concurrency in levels:
+            if progress:
+                progress(f"e2e.{scenario}[{concurrency} users]")
+            results.append(asyncio.run(run_level(args, concurrency)))
+        sustained = [level["concurrency"] for level in results if level["sustained"]]
+        report[scenario] = {"levels": results, "max_sustained_concurrency": max(sustained) if sustained else 0}
+    return report
@@ -0,0 +1,169 @@
+# micro.py - Microbenchmarks for the log analysis hot paths
+#
+# Each benchmark times one stage on the synthetic data served by
+# MockServices (so "fetch" includes a local HTTP round trip and the
+# configured S3 latency). Stages:
+#   fetch        log_fetcher.fetch_log_data and a DatasetStore load (HTTP + CSV parse + DataFrame)
+#   parse        csv.DictReader over the CSV text, then the DataFrame build
+#   search       Dataset.search keyword scan, with indexes cold (new dataset) and warm
+#   filters      SecurityLogAnalyzer._apply_filters and the query engine, cold and warm
+#   insights     SecurityLogAnalyzer._generate_insights over every row
+#   correlation  SecurityLogAnalyzer._correlate_logs (cross_reference_ips, user_activity)
+#   sql          pandasql through CSVQueryHandler.execute_sql_query
+#   pipeline     SecurityLogAnalyzer.process_security_query (includes mock LLM latency)
+
+import io
+import csv
+import time
+import fnmatch
+import statistics
+import pandas as pd
+from typing import Dict, Any, List, Callable
+
+SECURITY_PARAMS = {
+    "filters": {
+        "time_range": "all",
+        "security_patterns": ["failed_logins", "sql_injection", "system_warnings", "network_attacks"],
+        "specific_filters": {"users": [], "ips": [], "endpoints": [], "actions": []}
+    }
+}
+
+SEARCH_KEYWORDS = {'app_logs': ['failed', 'denied'], 'network_logs': ['reject', '185.'], 'syslog': ['brute force', 'failed']}
+
+QUERY_IR = {
+    'app_logs': {"log_type": "app_logs", "where": [{"column": "level", "op": "eq", "value": "ERROR"},
+                                                  {"column": "message", "op": "contains", "value": "sql"}]},
+    'network_logs': {"log_type": "network_logs", "where": [{"column": "action", "op": "in", "value": ["DROP", "REJECT"]}],
+                     "group_by": ["src_ip"]},
+    'syslog': {"log_type": "syslog", "where": [{"column": "message", "op": "contains", "value": "failed"}],
+               "time_range": {"column": "timestamp", "start": "2024-01-10", "end": "2024-01-20"}}
+}
+
+SQL_QUERIES = {
+    'app_logs': "SELECT user, COUNT(*) AS failures FROM app_logs WHERE level = 'WARNING' GROUP BY user ORDER BY failures DESC LIMIT 20",
+    'network_logs': "SELECT src_ip, COUNT(*) AS blocked FROM network_logs WHERE action IN ('DROP', 'REJECT') GROUP BY src_ip ORDER BY blocked DESC LIMIT 20",
+    'syslog': "SELECT host, COUNT(*) AS events FROM syslog WHERE message LIKE '%failed%' GROUP BY host"
+}
+
+SECURITY_QUERY = "Show me failed logins, SQL injection attempts and blocked IPs"
+
+def measure(fn: Callable[[], Any], repeat: int = 5, warmup: int = 1, setup: Callable[[], Any] = None) -> Dict[str, float]:
+    """Timing summary over repeat runs of fn() after warmup runs
+    
+    setup (untimed) runs before every call and its result is passed to fn.
+    """
+    def call():
+        if setup is None:
+            started = time.perf_counter()
+            fn()
+        else:
+            argument = setup()
+            started = time.perf_counter()
+            fn(argument)
+        return time.perf_counter() - started
+    
+    for _ in range(warmup):
+        call()
+    samples = sorted(call() for _ in range(repeat))
+    return {
+        "min_seconds": samples[0],
+        "median_seconds": statistics.median(samples),
+        "p95_seconds": samples[min(len(samples) - 1, int(0.95 * len(samples)))],
+        "mean_seconds": statistics.mean(samples),
+        "repeat": repeat
+    }
+
+class MicroBenchmarks:
+    """The microbenchmark suite for one client's datasets
+    
+    frames maps log_type -> the DataFrame the app builds from the CSV
+    (all strings); texts maps log_type -> the raw CSV text.
+    """
+    
+    def __init__(self, client_id: str, frames: Dict[str, pd.DataFrame], texts: Dict[str, str],
+                 repeat: int = 5, warmup: int = 1):
+        self.client_id = client_id
+        self.frames = frames
+        self.texts = texts
+        self.repeat = repeat
+        self.warmup = warmup
+    
+    def cases(self) -> List[tuple]:
+        """(name, rows, fn, setup) for every benchmark"""
+        from log_fetcher import log_fetcher
+        from dataset_store import Dataset, DatasetStore, RequestDataContext
+        from query_engine import QueryEngine
+        from csv_query_handler import CSVQueryHandler
+        from result_set import ResultSet
+        from security_log_analyzer import security_analyzer
+        
+        cases = []
+        for log_type, df in self.frames.items():
+            rows = len(df)
+            text = self.texts[log_type]
+            records = list(csv.DictReader(io.StringIO(text)))
+            warm_store = DatasetStore(ttl=float('inf'))
+            warm_dataset = warm_store.put(self.client_id, log_type, df)
+            warm_engine = QueryEngine()
+            
+            def cold_context(log_type=log_type, df=df):
+                store = DatasetStore(ttl=float('inf'))
+                store.put(self.client_id, log_type, df)
+                return RequestDataContext(self.client_id, store)
+            
+            cases += [
+                (f"fetch.log_fetcher[{log_type}]", rows, lambda log_type=log_type: log_fetcher.fetch_log_data(self.client_id, log_type), None),
+                (f"fetch.dataset_store[{log_type}]", rows, lambda log_type=log_type: DatasetStore(ttl=0).load(self.client_id, log_type), None),
+                (f"parse.csv_dictreader[{log_type}]", rows, lambda text=text: list(csv.DictReader(io.StringIO(text))), None),
+                (f"parse.dataframe[{log_type}]", rows, lambda records=records: pd.DataFrame(records), None),
+                (f"search.cold[{log_type}]", rows, lambda dataset, log_type=log_type: dataset.search(SEARCH_KEYWORDS[log_type]),
+                 lambda log_type=log_type, df=df: Dataset(self.client_id, log_type, df, 1)),
+                (f"search.warm[{log_type}]", rows, lambda log_type=log_type, dataset=warm_dataset: dataset.search(SEARCH_KEYWORDS[log_type]), None),
+                (f"filters.security_patterns[{log_type}]", rows,
+                 lambda log_type=log_type, df=df: security_analyzer._apply_filters(df, SECURITY_PARAMS, log_type), None),
+                (f"filters.query_engine_cold[{log_type}]", rows,
+                 lambda context, log_type=log_type: QueryEngine().execute({"queries": [QUERY_IR[log_type]]}, [log_type], context),
+                 cold_context),
+                (f"filters.query_engine_warm[{log_type}]", rows,
+                 lambda log_type=log_type, context=RequestDataContext(self.client_id, warm_store):
+                 warm_engine.execute({"queries": [QUERY_IR[log_type]]}, [log_type], context), None),
+                (f"sql.pandasql[{log_type}]", rows, lambda handler, log_type=log_type: handler.execute_sql_query(SQL_QUERIES[log_type], [log_type]),
+                 lambda log_type=log_type, df=df: self._sql_handler(CSVQueryHandler(), log_type, df))
+            ]
+        
+        # Insights and correlation see every row of every log type (the unfiltered worst case)
+        log_entries = {log_type: {'data': ResultSet(df), 'count': len(df)} for log_type, df in self.frames.items()}
+        total = sum(len(df) for df in self.frames.values())
+        cases += [
+            ("insights.generate", total, lambda: security_analyzer._generate_insights(log_entries, SECURITY_PARAMS), None),
+            ("correlation.cross_reference_ips", total, lambda: security_analyzer._correlate_logs(log_entries, 'cross_reference_ips'), None),
+            ("correlation.user_activity", total, lambda: security_analyzer._correlate_logs(log_entries, 'user_activity'), None),
+            ("pipeline.process_security_query", total, lambda: security_analyzer.process_security_query(SECURITY_QUERY, self.client_id), None)
+        ]
+        return cases
+    
+    @staticmethod
+    def _sql_handler(handler, log_type: str, df: pd.DataFrame):
+        handler.csv_data = {log_type: df}
+        return handler
+    
+    def run(self, select: List[str] = None, progress: Callable[[str], None] = None) -> List[Dict[str, Any]]:
+        """Run the benchmarks whose names match any of the select glob patterns (all by default)"""
+        results = []
+        for name, rows, fn, setup in self.cases():
+            if select and not any(fnmatch.fnmatch(name, pattern) for pattern in select):
+                continue
+            if progress:
+                progress(name)
+            try:
+                timing = measure(fn, self.repeat, self.warmup, setup)
+            except Exception as e:
+                results.append({"name": name, "rows": rows, "error": f"{type(e).__name__}: {e}"})
+                continue
+            results.append({
+                "name": name,
+                "rows": rows,
+                **{key: round(value, 6) if isinstance(value, float) else value for key, value in timing.items()},
+                "rows_per_second": round(rows / timing["median_seconds"]) if timing["median_seconds"] else None
+            })
+        return results
@@ -0,0 +1,234 @@
+# mock_services.py - Local S3 and LLM API stand-ins for benchmarks
+#
+# One threaded HTTP server plays both roles:
+#   GET  /s3/<key>                 serves a registered file (S3 object stand-in)
+#   POST /v1/chat/completions      OpenAI / Deepseek chat API (JSON or SSE stream)
+#   POST /v1/messages              Anthropic messages API (JSON or SSE stream)
+# Every response waits for the configured latency (plus seeded jitter)
+# before it is sent, so benchmarks see a controlled, repeatable network.
+# LLM answers are scripted from the prompt (see scripted_reply), so the
+# whole chat pipeline runs: classification, log types, filter query,
+# keywords, security query parsing and summaries.
+
+import re
+import json
+import time
+import random
+import shutil
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Callable, Optional
+
+CHAT_WORDS = ('hello', 'hi ', 'what can you do', 'who are you', 'explain', 'thanks')
+
+def _user_query(text: str) -> str:
+    match = re.search(r'User (?:query|request): (.*)', text)
+    return (match.group(1) if match else text).strip().lower()
+
+def _log_types(query: str) -> list:
+    log_types = []
+    if any(word in query for word in ('error', 'user', 'sql', 'endpoint', 'app')):
+        log_types.append('app_logs')
+    if any(word in query for word in ('network', 'connection', 'ip', 'reject', 'blocked', 'scan', 'transfer')):
+        log_types.append('network_logs')
+    if any(word in query for word in ('login', 'syslog', 'system', 'ssh', 'warning', 'brute')):
+        log_types.append('syslog')
+    return log_types or ['app_logs', 'network_logs', 'syslog']
+
+def _filter_query(query: str, log_types: list) -> Dict[str, Any]:
+    queries = []
+    for log_type in log_types:
+        if log_type == 'app_logs':
+            condition = {"column": "message", "op": "contains", "value": "sql injection"} if 'sql' in query \
+                else {"column": "level", "op": "eq", "value": "ERROR"}
+            queries.append({"log_type": log_type, "where": [condition]})
+        elif log_type == 'network_logs':
+            queries.append({"log_type": log_type, "where": [{"column": "action", "op": "in", "value": ["DROP", "REJECT"]}],
+                            "group_by": ["src_ip"]} if 'per' in query else
+                           {"log_type": log_type, "where": [{"column": "action", "op": "eq", "value": "REJECT"}]})
+        else:
+            queries.append({"log_type": log_type, "where": [{"column": "message", "op": "contains", "value": "failed"}]})
+    return {"queries": queries}
+
+def scripted_reply(text: str) -> str:
+    """A plausible LLM answer for one of the app's prompts (all message contents joined)"""
+    query = _user_query(text)
+    if 'Classify the user\'s request' in text:
+        return 'chat' if any(word in query for word in CHAT_WORDS) else 'query'
+    if 'determine which log types' in text:
+        return json.dumps(_log_types(query))
+    if 'JSON filter query' in text:
+        columns = re.search(r'Available log types and their columns:(.*?)\n\n', text, re.DOTALL)
+        log_types = [line.split(':')[0].strip() for line in (columns.group(1) if columns else '').strip().splitlines()]
+        return json.dumps(_filter_query(query, [log_type for log_type in log_types if log_type] or _log_types(query)))
+    if 'pandas expert' in text:
+        return ("filtered_app = app_logs[app_logs['level'] == 'ERROR']\n"
+                "filtered_network = network_logs[network_logs['action'] == 'REJECT']\n"
+                "filtered_syslog = syslog[syslog['message'].str.contains('failed', case=False)]")
+    if 'keywords' in text.lower() and 'JSON array' in text:
+        return json.dumps([word for word in ('failed', 'error', 'denied') if word in query] or ['failed'])
+    if 'security log analysis expert' in text:
+        patterns = [name for name, words in (('failed_logins', ('login', 'auth')), ('sql_injection', ('sql', 'injection')),
+                                             ('suspicious_ips', ('ip', 'blocked', 'suspicious')),
+                                             ('system_warnings', ('warning', 'error')), ('network_attacks', ('scan', 'brute', 'attack')))
+                    if any(word in query for word in words)]
+        return json.dumps({
+            "log_types": _log_types(query),
+            "filters": {"time_range": "all", "security_patterns": patterns,
+                        "specific_filters": {"users": [], "ips": [], "endpoints": [], "actions": []}},
+            "correlation": "cross_reference_ips"
+        })
+    if 'summary' in text.lower():
+        return ("Several failed login attempts and blocked connections from external IPs were found. "
+                "A small number of SQL injection attempts hit the search endpoint. No data exfiltration was confirmed.")
+    if 'SQL' in text:
+        return "SELECT level, COUNT(*) AS events FROM app_logs GROUP BY level"
+    return ("I can help you analyze application, network and system logs. Ask me to find failed logins, "
+            "blocked connections, errors or suspicious activity for your client.")
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    services = None  # Set per server class in MockServices.start
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        services = self.services
+        services._count('s3_requests')
+        path = services.objects.get(self.path[len('/s3/'):]) if self.path.startswith('/s3/') else None
+        services._wait(services.s3_latency, services.s3_jitter)
+        if path is None:
+            self._send(404, b'<Error><Code>NoSuchKey</Code><Message>The specified key does not exist.</Message></Error>', 'application/xml')
+            return
+        with open(path, 'rb') as f:
+            f.seek(0, 2)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/csv')
+            self.send_header('Content-Length', str(f.tell()))
+            self.end_headers()
+            f.seek(0)
+            shutil.copyfileobj(f, self.wfile, 1 << 20)
+    
+    def do_POST(self):
+        services = self.services
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        anthropic = self.path.endswith('/messages')
+        if not anthropic and not self.path.endswith('/chat/completions'):
+            self._send(404, b'{"error": "not found"}', 'application/json')
+            return
+        services._count('llm_requests')
+        
+        parts = [block.get('text', '') for block in payload.get('system', [])] if anthropic else []
+        parts += [message.get('content', '') for message in payload.get('messages', [])]
+        content = services.reply('\n'.join(part for part in parts if isinstance(part, str)))
+        services._wait(services.llm_latency, services.llm_jitter)
+        
+        if payload.get('stream'):
+            self._stream(content, anthropic)
+        elif anthropic:
+            self._send(200, json.dumps({"type": "message", "content": [{"type": "text", "text": content}],
+                                        "usage": {"input_tokens": 100, "output_tokens": 50}}).encode(), 'application/json')
+        else:
+            self._send(200, json.dumps({"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+                                        "usage": {"prompt_tokens": 100, "completion_tokens": 50}}).encode(), 'application/json')
+    
+    def _stream(self, content: str, anthropic: bool):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        for chunk in re.findall(r'\S+\s*', content):
+            event = {"type": "content_block_delta", "delta": {"type": "text_delta", "text": chunk}} if anthropic \
+                else {"choices": [{"index": 0, "delta": {"content": chunk}}]}
+            self.wfile.write(b'data: ' + json.dumps(event).encode() + b'\n\n')
+            self.wfile.flush()
+            if self.services.stream_chunk_delay:
+                time.sleep(self.services.stream_chunk_delay)
+        self.wfile.write(b'data: {"type": "message_stop"}\n\n' if anthropic else b'data: [DONE]\n\n')
+
+class MockServices:
+    """S3 and LLM stand-ins on one local HTTP server
+    
+    Latencies are in seconds; each response also waits a uniform random
+    0..jitter seconds drawn from a seeded generator. Google's API is not
+    emulated, so benchmark runs use the deepseek, openai or anthropic
+    provider (configure() points all three here).
+    """
+    
+    def __init__(self, llm_latency: float = 0.0, llm_jitter: float = 0.0, s3_latency: float = 0.0,
+                 s3_jitter: float = 0.0, stream_chunk_delay: float = 0.0, seed: int = 0,
+                 reply: Callable[[str], str] = None, host: str = '127.0.0.1', port: int = 0):
+        self.llm_latency = llm_latency
+        self.llm_jitter = llm_jitter
+        self.s3_latency = s3_latency
+        self.s3_jitter = s3_jitter
+        self.stream_chunk_delay = stream_chunk_delay
+        self.reply = reply or scripted_reply
+        self.objects = {}  # key -> file path
+        self.host, self.port = host, port
+        self.stats = {"s3_requests": 0, "llm_requests": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+    
+    @property
+    def url(self) -> Optional[str]:
+        return f"http://{self.host}:{self._server.server_port}" if self._server else None
+    
+    def start(self) -> str:
+        handler = type('MockHandler', (_Handler,), {'services': self})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="mock-services", daemon=True).start()
+        return self.url
+    
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+    
+    def put_object(self, key: str, path: str) -> str:
+        """Serve the file at path as an S3 object; returns its URL"""
+        self.objects[key] = path
+        return f"{self.url}/s3/{key}"
+    
+    def configure(self, config, data: Dict[str, str] = None):
+        """Point config's LLM providers and every client's log URLs at this server
+        
+        data maps log_type -> CSV path; every client gets the same files.
+        Must run before llm_provider is imported (providers copy their base URL).
+        """
+        config.DEEPSEEK_BASE_URL = f"{self.url}/v1"
+        config.OPENAI_BASE_URL = f"{self.url}/v1"
+        config.ANTHROPIC_BASE_URL = self.url
+        for client_id, client in config.CLIENTS.items():
+            for log_type in client['logs']:
+                key = f"{client_id}/{log_type}.csv"
+                client['logs'][log_type] = f"{self.url}/s3/{key}"
+                if data and log_type in data:
+                    self.objects[key] = data[log_type]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats)
+    
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+    
+    def _wait(self, latency: float, jitter: float):
+        if jitter:
+            with self._lock:
+                latency += self._random.uniform(0, jitter)
+        if latency > 0:
+            time.sleep(latency)
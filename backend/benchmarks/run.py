@@ -0,0 +1,234 @@
+# run.py - Benchmark runner: synthetic data, mock services, micro and end-to-end suites
+#
+# Usage (from backend/):
+#   python -m benchmarks.run --scale 10k,100k --output results.json
+#   python -m benchmarks.run --suite micro --select 'filters.*' --compare results.json
+#   python -m benchmarks.run --suite e2e --llm-latency 1.0 --levels 8,32,64 --duration 20
+#
+# Everything runs locally and deterministically: synthetic CSVs (cached in
+# --data-dir), S3 and LLM stand-ins with the given latency, and the app
+# state (SQLite files, archives) in a scratch --workdir. The JSON report is
+# written to --output (stdout otherwise); --compare diffs it against an
+# earlier report and lists stages that got slower than --threshold.
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import contextlib
+from typing import Dict, Any, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _log(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _metadata(args) -> Dict[str, Any]:
+    import numpy
+    import pandas
+    return {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count(),
+        "pandas": pandas.__version__,
+        "numpy": numpy.__version__,
+        "arguments": {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+    }
+
+def _metrics(report: Dict[str, Any]) -> Dict[tuple, tuple]:
+    """(scale, benchmark, metric) -> (value, higher_is_better) for every comparable number"""
+    metrics = {}
+    for scale in report.get("scales", []):
+        for result in scale.get("micro", []):
+            if "median_seconds" in result:
+                metrics[(scale["rows"], result["name"], "median_seconds")] = (result["median_seconds"], False)
+        for scenario, outcome in scale.get("e2e", {}).items():
+            for level in outcome["levels"]:
+                name = f"e2e.{scenario}[{level['concurrency']}]"
+                metrics[(scale["rows"], name, "p95_seconds")] = (level["p95_seconds"], False)
+                metrics[(scale["rows"], name, "throughput_rps")] = (level["throughput_rps"], True)
+    return metrics
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> Dict[str, Any]:
+    """Regressions and improvements beyond threshold (relative change) between two reports"""
+    before, after = _metrics(baseline), _metrics(current)
+    regressions, improvements = [], []
+    for key in sorted(before.keys() & after.keys(), key=str):
+        (old, higher_is_better), (new, _) = before[key], after[key]
+        if not old or not new:
+            continue
+        # Positive means worse, whichever direction the metric improves in
+        change = old / new - 1 if higher_is_better else new / old - 1
+        entry = {"rows": key[0], "name": key[1], "metric": key[2], "baseline": old, "current": new, "change": round(change, 3)}
+        if change > threshold:
+            regressions.append(entry)
+        elif change < -threshold:
+            improvements.append(entry)
+    return {
+        "baseline_commit": baseline.get("meta", {}).get("git_commit"),
+        "threshold": threshold,
+        "regressions": sorted(regressions, key=lambda entry: -entry["change"]),
+        "improvements": sorted(improvements, key=lambda entry: entry["change"])
+    }
+
+def _print_summary(report: Dict[str, Any]):
+    for scale in report["scales"]:
+        _log(f"\n== {scale['rows']:,} rows per log type ==")
+        for result in scale.get("micro", []):
+            if "error" in result:
+                _log(f"  {result['name']:45s} ERROR {result['error']}")
+            else:
+                _log(f"  {result['name']:45s} {result['median_seconds'] * 1000:10.2f} ms  {result['rows_per_second'] or 0:>12,} rows/s")
+        for scenario, outcome in scale.get("e2e", {}).items():
+            for level in outcome["levels"]:
+                _log(f"  e2e.{scenario:8s} {level['concurrency']:4d} users  {level['throughput_rps']:8.2f} req/s  "
+                     f"p95 {level['p95_seconds']:6.2f}s  errors {level['errors']}")
+    comparison = report.get("comparison")
+    if comparison:
+        _log(f"\nAgainst {comparison['baseline_commit']} (threshold {comparison['threshold']:.0%}): "
+             f"{len(comparison['regressions'])} regressions, {len(comparison['improvements'])} improvements")
+        for entry in comparison["regressions"]:
+            _log(f"  SLOWER {entry['name']} @{entry['rows']} {entry['metric']}: {entry['baseline']} -> {entry['current']} ({entry['change']:+.0%})")
+
+def run(args) -> Dict[str, Any]:
+    # Background services off; app state goes to the scratch directory
+    os.environ.update({"PREFETCH_ENABLED": "false", "HISTORY_MAINTENANCE_ENABLED": "false", "STARTUP_WARMUP": "false"})
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    os.makedirs(args.workdir, exist_ok=True)
+    os.chdir(args.workdir)
+    
+    from config import Config
+    from benchmarks.mock_services import MockServices
+    
+    # The mock must be configured before anything imports llm_provider
+    services = MockServices(llm_latency=args.llm_latency, llm_jitter=args.llm_jitter, s3_latency=args.s3_latency,
+                            s3_jitter=args.s3_jitter, stream_chunk_delay=args.stream_chunk_delay, seed=args.seed)
+    services.start()
+    services.configure(Config)
+    
+    from benchmarks import synthetic
+    from benchmarks.micro import MicroBenchmarks
+    from benchmarks.e2e import InProcessServer, run_scenarios
+    from dataset_store import dataset_store
+    synthetic.check_schemas()
+    
+    report = {"meta": _metadata(args), "scales": []}
+    server = None
+    sink = open(os.devnull, 'w')
+    try:
+        for rows in args.scale:
+            _log(f"Generating {rows:,} rows per log type in {args.data_dir}")
+            paths = {log_type: synthetic.write_csv(log_type, rows, args.data_dir, args.seed) for log_type in synthetic.LOG_TYPES}
+            services.configure(Config, paths)
+            dataset_store.invalidate()
+            scale = {"rows": rows, "bytes": {log_type: os.path.getsize(path) for log_type, path in paths.items()}}
+            
+            if 'micro' in args.suite:
+                frames = {log_type: synthetic.read_csv(path) for log_type, path in paths.items()}
+                texts = {}
+                for log_type, path in paths.items():
+                    with open(path) as f:
+                        texts[log_type] = f.read()
+                suite = MicroBenchmarks(args.client_id, frames, texts, args.repeat, args.warmup)
+                with contextlib.redirect_stdout(sys.stderr if args.verbose else sink):
+                    scale["micro"] = suite.run(args.select, progress=lambda name: _log(f"  {name}"))
+                del frames, texts, suite
+            
+            if 'e2e' in args.suite:
+                dataset_store.invalidate()
+                with contextlib.redirect_stdout(sys.stderr if args.verbose else sink):
+                    url = args.url
+                    if url is None:
+                        if server is None:
+                            server = InProcessServer(access_log=args.verbose)
+                            server.start()
+                        url = server.url
+                    scale["e2e"] = run_scenarios(url, args.scenarios, args.levels, args.duration, args.slo, args.timeout,
+                                                 args.client_id, args.session_token, progress=lambda name: _log(f"  {name}"))
+            report["scales"].append(scale)
+    finally:
+        if server:
+            server.stop()
+        services.stop()
+        sink.close()
+    
+    report["mock_services"] = services.get_stats()
+    return report
+
+def main():
+    from benchmarks.synthetic import parse_rows
+    
+    def listed(convert):
+        return lambda value: [convert(item) for item in value.split(",") if item]
+    
+    parser = argparse.ArgumentParser(description="Run backend benchmarks against synthetic data and mock services")
+    parser.add_argument("--suite", default="micro,e2e", type=listed(str), help="micro, e2e or both")
+    parser.add_argument("--scale", default="10k", type=listed(parse_rows), help="rows per log type, e.g. 10k,100k,1m,10m")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--select", type=listed(str), help="glob patterns of micro benchmarks to run, e.g. 'search.*,sql.*'")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per microbenchmark")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs before timing")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per mock LLM response")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="extra uniform random LLM latency (s)")
+    parser.add_argument("--s3-latency", type=float, default=0.02, help="seconds before each mock S3 response")
+    parser.add_argument("--s3-jitter", type=float, default=0.0)
+    parser.add_argument("--stream-chunk-delay", type=float, default=0.0, help="seconds between streamed LLM chunks")
+    parser.add_argument("--scenarios", default="chat,query,mixed", type=listed(str), help="e2e scenarios to run")
+    parser.add_argument("--levels", default="1,8,32", type=listed(int), help="e2e concurrent user counts")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per e2e level")
+    parser.add_argument("--slo", type=float, default=10, help="p95 latency (s) a sustained level must meet")
+    parser.add_argument("--timeout", type=float, default=120, help="client timeout per e2e request (s)")
+    parser.add_argument("--url", help="benchmark this running backend instead of serving the app in-process")
+    parser.add_argument("--client-id", default="maze_bank")
+    parser.add_argument("--session-token", default="maze-user-session-001")
+    parser.add_argument("--workdir", help="scratch directory for app state (default: a new temp directory)")
+    parser.add_argument("--data-dir", help="where generated CSVs are cached (default: <workdir>/data)")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="earlier JSON report to diff against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative change reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 if --compare finds regressions")
+    parser.add_argument("--verbose", action="store_true", help="show the app's debug output")
+    args = parser.parse_args()
+    
+    if args.workdir is None:
+        import tempfile
+        args.workdir = tempfile.mkdtemp(prefix="benchmarks-")
+    # Resolve paths before run() changes into the workdir
+    args.workdir = os.path.abspath(args.workdir)
+    args.data_dir = os.path.abspath(args.data_dir or os.path.join(args.workdir, "data"))
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    
+    report = run(args)
+    if baseline is not None:
+        report["comparison"] = compare(baseline, report, args.threshold)
+    _print_summary(report)
+    
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        _log(f"\nReport written to {output}")
+    else:
+        print(json.dumps(report, indent=2))
+    
+    if args.fail_on_regression and report.get("comparison", {}).get("regressions"):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+# synthetic.py - Deterministic synthetic security logs
+#
+# Usage: python -m benchmarks.synthetic --rows 100000 --out /tmp/logs
+#
+# The same (log_type, rows, seed) always produces byte-identical CSV, with
+# the columns of SecurityLogAnalyzer.log_schemas and every value a string as
+# log_fetcher reads it. Security events appear at fixed rates so filters,
+# insights and correlation have realistic amounts of work at any scale:
+#   app_logs      ~3% failed logins, ~1% SQL injection, ~4% warnings/errors
+#   network_logs  ~9% DROP/REJECT, ~2% port scans, ~1% large transfers with a file hash
+#   syslog        ~4% failed logins, ~1% brute force / port scan alerts, ~3% resource warnings
+# Users and source IPs follow a skewed (Zipf-like) distribution, and a
+# share of the external IPs shows up in both network_logs and syslog.
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+LOG_TYPES = ['app_logs', 'network_logs', 'syslog']
+
+# Must match SecurityLogAnalyzer.log_schemas (checked by check_schemas)
+COLUMNS = {
+    'syslog': ['timestamp', 'host', 'process', 'pid', 'message'],
+    'network_logs': ['timestamp', 'src_ip', 'dest_ip', 'protocol', 'src_port', 'dest_port', 'action', 'bytes_sent', 'bytes_received', 'file_hash'],
+    'app_logs': ['timestamp', 'level', 'user', 'endpoint', 'message']
+}
+
+# Fixed window so output never depends on the current date
+END_TIME = np.datetime64('2024-01-31T23:59:59')
+WINDOW_DAYS = 30
+
+FIRST_NAMES = ['james', 'mary', 'john', 'linda', 'robert', 'susan', 'michael', 'karen', 'david', 'lisa',
+               'william', 'nancy', 'richard', 'betty', 'joseph', 'sandra', 'thomas', 'ashley', 'charles', 'donna']
+LAST_NAMES = ['smith', 'johnson', 'webster', 'brown', 'jones', 'garcia', 'miller', 'davis', 'wilson', 'moore',
+              'taylor', 'anderson', 'thomas', 'jackson', 'white', 'harris', 'martin', 'thompson', 'clark', 'lewis']
+
+ENDPOINTS = ['/api/login', '/api/logout', '/api/accounts', '/api/transfers', '/api/payments', '/api/profile',
+             '/api/search', '/api/reports', '/api/admin/users', '/api/statements', '/api/cards', '/api/health']
+
+HOSTS = ['web-01', 'web-02', 'web-03', 'app-01', 'app-02', 'db-01', 'db-02', 'bastion-01', 'mail-01', 'vpn-01']
+
+def check_schemas():
+    """Raise if COLUMNS drifted from SecurityLogAnalyzer.log_schemas"""
+    from security_log_analyzer import security_analyzer
+    for log_type, columns in security_analyzer.log_schemas.items():
+        if COLUMNS.get(log_type) != columns:
+            raise ValueError(f"Synthetic {log_type} columns {COLUMNS.get(log_type)} do not match the analyzer schema {columns}")
+
+def _rng(seed: int, log_type: str) -> np.random.Generator:
+    return np.random.default_rng([seed, LOG_TYPES.index(log_type)])
+
+def _zipf_choice(rng: np.random.Generator, pool: np.ndarray, size: int, exponent: float = 1.1) -> np.ndarray:
+    weights = 1.0 / np.arange(1, len(pool) + 1) ** exponent
+    return pool[rng.choice(len(pool), size=size, p=weights / weights.sum())]
+
+def _users(rows: int) -> np.ndarray:
+    count = int(min(2000, max(50, rows // 500)))
+    names = [last + first for last in LAST_NAMES for first in FIRST_NAMES]
+    names += [f"{name}{number}" for number in range(1, count // len(names) + 2) for name in names]
+    # Fixed shuffle so the most active users are not all one surname
+    return np.random.default_rng(count).permutation(np.array(names[:count], dtype=object))
+
+def _ips(rng: np.random.Generator, count: int, external: bool) -> np.ndarray:
+    octets = rng.integers(1, 255, size=(count, 4))
+    if external:
+        octets[:, 0] = rng.choice([45, 62, 91, 103, 185, 193, 203], size=count)
+    else:
+        octets[:, 0], octets[:, 1] = 10, rng.integers(0, 4, size=count)
+    return np.array(['.'.join(map(str, octet)) for octet in octets], dtype=object)
+
+def _ip_pools(seed: int, rows: int):
+    """(internal, external) IP pools shared by network_logs and syslog"""
+    rng = np.random.default_rng([seed, len(LOG_TYPES)])
+    return _ips(rng, int(min(5000, max(100, rows // 200))), False), _ips(rng, int(min(2000, max(50, rows // 1000))), True)
+
+def _timestamps(rng: np.random.Generator, rows: int) -> np.ndarray:
+    span = WINDOW_DAYS * 86400
+    offsets = np.sort(rng.integers(0, span, size=rows)).astype('timedelta64[s]')
+    iso = np.datetime_as_string(END_TIME - np.timedelta64(span - 1, 's') + offsets, unit='s').astype('S19')
+    # 'YYYY-MM-DDTHH:MM:SS' -> 'YYYY-MM-DD HH:MM:SS' without a per-row Python loop
+    iso.view(np.uint8).reshape(rows, 19)[:, 10] = ord(' ')
+    return iso.astype(str).astype(object)
+
+def _events(rng: np.random.Generator, rows: int, rates: dict) -> np.ndarray:
+    """Event name per row; rates are fractions, the rest is 'normal'"""
+    names = list(rates) + ['normal']
+    probabilities = list(rates.values())
+    probabilities.append(1.0 - sum(probabilities))
+    return np.array(names, dtype=object)[rng.choice(len(names), size=rows, p=probabilities)]
+
+def _pick(rng: np.random.Generator, values: list, size: int) -> np.ndarray:
+    return np.array(values, dtype=object)[rng.integers(0, len(values), size=size)]
+
+def _app_logs(rng: np.random.Generator, rows: int, seed: int) -> pd.DataFrame:
+    users = _zipf_choice(rng, _users(rows), rows)
+    endpoints = _zipf_choice(rng, np.array(ENDPOINTS, dtype=object), rows, 0.8)
+    levels = _pick(rng, ['INFO'] * 8 + ['DEBUG'] * 2, rows)
+    messages = _pick(rng, ['Request completed', 'User logged in successfully', 'Profile updated', 'Payment processed',
+                           'Statement generated', 'Session refreshed', 'Search executed', 'Report exported'], rows)
+    
+    events = _events(rng, rows, {'failed_login': 0.03, 'sql_injection': 0.01, 'warning': 0.025, 'error': 0.015})
+    failed = events == 'failed_login'
+    levels[failed] = 'WARNING'
+    endpoints[failed] = '/api/login'
+    messages[failed] = _pick(rng, ['Failed login attempt for user ', 'Invalid password for user ', 'Access denied for user '], failed.sum()) + users[failed]
+    
+    injection = events == 'sql_injection'
+    levels[injection] = 'ERROR'
+    endpoints[injection] = _pick(rng, ['/api/search', '/api/login', '/api/reports'], injection.sum())
+    messages[injection] = _pick(rng, ["SQL injection attempt detected: ' OR '1'='1",
+                                      "Suspicious query parameter: ' OR 1=1 --",
+                                      "SQL injection blocked: UNION SELECT username, password FROM users",
+                                      "Malformed input rejected: '; DROP TABLE accounts; --"], injection.sum())
+    
+    warning = events == 'warning'
+    levels[warning] = 'WARNING'
+    messages[warning] = _pick(rng, ['Slow response from payment gateway', 'Memory low on worker process',
+                                    'Rate limit approaching for client', 'Deprecated API version used'], warning.sum())
+    
+    error = events == 'error'
+    levels[error] = 'ERROR'
+    messages[error] = _pick(rng, ['Database connection failed', 'Upstream timeout while processing request',
+                                  'Critical: transaction rollback', 'Unhandled exception in handler'], error.sum())
+    
+    return pd.DataFrame({'timestamp': _timestamps(rng, rows), 'level': levels, 'user': users,
+                         'endpoint': endpoints, 'message': messages})
+
+def _network_logs(rng: np.random.Generator, rows: int, seed: int) -> pd.DataFrame:
+    internal, external = _ip_pools(seed, rows)
+    servers = internal[:max(5, len(internal) // 50)]
+    src_ip = _zipf_choice(rng, internal, rows)
+    dest_ip = _pick(rng, list(servers), rows)
+    protocol = _pick(rng, ['TCP'] * 8 + ['UDP'] * 2, rows)
+    dest_port = _pick(rng, [443, 443, 443, 80, 22, 53, 3306, 8080], rows)
+    action = np.full(rows, 'ACCEPT', dtype=object)
+    bytes_sent = rng.lognormal(7, 1.5, rows).astype(np.int64)
+    bytes_received = rng.lognormal(9, 1.5, rows).astype(np.int64)
+    file_hash = np.full(rows, '', dtype=object)
+    
+    events = _events(rng, rows, {'blocked': 0.07, 'port_scan': 0.02, 'transfer': 0.01})
+    blocked = events == 'blocked'
+    src_ip[blocked] = _zipf_choice(rng, external, blocked.sum())
+    action[blocked] = _pick(rng, ['DROP', 'REJECT'], blocked.sum())
+    bytes_received[blocked] = 0
+    
+    scan = events == 'port_scan'
+    src_ip[scan] = _zipf_choice(rng, external[:max(5, len(external) // 20)], scan.sum())
+    dest_port[scan] = rng.integers(1, 65536, size=scan.sum())
+    action[scan] = 'REJECT'
+    protocol[scan] = 'TCP'
+    bytes_sent[scan], bytes_received[scan] = 60, 0
+    
+    transfer = events == 'transfer'
+    bytes_sent[transfer] = rng.lognormal(17, 1, transfer.sum()).astype(np.int64)
+    digests = rng.integers(0, 256, size=(transfer.sum(), 32), dtype=np.uint8)
+    file_hash[transfer] = [digest.tobytes().hex() for digest in digests]
+    
+    return pd.DataFrame({'timestamp': _timestamps(rng, rows), 'src_ip': src_ip, 'dest_ip': dest_ip,
+                         'protocol': protocol, 'src_port': rng.integers(1024, 65536, size=rows),
+                         'dest_port': dest_port, 'action': action, 'bytes_sent': bytes_sent,
+                         'bytes_received': bytes_received, 'file_hash': file_hash})
+
+def _syslog(rng: np.random.Generator, rows: int, seed: int) -> pd.DataFrame:
+    _, external = _ip_pools(seed, rows)
+    users = _users(rows)
+    hosts = _zipf_choice(rng, np.array(HOSTS, dtype=object), rows, 0.7)
+    process = _pick(rng, ['systemd', 'cron', 'sshd', 'kernel', 'nginx'], rows)
+    messages = _pick(rng, ['Started Session of user root', 'Finished daily cleanup activity', 'Reloading configuration',
+                           'Connection closed by peer', 'Started periodic job', 'Accepted publickey for deploy'], rows)
+    
+    events = _events(rng, rows, {'failed_login': 0.04, 'attack': 0.01, 'resource': 0.03})
+    failed = events == 'failed_login'
+    process[failed] = 'sshd'
+    messages[failed] = (_pick(rng, ['Failed login for ', 'authentication failed for ', 'Invalid password for '], failed.sum())
+                        + _zipf_choice(rng, users, failed.sum()) + ' from ' + _zipf_choice(rng, external, failed.sum()))
+    
+    attack = events == 'attack'
+    process[attack] = _pick(rng, ['sshd', 'kernel'], attack.sum())
+    messages[attack] = (_pick(rng, ['Possible brute force attack from ', 'Port scan detected from ', 'Connection flood from '], attack.sum())
+                        + _zipf_choice(rng, external, attack.sum()))
+    
+    resource = events == 'resource'
+    process[resource] = 'kernel'
+    messages[resource] = _pick(rng, ['Warning: disk space below 10% on /var', 'Memory low: invoking OOM killer',
+                                     'CPU high: load average above threshold', 'Critical: filesystem error on /dev/sda1'], resource.sum())
+    
+    return pd.DataFrame({'timestamp': _timestamps(rng, rows), 'host': hosts, 'process': process,
+                         'pid': rng.integers(100, 65536, size=rows), 'message': messages})
+
+GENERATORS = {'app_logs': _app_logs, 'network_logs': _network_logs, 'syslog': _syslog}
+
+def generate(log_type: str, rows: int, seed: int = 0) -> pd.DataFrame:
+    """rows synthetic entries of log_type with every value as a string (as log_fetcher reads them)"""
+    if log_type not in GENERATORS:
+        raise ValueError(f"Unknown log type: {log_type}. Available: {LOG_TYPES}")
+    df = GENERATORS[log_type](_rng(seed, log_type), rows, seed)
+    return df[COLUMNS[log_type]].astype(str)
+
+def write_csv(log_type: str, rows: int, directory: str, seed: int = 0) -> str:
+    """Path of the CSV for (log_type, rows, seed) in directory, generated if missing"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{log_type}-{rows}-{seed}.csv")
+    if not os.path.exists(path):
+        partial = path + ".part"
+        generate(log_type, rows, seed).to_csv(partial, index=False)
+        os.replace(partial, path)
+    return path
+
+def read_csv(path: str) -> pd.DataFrame:
+    """Load a generated CSV the way the app sees it: every column a string, empty fields as ''"""
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+def parse_rows(value: str) -> int:
+    """'10k' -> 10000, '2.5m' -> 2500000"""
+    value = value.strip().lower()
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(value[-1:], 1)
+    return int(float(value.rstrip('km')) * multiplier)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic security log CSVs")
+    parser.add_argument("--rows", type=parse_rows, default=parse_rows("100k"), help="rows per log type (e.g. 10k, 1m)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="synthetic_logs", help="output directory")
+    parser.add_argument("--log-types", default=",".join(LOG_TYPES), type=lambda value: value.split(","))
+    args = parser.parse_args()
+    
+    for log_type in args.log_types:
+        print(write_csv(log_type, args.rows, args.out, args.seed))
+
+if __name__ == '__main__':
+    main()
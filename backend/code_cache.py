@@ -0,0 +1,196 @@
+# code_cache.py - Validated, compiled cache for LLM-generated pandas code
+
+import ast
+import hashlib
+import threading
+import builtins
+from collections import OrderedDict
+from typing import Dict, Any, List
+from config import Config
+from tracing import traced, current_span
+
+class CodeValidationError(Exception):
+    """Raised when generated code falls outside the allowed pandas subset"""
+    pass
+
+class CompiledProgram:
+    """A validated code object plus the log types whose schema it was checked against"""
+    
+    def __init__(self, code, tables: List[str], normalized_hash: str):
+        self.code = code
+        self.tables = tables
+        self.normalized_hash = normalized_hash
+
+class CodeCache:
+    """Caches generated programs as compiled code objects
+    
+    Lookups go raw-source hash -> normalized-AST hash -> code object, so an
+    exact repeat skips parsing and compiling entirely, and a reformatted copy
+    of known code only pays for the parse. Validation results (including
+    rejections) are cached with the entry. Entries are keyed by the table
+    schemas they were validated against, so clients whose frames differ get
+    separate entries and entries for a replaced schema age out of the LRU.
+    """
+    
+    # AST nodes allowed in generated filtering code
+    ALLOWED_NODES = (
+        ast.Module, ast.Expr, ast.Assign, ast.AugAssign, ast.Name, ast.Attribute,
+        ast.Subscript, ast.Slice, ast.Call, ast.keyword, ast.Constant, ast.Compare,
+        ast.BoolOp, ast.BinOp, ast.UnaryOp, ast.IfExp, ast.List, ast.Tuple, ast.Dict,
+        ast.Set, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp,
+        ast.comprehension, ast.Lambda, ast.arguments, ast.arg, ast.Starred,
+        ast.Load, ast.Store, ast.expr_context, ast.boolop, ast.operator, ast.unaryop,
+        ast.cmpop
+    )
+    
+    # Attributes and methods generated code may use (pandas selection, string,
+    # datetime and aggregation helpers); anything else - read_* / to_* I/O,
+    # eval/query, pipe - is rejected in restricted mode
+    ALLOWED_ATTRIBUTES = frozenset((
+        # Selection and reshaping
+        'loc', 'iloc', 'at', 'iat', 'columns', 'index', 'empty', 'shape', 'size', 'values', 'dtypes',
+        'head', 'tail', 'copy', 'sort_values', 'sort_index', 'reset_index', 'drop_duplicates', 'duplicated',
+        'drop', 'dropna', 'fillna', 'rename', 'assign', 'where', 'mask', 'nlargest', 'nsmallest', 'merge',
+        'concat', 'DataFrame', 'Series', 'apply', 'map', 'astype', 'tolist', 'unique', 'nunique', 'explode',
+        # Comparison and membership
+        'isin', 'between', 'isna', 'notna', 'isnull', 'notnull', 'eq', 'ne', 'lt', 'le', 'gt', 'ge', 'any', 'all',
+        # Aggregation
+        'groupby', 'agg', 'aggregate', 'count', 'sum', 'mean', 'median', 'min', 'max', 'std', 'abs', 'round',
+        'value_counts', 'idxmax', 'idxmin', 'first', 'last', 'cumsum', 'diff', 'shift', 'rank', 'clip',
+        'transform', 'filter', 'nth', 'ngroup', 'rolling', 'resample',
+        # String accessor
+        'str', 'contains', 'startswith', 'endswith', 'lower', 'upper', 'strip', 'lstrip', 'rstrip', 'match',
+        'fullmatch', 'replace', 'split', 'len', 'slice', 'extract', 'findall', 'cat', 'zfill', 'pad', 'get',
+        # Datetime accessor and conversions
+        'dt', 'to_datetime', 'to_numeric', 'to_timedelta', 'Timestamp', 'Timedelta', 'now', 'date', 'time',
+        'year', 'month', 'day', 'hour', 'minute', 'second', 'dayofweek', 'weekday', 'day_name', 'floor',
+        'ceil', 'normalize', 'strftime', 'total_seconds', 'days', 'seconds', 'tz_localize', 'tz_convert'
+    ))
+    
+    SAFE_BUILTINS = (
+        'len', 'str', 'int', 'float', 'bool', 'min', 'max', 'sum', 'abs', 'round',
+        'list', 'dict', 'set', 'tuple', 'sorted', 'any', 'all', 'range', 'isinstance',
+        'True', 'False', 'None'
+    )
+    
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size or Config.CODE_CACHE_SIZE
+        self._by_source = OrderedDict()      # (raw hash, schema key) -> CompiledProgram | CodeValidationError
+        self._by_normalized = OrderedDict()  # (normalized hash, schema key) -> CompiledProgram
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "normalized_hits": 0,
+            "misses": 0,
+            "compiles": 0,
+            "rejections": 0
+        }
+    
+    @traced("code_cache.get_program")
+    def get_program(self, source: str, schemas: Dict[str, List[str]]) -> CompiledProgram:
+        """Return a compiled program for source, validating and compiling only on a miss
+        
+        schemas maps each table (DataFrame variable name) to its columns.
+        """
+        schema_key = self._schema_key(schemas)
+        raw_key = (hashlib.sha256(source.strip().encode('utf-8')).hexdigest(), schema_key)
+        span = current_span().set(cache_hit=False)
+        
+        with self._lock:
+            cached = self._by_source.get(raw_key)
+            if cached is not None:
+                self._by_source.move_to_end(raw_key)
+                self.stats["hits"] += 1
+                span.set(cache_hit=True)
+                if isinstance(cached, CodeValidationError):
+                    raise cached
+                return cached
+        
+        try:
+            tree = ast.parse(source, mode='exec')
+            self._validate(tree, schemas)
+        except (SyntaxError, CodeValidationError) as e:
+            error = e if isinstance(e, CodeValidationError) else CodeValidationError(f"Syntax error: {e}")
+            with self._lock:
+                self.stats["misses"] += 1
+                self.stats["rejections"] += 1
+                self._store(self._by_source, raw_key, error)
+            raise error
+        
+        normalized_key = (hashlib.sha256(ast.dump(tree).encode('utf-8')).hexdigest(), schema_key)
+        
+        with self._lock:
+            program = self._by_normalized.get(normalized_key)
+            if program is not None:
+                self.stats["normalized_hits"] += 1
+                span.set(cache_hit=True)
+                self._store(self._by_source, raw_key, program)
+                return program
+            self.stats["misses"] += 1
+        
+        program = CompiledProgram(compile(tree, '<generated-pandas>', 'exec'), sorted(schemas), normalized_key[0])
+        
+        with self._lock:
+            self.stats["compiles"] += 1
+            self._store(self._by_normalized, normalized_key, program)
+            self._store(self._by_source, raw_key, program)
+        return program
+    
+    def execution_globals(self, extra: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Globals for exec(): whitelisted builtins plus the given names when restricted"""
+        if Config.RESTRICT_GENERATED_CODE:
+            env = {"__builtins__": {name: getattr(builtins, name) for name in self.SAFE_BUILTINS}}
+        else:
+            env = {"__builtins__": builtins}
+        env.update(extra or {})
+        return env
+    
+    def _validate(self, tree: ast.AST, schemas: Dict[str, List[str]]):
+        # Derived columns (app_logs['hour'] = ...) may be assigned and then read
+        assigned = {(node.value.id, node.slice.value) for node in ast.walk(tree) if self._column_subscript(node, ast.Store)}
+        for node in ast.walk(tree):
+            if Config.RESTRICT_GENERATED_CODE:
+                self._check_node(node)
+            
+            # Column reads on a known table must name an existing or assigned column
+            if (self._column_subscript(node, ast.Load) and schemas.get(node.value.id)
+                    and node.slice.value not in schemas[node.value.id]
+                    and (node.value.id, node.slice.value) not in assigned):
+                raise CodeValidationError(f"Unknown column '{node.slice.value}' in {node.value.id}")
+    
+    @staticmethod
+    def _column_subscript(node: ast.AST, context: type) -> bool:
+        """node is table['column'] in the given expression context"""
+        return (isinstance(node, ast.Subscript) and isinstance(node.ctx, context) and isinstance(node.value, ast.Name)
+                and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str))
+    
+    def _check_node(self, node: ast.AST):
+        if not isinstance(node, self.ALLOWED_NODES):
+            raise CodeValidationError(f"Disallowed syntax: {type(node).__name__}")
+        if isinstance(node, ast.Name) and node.id.startswith('__'):
+            raise CodeValidationError(f"Disallowed name: {node.id}")
+        if isinstance(node, ast.Attribute) and node.attr not in self.ALLOWED_ATTRIBUTES:
+            raise CodeValidationError(f"Disallowed attribute: {node.attr}")
+    
+    def _schema_key(self, schemas: Dict[str, List[str]]) -> str:
+        signature = repr(sorted((table, tuple(columns)) for table, columns in schemas.items()))
+        return hashlib.sha256(signature.encode('utf-8')).hexdigest()[:16]
+    
+    def _store(self, store: OrderedDict, key, value):
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.max_size:
+            store.popitem(last=False)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["normalized_hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._by_source),
+                "programs": len(self._by_normalized),
+                "hit_rate": round((self.stats["hits"] + self.stats["normalized_hits"]) / lookups, 3) if lookups else 0.0
+            }
+
+# Shared cache for generated pandas programs
+code_cache = CodeCache()
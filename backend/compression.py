@@ -0,0 +1,101 @@
+# compression.py - Accept-Encoding negotiation and streaming compressors
+
+import zlib
+from typing import Iterable, Iterator, Optional
+from flask import request
+from config import Config
+
+try:
+    import brotli
+except ImportError:  # Optional: br is not offered without it
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Optional: zstd is not offered without it
+    zstandard = None
+
+class _GzipCompressor:
+    def __init__(self):
+        self._compressor = zlib.compressobj(Config.COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+    
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+class _BrotliCompressor:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=min(Config.COMPRESSION_LEVEL, 11))
+    
+    def compress(self, data: bytes) -> bytes:
+        # Brotli holds output back until a large window fills; flush per chunk to keep streaming
+        return self._compressor.process(data) + self._compressor.flush()
+    
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+class _ZstdCompressor:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=Config.COMPRESSION_LEVEL).compressobj()
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+    
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+def available_encodings():
+    """Supported content codings, most preferred first"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    encodings.append('gzip')
+    return encodings
+
+def negotiate_encoding() -> Optional[str]:
+    """Best content coding the current request accepts (None = identity)"""
+    if not Config.COMPRESSION_ENABLED:
+        return None
+    accepted = request.accept_encodings
+    candidates = [encoding for encoding in available_encodings() if accepted[encoding]]
+    if not candidates:
+        return None
+    # Highest q wins; ties go to our preference order
+    return max(candidates, key=lambda encoding: (accepted[encoding], -candidates.index(encoding)))
+
+def new_compressor(encoding: str):
+    return {'gzip': _GzipCompressor, 'br': _BrotliCompressor, 'zstd': _ZstdCompressor}[encoding]()
+
+def compress(data: bytes, encoding: str) -> bytes:
+    compressor = new_compressor(encoding)
+    return compressor.compress(data) + compressor.flush()
+
+def compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Compress a chunk stream incrementally, yielding only non-empty output"""
+    compressor = new_compressor(encoding)
+    for chunk in chunks:
+        output = compressor.compress(chunk)
+        if output:
+            yield output
+    output = compressor.flush()
+    if output:
+        yield output
+
+def coalesce(chunks: Iterable[bytes], size: int = None) -> Iterator[bytes]:
+    """Merge small chunks into writes of roughly size bytes"""
+    size = size or Config.STREAM_CHUNK_SIZE
+    buffer = []
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield b''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield b''.join(buffer)
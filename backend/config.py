@@ -1,6 +1,7 @@
 # config.py - Configuration for Trace Agent (Intentionally Vulnerable)
 
 import os
+import json
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,6 +10,17 @@ class Config:
     # LLM Provider Configuration
     LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'deepseek').lower()
     
+    # Comma-separated providers to route between (e.g. "openai,anthropic").
+    # With more than one, requests are hedged and fail over across them.
+    LLM_PROVIDERS = os.getenv('LLM_PROVIDERS', LLM_PROVIDER)
+    LLM_ROUTER_WINDOW = int(os.getenv('LLM_ROUTER_WINDOW', '200'))
+    LLM_HEDGE_DELAY = float(os.getenv('LLM_HEDGE_DELAY', '3.0'))  # Used until enough samples exist
+    LLM_HEDGE_MIN_DELAY = float(os.getenv('LLM_HEDGE_MIN_DELAY', '0.5'))
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '20'))
+    LLM_CIRCUIT_FAILURES = int(os.getenv('LLM_CIRCUIT_FAILURES', '5'))
+    LLM_CIRCUIT_ERROR_RATE = float(os.getenv('LLM_CIRCUIT_ERROR_RATE', '0.5'))
+    LLM_CIRCUIT_COOLDOWN = float(os.getenv('LLM_CIRCUIT_COOLDOWN', '30'))
+    
     # Deepseek AI Configuration
     DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY', 'your-deepseek-api-key-here')
     DEEPSEEK_BASE_URL = "https://api.deepseek.com/v1"
@@ -29,8 +41,139 @@ class Config:
     GOOGLE_BASE_URL = "https://generativelanguage.googleapis.com/v1"
     GOOGLE_MODEL = os.getenv('GOOGLE_MODEL', 'gemini-pro')
     
+    # LLM HTTP client settings (shared by sync and async provider calls)
+    LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '60'))
+    LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '200'))
+    
+    # Admission control for LLM calls. Rates are per provider and can be
+    # overridden with e.g. OPENAI_REQUESTS_PER_MINUTE / OPENAI_TOKENS_PER_MINUTE
+    # (0 = unlimited). The concurrency limit adapts (AIMD) to 429s and latency.
+    LLM_REQUESTS_PER_MINUTE = float(os.getenv('LLM_REQUESTS_PER_MINUTE', '0'))
+    LLM_TOKENS_PER_MINUTE = float(os.getenv('LLM_TOKENS_PER_MINUTE', '0'))
+    LLM_INITIAL_CONCURRENCY = int(os.getenv('LLM_INITIAL_CONCURRENCY', '16'))
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '128'))
+    LLM_LATENCY_TARGET = float(os.getenv('LLM_LATENCY_TARGET', '30'))
+    LLM_AIMD_DECREASE = float(os.getenv('LLM_AIMD_DECREASE', '0.5'))
+    LLM_AIMD_LATENCY_DECREASE = float(os.getenv('LLM_AIMD_LATENCY_DECREASE', '0.9'))
+    LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', '30'))
+    LLM_RATE_LIMIT_RETRIES = int(os.getenv('LLM_RATE_LIMIT_RETRIES', '2'))
+    LLM_RATE_LIMIT_BACKOFF = float(os.getenv('LLM_RATE_LIMIT_BACKOFF', '1.0'))
+    
+    # Prompt building: token budget per LLM call and schema digest settings
+    PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '3000'))
+    PROMPT_DIGEST_TOP_VALUES = int(os.getenv('PROMPT_DIGEST_TOP_VALUES', '5'))
+    PROMPT_DIGEST_CACHE_SIZE = int(os.getenv('PROMPT_DIGEST_CACHE_SIZE', '256'))
+    
+    # Generated pandas code: compiled-program cache size and AST restriction
+    # (VULNERABILITY when disabled: LLM output is executed with full builtins)
+    CODE_CACHE_SIZE = int(os.getenv('CODE_CACHE_SIZE', '512'))
+    RESTRICT_GENERATED_CODE = os.getenv('RESTRICT_GENERATED_CODE', 'true').lower() == 'true'
+    
+    # Query engine for log queries: 'ir' (declarative filter IR planned over
+    # cached, indexed datasets) or 'pandas' (LLM-generated pandas code)
+    QUERY_ENGINE = os.getenv('QUERY_ENGINE', 'ir').lower()
+    DATASET_TTL = float(os.getenv('DATASET_TTL', '300'))
+    QUERY_PLAN_CACHE_SIZE = int(os.getenv('QUERY_PLAN_CACHE_SIZE', '256'))
+    QUERY_CATEGORICAL_MAX_VALUES = int(os.getenv('QUERY_CATEGORICAL_MAX_VALUES', '1000'))
+    
+    # Background dataset prefetch: every client's logs are loaded at startup and
+    # refreshed after DATASET_TTL * PREFETCH_REFRESH_FRACTION seconds (minus up to
+    # PREFETCH_JITTER of that), hottest first, at most PREFETCH_CONCURRENCY at a time
+    PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'true').lower() == 'true'
+    PREFETCH_CONCURRENCY = int(os.getenv('PREFETCH_CONCURRENCY', '2'))
+    PREFETCH_REFRESH_FRACTION = float(os.getenv('PREFETCH_REFRESH_FRACTION', '0.8'))
+    PREFETCH_JITTER = float(os.getenv('PREFETCH_JITTER', '0.2'))
+    PREFETCH_RETRY_SECONDS = float(os.getenv('PREFETCH_RETRY_SECONDS', '60'))
+    PREFETCH_WARM_INDEXES = os.getenv('PREFETCH_WARM_INDEXES', 'true').lower() == 'true'
+    DATASET_ACCESS_HALF_LIFE = float(os.getenv('DATASET_ACCESS_HALF_LIFE', '600'))
+    
+    # Response encoding: compression (gzip always; br/zstd when brotli or
+    # zstandard is installed) and incremental JSON for large payloads
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', '6'))
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+    STREAM_JSON_MIN_ROWS = int(os.getenv('STREAM_JSON_MIN_ROWS', '10000'))
+    STREAM_JSON_PAGE_ROWS = int(os.getenv('STREAM_JSON_PAGE_ROWS', '5000'))
+    STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', '65536'))
+    
+    # Executed query results kept for export by query id
+    RESULT_REGISTRY_SIZE = int(os.getenv('RESULT_REGISTRY_SIZE', '32'))
+    RESULT_REGISTRY_TTL = float(os.getenv('RESULT_REGISTRY_TTL', '900'))
+    
+    # Cache-Control for /api/logs and /api/config: browsers keep the body but
+    # revalidate with If-None-Match, which costs a 304 when nothing changed
+    HTTP_CACHE_CONTROL = os.getenv('HTTP_CACHE_CONTROL', 'private, no-cache')
+    
+    # Longest a chat request (all of its LLM calls) may take before it is
+    # cancelled with a 504 / error event (0 = no limit). Server sizing lives in gunicorn.conf.py.
+    REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', '180'))
+    
+    # Rows per result_page event on the streaming chat endpoint
+    STREAM_PAGE_SIZE = int(os.getenv('STREAM_PAGE_SIZE', '500'))
+    # Open /api/chat/stream responses per process; each holds a server thread until it ends,
+    # so extra streams get a 503 instead of starving short requests (0 = no limit).
+    # gunicorn.conf.py derives it from the thread count.
+    STREAM_MAX_CONCURRENT = int(os.getenv('STREAM_MAX_CONCURRENT', '0'))
+    
+    # Verified JWT payloads cached by token hash; entries live until the token's
+    # exp claim, or AUTH_JWT_CACHE_TTL seconds for tokens without one
+    AUTH_JWT_CACHE_SIZE = int(os.getenv('AUTH_JWT_CACHE_SIZE', '4096'))
+    AUTH_JWT_CACHE_TTL = float(os.getenv('AUTH_JWT_CACHE_TTL', '300'))
+    
+    # Load heavy components (pandas, LLM client, database) on a background
+    # thread right after import, then start the prefetcher and history
+    # maintenance; when off they load on first use and those services stay off
+    STARTUP_WARMUP = os.getenv('STARTUP_WARMUP', 'true').lower() == 'true'
+    
     # Database Configuration (Intentionally vulnerable SQLite)
     DATABASE_PATH = 'vulnerable_logs.db'
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))  # Idle connections kept for reuse
+    DB_SYNCHRONOUS = os.getenv('DB_SYNCHRONOUS', 'NORMAL').upper()  # NORMAL is durable enough under WAL
+    DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', '16384'))
+    DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(64 * 1024 * 1024)))
+    DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', '256'))
+    HISTORY_PAGE_MAX = int(os.getenv('HISTORY_PAGE_MAX', '200'))  # Largest page from search_history
+    
+    # Users and session tokens: 'sqlite' (shared by all workers, survives
+    # restarts) or 'memory' (per process). Each worker caches them locally and
+    # checks for other workers' writes every USER_CACHE_CHECK_INTERVAL seconds.
+    USER_STORE_BACKEND = os.getenv('USER_STORE_BACKEND', 'sqlite').lower()
+    USER_STORE_PATH = os.getenv('USER_STORE_PATH', DATABASE_PATH)
+    USER_CACHE_CHECK_INTERVAL = float(os.getenv('USER_CACHE_CHECK_INTERVAL', '1.0'))
+    
+    # Query-history retention (0 disables a limit; both are off unless configured).
+    # Expired rows are always archived to HISTORY_ARCHIVE_DIR as gzip JSON lines
+    # per table/client/month before they are deleted.
+    # Per-client overrides: HISTORY_RETENTION_OVERRIDES='{"maze_bank": {"days": 30, "max_rows": 5000}}'
+    HISTORY_RETENTION_DAYS = float(os.getenv('HISTORY_RETENTION_DAYS', '0'))
+    HISTORY_MAX_ROWS_PER_CLIENT = int(os.getenv('HISTORY_MAX_ROWS_PER_CLIENT', '0'))
+    HISTORY_RETENTION_OVERRIDES = json.loads(os.getenv('HISTORY_RETENTION_OVERRIDES', '{}'))
+    HISTORY_ARCHIVE_DIR = os.getenv('HISTORY_ARCHIVE_DIR', 'history_archive')
+    HISTORY_MAINTENANCE_ENABLED = os.getenv('HISTORY_MAINTENANCE_ENABLED', 'true').lower() == 'true'
+    HISTORY_MAINTENANCE_INTERVAL = float(os.getenv('HISTORY_MAINTENANCE_INTERVAL', '3600'))
+    HISTORY_MAINTENANCE_BATCH = int(os.getenv('HISTORY_MAINTENANCE_BATCH', '2000'))
+    HISTORY_VACUUM_STEP_PAGES = int(os.getenv('HISTORY_VACUUM_STEP_PAGES', '256'))
+    # Switching to incremental vacuum rewrites the file under the write lock; larger databases are left alone
+    HISTORY_FULL_VACUUM_MAX_MB = float(os.getenv('HISTORY_FULL_VACUUM_MAX_MB', '64'))
+    
+    # Audit rows (log_queries, access_logs) are queued and inserted in batches
+    AUDIT_WRITE_BEHIND = os.getenv('AUDIT_WRITE_BEHIND', 'true').lower() == 'true'
+    AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '200'))
+    AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', '0.5'))
+    AUDIT_QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', '10000'))
+    AUDIT_ENQUEUE_TIMEOUT = float(os.getenv('AUDIT_ENQUEUE_TIMEOUT', '0.1'))
+    AUDIT_WRITE_RETRIES = int(os.getenv('AUDIT_WRITE_RETRIES', '3'))
+    AUDIT_RETRY_BACKOFF = float(os.getenv('AUDIT_RETRY_BACKOFF', '0.05'))
+    
+    # Tracing: per-stage spans feed the /metrics histograms; when TRACE_EXPORT_PATH
+    # is set, finished spans are also appended there as OTLP/JSON lines
+    TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() == 'true'
+    TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH', '')
+    TRACE_EXPORT_BATCH_SIZE = int(os.getenv('TRACE_EXPORT_BATCH_SIZE', '512'))
+    TRACE_EXPORT_INTERVAL = float(os.getenv('TRACE_EXPORT_INTERVAL', '1.0'))
+    TRACE_EXPORT_QUEUE_SIZE = int(os.getenv('TRACE_EXPORT_QUEUE_SIZE', '10000'))
+    TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'traceagent-backend')
     
     # S3 Configuration
     S3_BUCKET = 'cyblack-log-1'
@@ -3,6 +3,10 @@ from pandasql import sqldf
 import json
 from typing import Dict, List, Any, Optional
 from log_fetcher import log_fetcher
+from llm_provider import llm_provider
+from prompt_builder import prompt_builder
+from result_set import ResultSet, to_records
+from tracing import traced, current_span
 
 class CSVQueryHandler:
     """Handles querying log data using pandasql based on LLM-generated SQL queries"""
@@ -11,6 +15,7 @@ class CSVQueryHandler:
         self.csv_data = {}
         self.schemas = {}
     
+    @traced("sql.load_log_data")
     def load_log_data(self, client_id: str, log_types: List[str]) -> Dict[str, Any]:
         """Load log data from S3 for the specified client and log types"""
         csv_data = {}
@@ -51,16 +56,7 @@ class CSVQueryHandler:
         self.schemas = schemas
         return {"csv_data": csv_data, "schemas": schemas}
     
-    def generate_sql_query(self, user_query: str, client_id: str, log_types: List[str]) -> str:
-        """Generate SQL query using LLM based on user query and CSV schemas"""
-        from llm_provider import LLMProviderFactory
-        
-        llm_provider = LLMProviderFactory.create_provider()
-        
-        # Create schema description for LLM
-        schema_description = self._create_schema_description(log_types)
-        
-        system_prompt = """You are a SQL query generator for log analysis. You must generate SQL queries that can be executed using pandasql.
+    SQL_INSTRUCTIONS = """You are a SQL query generator for log analysis. You must generate SQL queries that can be executed using pandasql.
 
 IMPORTANT RULES:
 1. Use SQLite syntax (which pandasql supports)
@@ -71,19 +67,20 @@ IMPORTANT RULES:
 6. For date/time comparisons, use proper SQLite datetime functions
 7. Use LIMIT clause to limit results if needed
 
-Available log types and their schemas:
-{schema_description}
-
-User query: {user_query}
-
+The available tables are described in the next message (column types, distinct counts and most common values).
 Generate a SQL query that answers the user's question. Return ONLY the SQL query."""
+    
+    @traced("sql.generate_query")
+    def generate_sql_query(self, user_query: str, client_id: str, log_types: List[str]) -> str:
+        """Generate SQL query using LLM based on user query and CSV schemas"""
         
-        messages = [
-            {"role": "system", "content": system_prompt.format(
-                schema_description=schema_description,
-                user_query=user_query
-            )}
-        ]
+        # Static rules first (cacheable prefix), then the per-dataset digest
+        tables = {log_type: self.csv_data.get(log_type) for log_type in log_types}
+        context = prompt_builder.digest_sections(tables)
+        context += [f"{log_type}: {self.schemas[log_type]['error']}" for log_type in log_types
+                    if log_type in self.schemas and "error" in self.schemas[log_type]]
+        
+        messages = prompt_builder.build_messages(self.SQL_INSTRUCTIONS, f"User query: {user_query}", context)
         
         response = llm_provider.query(messages, temperature=0.1, max_tokens=500)
         
@@ -92,8 +89,11 @@ Generate a SQL query that answers the user's question. Return ONLY the SQL query
         else:
             raise Exception(f"Failed to generate SQL query: {response.get('error', 'Unknown error')}")
     
+    @traced("sql.execute")
     def execute_sql_query(self, sql_query: str, log_types: List[str]) -> Dict[str, Any]:
         """Execute SQL query using pandasql on the loaded CSV data"""
+        span = current_span().set(tables=[log_type for log_type, df in self.csv_data.items() if df is not None],
+                                  rows_scanned=sum(len(df) for df in self.csv_data.values() if df is not None))
         try:
             # Create DataFrames in the local namespace for pandasql
             # This follows the tutorial pattern where DataFrames are available as variables
@@ -104,16 +104,17 @@ Generate a SQL query that answers the user's question. Return ONLY the SQL query
             
             # Execute the SQL query using locals() as shown in the tutorial
             result_df = sqldf(sql_query, locals())
+            span.set(rows=len(result_df))
             
             print(f"[DEBUG] pandasql result type: {type(result_df)}")
             print(f"[DEBUG] pandasql result shape: {result_df.shape if hasattr(result_df, 'shape') else 'N/A'}")
             print(f"[DEBUG] pandasql result columns: {list(result_df.columns) if hasattr(result_df, 'columns') else 'N/A'}")
             print(f"[DEBUG] pandasql result head: {result_df.head(2).to_dict('records') if len(result_df) > 0 else 'Empty'}")
             
-            # Convert result to dictionary
+            # Keep the result lazy; records are built when serialized
             if len(result_df) > 0:
-                result_data = result_df.to_dict('records')
-                print(f"[DEBUG] Converted to dict records: {len(result_data)} records")
+                result_data = ResultSet(result_df)
+                print(f"[DEBUG] Result rows: {len(result_data)}")
                 return {
                     "success": True,
                     "data": result_data,
@@ -129,6 +130,7 @@ Generate a SQL query that answers the user's question. Return ONLY the SQL query
                 }
                 
         except Exception as e:
+            span.record_error(e)
             return {
                 "success": False,
                 "error": str(e),
@@ -136,7 +138,7 @@ Generate a SQL query that answers the user's question. Return ONLY the SQL query
             }
     
     def _create_schema_description(self, log_types: List[str]) -> str:
-        """Create a human-readable schema description for the LLM"""
+        """Create a compact schema description (types, cardinalities, top values) for the LLM"""
         schema_desc = []
         
         for log_type in log_types:
@@ -146,18 +148,11 @@ Generate a SQL query that answers the user's question. Return ONLY the SQL query
                 if "error" in schema:
                     schema_desc.append(f"{log_type}: {schema['error']}")
                 else:
-                    columns = schema["columns"]
-                    sample_data = schema["sample_data"]
-                    
-                    desc = f"Table '{log_type}':\n"
-                    desc += f"  Columns: {', '.join(columns)}\n"
-                    desc += f"  Row count: {schema['row_count']}\n"
-                    desc += f"  Sample data: {json.dumps(sample_data[:2], indent=2)}"
-                    
-                    schema_desc.append(desc)
+                    schema_desc.append(prompt_builder.schema_digest(log_type, self.csv_data[log_type]))
         
         return "\n\n".join(schema_desc)
     
+    @traced("sql.process_query_request")
     def process_query_request(self, user_query: str, client_id: str, log_types: List[str]) -> Dict[str, Any]:
         """Main method to process a query request using log data from S3"""
         try:
@@ -182,7 +177,7 @@ Generate a SQL query that answers the user's question. Return ONLY the SQL query
                         if result["row_count"] > 0:
                             # Return the query results in the format expected by the frontend
                             logs_data[log_type] = {
-                                "full_data": result["data"],
+                                "full_data": to_records(result["data"]),
                                 "total_entries": result["row_count"],
                                 "columns": result["columns"]
                             }
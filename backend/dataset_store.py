@@ -0,0 +1,310 @@
+# dataset_store.py - Cached log DataFrames with lazily built indexes
+
+import re
+import json
+import time
+import hashlib
+import asyncio
+import threading
+import numpy as np
+import pandas as pd
+from collections import defaultdict
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from config import Config
+from log_fetcher import log_fetcher
+from tracing import tracer, traced, current_span
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """Hash of a frame's columns and values (equal frames hash equal in any process)"""
+    digest = hashlib.sha256(json.dumps(list(df.columns)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:32]
+
+class Dataset:
+    """One client's log type as a DataFrame plus indexes built on first use
+    
+    Indexes are keyed by column and live as long as this dataset version:
+    - time index: row ids sorted by a column, for range lookups via searchsorted
+    - categorical index: value -> row ids, for low-cardinality columns
+    - trigram index: lowercased trigram -> row ids, for substring candidates
+    - text index: factorized column (row codes + lowercased distinct values
+      joined into one string), for keyword search over distinct values only
+    """
+    
+    def __init__(self, client_id: str, log_type: str, df: pd.DataFrame, version: int):
+        self.client_id = client_id
+        self.log_type = log_type
+        self.df = df
+        self.columns = list(df.columns)
+        self.version = version
+        self.loaded_at = time.time()
+        self._indexes = {}
+        self._lock = threading.RLock()  # Index builders may use other indexes
+    
+    def __len__(self):
+        return len(self.df)
+    
+    def _index(self, kind: str, column: str, build):
+        key = (kind, column)
+        index = self._indexes.get(key)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(key)
+                if index is None:
+                    started = time.time()
+                    index = build(column)
+                    self._indexes[key] = index
+                    print(f"[DEBUG] Built {kind} index on {self.log_type}.{column} in {time.time() - started:.3f}s")
+        return index
+    
+    def values(self, column: str) -> np.ndarray:
+        """Column as an object array of strings (CSV values arrive as strings)"""
+        return self._index("values", column, lambda c: self.df[c].fillna('').astype(str).to_numpy())
+    
+    def lowered(self, column: str) -> np.ndarray:
+        return self._index("lowered", column, lambda c: pd.Series(self.values(c)).str.lower().to_numpy())
+    
+    def numeric(self, column: str) -> np.ndarray:
+        return self._index("numeric", column, lambda c: pd.to_numeric(self.df[c], errors='coerce').to_numpy(dtype=float))
+    
+    def cardinality(self, column: str) -> int:
+        return self._index("cardinality", column, lambda c: int(self.df[c].nunique(dropna=False)))
+    
+    def time_index(self, column: str):
+        """(sorted values, row ids in that order)"""
+        def build(c):
+            values = self.values(c)
+            order = np.argsort(values, kind='stable')
+            return values[order], order
+        return self._index("time", column, build)
+    
+    def categorical_index(self, column: str) -> Dict[str, np.ndarray]:
+        return self._index("categorical", column, lambda c: pd.Series(self.values(c)).groupby(self.values(c), sort=False).indices)
+    
+    def trigram_index(self, column: str) -> Dict[str, np.ndarray]:
+        def build(c):
+            postings = defaultdict(list)
+            for row_id, text in enumerate(self.lowered(c)):
+                for gram in {text[i:i + 3] for i in range(len(text) - 2)}:
+                    postings[gram].append(row_id)
+            return {gram: np.array(ids, dtype=np.int64) for gram, ids in postings.items()}
+        return self._index("trigram", column, build)
+    
+    def text_index(self, column: str):
+        """(row codes, '\n'-joined lowercased distinct values, start offset of each value)"""
+        def build(c):
+            codes, uniques = pd.factorize(self.values(c))
+            lowered = [value.lower() for value in uniques]
+            offsets = np.zeros(len(lowered), dtype=np.int64)
+            if lowered:
+                offsets[1:] = np.cumsum([len(value) + 1 for value in lowered[:-1]])
+            return codes, "\n".join(lowered), offsets
+        return self._index("text", column, build)
+    
+    def fingerprint(self) -> str:
+        """Content hash of the frame; unlike version it survives reloads and matches across workers"""
+        return self._index("fingerprint", "*", lambda _: frame_fingerprint(self.df))
+    
+    def search(self, keywords: List[str], columns: List[str] = None) -> np.ndarray:
+        """Sorted ids of rows where any column contains any keyword (case-insensitive)
+        
+        Each column is scanned once per search over its distinct values; the
+        matching values are then mapped back to rows through their codes.
+        """
+        keywords = [str(keyword).lower() for keyword in keywords if str(keyword)]
+        mask = np.zeros(len(self.df), dtype=bool)
+        if not keywords or mask.size == 0:
+            return np.flatnonzero(mask)
+        
+        pattern = re.compile("|".join(re.escape(keyword) for keyword in keywords))
+        for column in columns or self.columns:
+            codes, text, offsets = self.text_index(column)
+            positions = np.fromiter((match.start() for match in pattern.finditer(text)), dtype=np.int64)
+            if positions.size:
+                matched_values = np.zeros(len(offsets), dtype=bool)
+                matched_values[np.searchsorted(offsets, positions, 'right') - 1] = True
+                mask |= matched_values[codes]
+        return np.flatnonzero(mask)
+    
+    def index_names(self):
+        return sorted(f"{kind}:{column}" for kind, column in self._indexes)
+
+class DatasetStore:
+    """Process-wide cache of log DataFrames keyed by (client_id, log_type)
+    
+    Readers always get a complete dataset: refreshes build (and optionally
+    warm) the new version off to the side and swap it in with one assignment.
+    Each load counts as an access; access_scores() decays them over
+    DATASET_ACCESS_HALF_LIFE seconds so the prefetcher can favour hot data.
+    """
+    
+    def __init__(self, ttl: float = None):
+        self.ttl = Config.DATASET_TTL if ttl is None else ttl
+        self._datasets = {}
+        self._versions = defaultdict(int)
+        self._access = {}  # key -> (decayed count, last access time)
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "loads": 0, "errors": 0}
+    
+    def get(self, client_id: str, log_type: str, log_data: Dict[str, Any] = None) -> Optional[Dataset]:
+        """Cached dataset, built from log_data if given or fetched from S3 when stale"""
+        return self.load(client_id, log_type, log_data)[0]
+    
+    @traced("dataset_store.load")
+    def load(self, client_id: str, log_type: str, log_data: Dict[str, Any] = None) -> Tuple[Optional[Dataset], Optional[Dict[str, Any]]]:
+        """(dataset, None) or (None, log_fetcher error dict)
+        
+        Concurrent loads of the same key wait for a single S3 fetch.
+        """
+        key = (client_id, log_type)
+        span = current_span().set(client_id=client_id, log_type=log_type, cache_hit=False)
+        
+        with self._lock:
+            now = time.time()
+            count, last = self._access.get(key, (0.0, now))
+            self._access[key] = (count * 0.5 ** ((now - last) / Config.DATASET_ACCESS_HALF_LIFE) + 1, now)
+            dataset = self._fresh(key)
+            if dataset is not None:
+                span.set(cache_hit=True, rows=len(dataset))
+                return dataset, None
+        
+        with self._key_lock(key):
+            with self._lock:
+                dataset = self._fresh(key)
+                if dataset is not None:
+                    # Another request fetched it while this one waited
+                    span.set(cache_hit=True, rows=len(dataset))
+                    return dataset, None
+            dataset, error = self._fetch(client_id, log_type, log_data)
+            if dataset is not None:
+                span.set(rows=len(dataset))
+            return dataset, error
+    
+    def refresh(self, client_id: str, log_type: str, warm: Callable[[Dataset], Any] = None) -> Tuple[Optional[Dataset], Optional[Dict[str, Any]]]:
+        """Fetch a new version now and swap it in once warm() has run on it
+        
+        Readers keep using the current version meanwhile; on failure it stays.
+        """
+        with self._key_lock((client_id, log_type)):
+            return self._fetch(client_id, log_type, None, warm)
+    
+    def peek(self, client_id: str, log_type: str) -> Optional[Dataset]:
+        """Cached dataset regardless of age, without loading or counting an access"""
+        with self._lock:
+            return self._datasets.get((client_id, log_type))
+    
+    def access_scores(self) -> Dict[Tuple[str, str], float]:
+        """Recent access frequency per key (exponentially decayed load count)"""
+        with self._lock:
+            now = time.time()
+            return {key: count * 0.5 ** ((now - last) / Config.DATASET_ACCESS_HALF_LIFE)
+                    for key, (count, last) in self._access.items()}
+    
+    def _fresh(self, key) -> Optional[Dataset]:
+        """Cached dataset if younger than the TTL (caller holds self._lock)"""
+        dataset = self._datasets.get(key)
+        if dataset is not None and time.time() - dataset.loaded_at < self.ttl:
+            self.stats["hits"] += 1
+            return dataset
+        return None
+    
+    def _key_lock(self, key) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+    
+    def _fetch(self, client_id: str, log_type: str, log_data: Dict[str, Any] = None, warm: Callable[[Dataset], Any] = None):
+        if log_data is None:
+            log_data = log_fetcher.fetch_log_data(client_id, log_type)
+        if 'error' in log_data or 'full_data' not in log_data:
+            with self._lock:
+                self.stats["errors"] += 1
+            return None, log_data if 'error' in log_data else {"error": "Unexpected log data format"}
+        
+        with tracer.span("dataset.build_frame", log_type=log_type, rows=len(log_data['full_data'])):
+            df = pd.DataFrame(log_data['full_data'])
+        return self.put(client_id, log_type, df, warm), None
+    
+    def put(self, client_id: str, log_type: str, df: pd.DataFrame, warm: Callable[[Dataset], Any] = None) -> Dataset:
+        """Install a new version of a dataset (old indexes are discarded with it)"""
+        key = (client_id, log_type)
+        with self._lock:
+            self._versions[key] += 1
+            dataset = Dataset(client_id, log_type, df, self._versions[key])
+        
+        if warm is not None:
+            warm(dataset)
+        
+        with self._lock:
+            # A newer version may have been installed while this one was warming
+            current = self._datasets.get(key)
+            if current is None or current.version < dataset.version:
+                self._datasets[key] = dataset
+            self.stats["loads"] += 1
+        return dataset
+    
+    def invalidate(self, client_id: str = None):
+        with self._lock:
+            for key in [key for key in self._datasets if client_id is None or key[0] == client_id]:
+                del self._datasets[key]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        scores = self.access_scores()
+        with self._lock:
+            return {
+                **self.stats,
+                "datasets": {
+                    f"{client_id}/{log_type}": {
+                        "rows": len(dataset),
+                        "version": dataset.version,
+                        "age_seconds": round(time.time() - dataset.loaded_at, 1),
+                        "access_score": round(scores.get((client_id, log_type), 0.0), 2),
+                        "indexes": dataset.index_names()
+                    }
+                    for (client_id, log_type), dataset in self._datasets.items()
+                }
+            }
+
+# Shared dataset cache
+dataset_store = DatasetStore()
+
+class RequestDataContext:
+    """Datasets for a single request, each loaded at most once
+    
+    Every stage of a request (generated query, text-search fallback, summary)
+    reads through the same context, so a failed query never refetches from S3.
+    """
+    
+    def __init__(self, client_id: str, store: DatasetStore = None):
+        self.client_id = client_id
+        self.store = store or dataset_store
+        self.errors = {}
+        self._datasets = {}
+        self._lock = threading.Lock()
+    
+    def dataset(self, log_type: str) -> Optional[Dataset]:
+        """The request's dataset for log_type (None if it failed to load, see errors)"""
+        with self._lock:
+            if log_type in self._datasets:
+                return self._datasets[log_type]
+        
+        dataset, error = self.store.load(self.client_id, log_type)
+        
+        with self._lock:
+            # Keep the first result if another stage loaded it concurrently
+            dataset = self._datasets.setdefault(log_type, dataset)
+            if dataset is None:
+                self.errors[log_type] = error
+            return dataset
+    
+    def frame(self, log_type: str) -> pd.DataFrame:
+        dataset = self.dataset(log_type)
+        return dataset.df if dataset is not None else pd.DataFrame()
+    
+    def error(self, log_type: str) -> Optional[str]:
+        error = self.errors.get(log_type)
+        return error.get('error') if error else None
+    
+    async def aload(self, log_types: List[str]):
+        """Load several log types concurrently on worker threads"""
+        await asyncio.gather(*[asyncio.to_thread(self.dataset, log_type) for log_type in log_types])
@@ -0,0 +1,95 @@
+# db_pool.py - Pooled SQLite connections in WAL mode
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator
+from config import Config
+
+class ConnectionPool:
+    """Reusable SQLite connections for one database file
+    
+    Connections are opened once with WAL journaling (readers never wait for
+    the writer) and tuned pragmas, then handed out one caller at a time and
+    returned for reuse - the most recently used first, so a busy thread keeps
+    getting a connection whose statement cache is already warm. sqlite3
+    caches prepared statements per connection (DB_STATEMENT_CACHE_SIZE), so
+    repeated queries skip parsing as well.
+    
+    Up to DB_POOL_SIZE idle connections are kept; extra ones opened under
+    load are closed when returned. A forked child discards the parent's.
+    """
+    
+    def __init__(self, path: str, size: int = None):
+        self.path = path
+        self.size = Config.DB_POOL_SIZE if size is None else size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.stats = {"opened": 0, "reused": 0, "closed": 0}
+    
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=Config.DB_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,  # Only one thread uses a connection at a time
+            cached_statements=Config.DB_STATEMENT_CACHE_SIZE
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={Config.DB_SYNCHRONOUS}')
+        conn.execute(f'PRAGMA cache_size=-{Config.DB_CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size={Config.DB_MMAP_SIZE}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute(f'PRAGMA busy_timeout={Config.DB_BUSY_TIMEOUT_MS}')
+        with self._lock:
+            self.stats["opened"] += 1
+        return conn
+    
+    def _acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Connections must not cross a fork; the parent still owns them
+                self._idle = []
+                self._pid = os.getpid()
+            if self._idle:
+                self.stats["reused"] += 1
+                return self._idle.pop()
+        return self._open()
+    
+    def _release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+            self.stats["closed"] += 1
+        conn.close()
+    
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """A pooled connection for the duration of the block (uncommitted work is rolled back)"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+    
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """A pooled connection inside a transaction, committed when the block succeeds"""
+        with self.connection() as conn:
+            with conn:
+                yield conn
+    
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self.stats["closed"] += len(idle)
+        for conn in idle:
+            conn.close()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "idle": len(self._idle), "size": self.size}
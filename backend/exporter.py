@@ -0,0 +1,76 @@
+# exporter.py - Streaming CSV / NDJSON / Arrow exports of result sets
+
+import io
+import csv
+from typing import Dict, Iterator
+from flask import Response, stream_with_context
+from config import Config
+from result_set import ResultSet
+from response_encoder import response_encoder, ARROW_STREAM, pa
+from compression import negotiate_encoding, compress_stream, coalesce
+
+class LogExporter:
+    """Writes result sets page by page, so memory stays bounded by one page
+    
+    Rows are never collected into a Python list: each page is a slice of the
+    underlying DataFrame written with pandas' CSV/JSON writers or as one
+    Arrow record batch.
+    """
+    
+    MEDIA_TYPES = {
+        'csv': 'text/csv',
+        'ndjson': 'application/x-ndjson',
+        'arrow': ARROW_STREAM
+    }
+    
+    def formats(self):
+        return [name for name in self.MEDIA_TYPES if name != 'arrow' or pa is not None]
+    
+    def response(self, results: Dict[str, ResultSet], export_format: str, filename: str) -> Response:
+        """Chunked (and negotiated-compressed) download of results
+        
+        results maps log type -> ResultSet; CSV and Arrow take a single log
+        type, NDJSON tags each row with its log type when there are several.
+        """
+        if export_format == 'csv':
+            chunks = self.iter_csv(next(iter(results.values())))
+        elif export_format == 'ndjson':
+            chunks = self.iter_ndjson(results)
+        else:
+            log_type, result = next(iter(results.items()))
+            chunks = response_encoder.iter_encode({"log_type": log_type, "full_data": result}, ARROW_STREAM)
+        
+        chunks = coalesce(chunks)
+        encoding = negotiate_encoding()
+        if encoding:
+            chunks = compress_stream(chunks, encoding)
+        
+        response = Response(stream_with_context(chunks), mimetype=self.MEDIA_TYPES[export_format])
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+        response.headers['X-Accel-Buffering'] = 'no'
+        response.headers['Vary'] = 'Accept-Encoding'
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
+    
+    def iter_csv(self, result: ResultSet) -> Iterator[bytes]:
+        header = io.StringIO()
+        csv.writer(header).writerow(result.columns)
+        yield header.getvalue().encode('utf-8')
+        
+        for start in range(0, len(result), Config.STREAM_JSON_PAGE_ROWS):
+            frame = result.frame(start, start + Config.STREAM_JSON_PAGE_ROWS)
+            yield frame.to_csv(index=False, header=False, lineterminator='\r\n').encode('utf-8')
+    
+    def iter_ndjson(self, results: Dict[str, ResultSet]) -> Iterator[bytes]:
+        tag = len(results) > 1
+        for log_type, result in results.items():
+            for start in range(0, len(result), Config.STREAM_JSON_PAGE_ROWS):
+                frame = result.frame(start, start + Config.STREAM_JSON_PAGE_ROWS)
+                if tag:
+                    frame = frame.assign(log_type=log_type)
+                lines = frame.to_json(orient='records', lines=True, force_ascii=False)
+                yield (lines if lines.endswith('\n') else lines + '\n').encode('utf-8')
+
+# Shared exporter
+log_exporter = LogExporter()
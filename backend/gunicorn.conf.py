@@ -0,0 +1,114 @@
+# gunicorn.conf.py - Production serving configuration
+#
+# Usage: gunicorn -c gunicorn.conf.py app:app
+#
+# Worker model: gthread (threaded workers). A chat request spends nearly all
+# of its time waiting for LLM calls, which already run on each worker's
+# shared asyncio loop (llm_provider.run_async), so a request thread is cheap
+# while it waits and one worker can hold many concurrent chat sessions.
+# Processes add CPU parallelism for the pandas work between the waits.
+# gevent is not used: monkey-patching would fight that event loop and SQLite.
+#
+# Sizing (all overridable through the environment):
+#   workers = usable CPUs (cgroup quota aware), between 2 and GUNICORN_MAX_WORKERS
+#   threads = 1 + GUNICORN_IO_WAIT_RATIO (time waiting on I/O per unit of CPU
+#             time in a request), capped at GUNICORN_MAX_THREADS. The default
+#             ratio of 15 gives 16 threads: enough to overlap LLM waits
+#             without dozens of threads contending for the GIL in pandas work.
+# WEB_CONCURRENCY / GUNICORN_THREADS set the values directly.
+#
+# Streaming ceiling: an open /api/chat/stream response holds its thread until
+# the last event is sent, LLM waits included, so a host serves at most
+# workers x threads concurrent streams, and every open stream is a thread
+# that short requests (login, logs, health) cannot use. STREAM_MAX_CONCURRENT
+# (default: threads - GUNICORN_RESERVED_THREADS, at least 1) caps streams per
+# worker and answers the rest with 503 + Retry-After. Raise threads (and
+# memory) for more streams; measure with `load_test.py --mode stream`.
+#
+# Graceful reload: `kill -HUP <master pid>` starts new workers with fresh code
+# and lets the old ones finish in-flight requests (up to graceful_timeout).
+# Workers are also recycled after max_requests (+ jitter) requests.
+
+import os
+import math
+
+def _available_cpus() -> int:
+    """CPUs this process may use: affinity mask, limited by a cgroup v2/v1 quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    
+    quota = None
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            limit, period = f.read().split()
+            if limit != 'max':
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return cpus
+
+def _workers(cpus: int) -> int:
+    if os.getenv('WEB_CONCURRENCY'):
+        return int(os.getenv('WEB_CONCURRENCY'))
+    return max(2, min(cpus, int(os.getenv('GUNICORN_MAX_WORKERS', '8'))))
+
+def _threads() -> int:
+    if os.getenv('GUNICORN_THREADS'):
+        return int(os.getenv('GUNICORN_THREADS'))
+    io_wait_ratio = float(os.getenv('GUNICORN_IO_WAIT_RATIO', '15'))
+    return max(1, min(math.ceil(1 + io_wait_ratio), int(os.getenv('GUNICORN_MAX_THREADS', '128'))))
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = 'gthread'
+workers = _workers(_available_cpus())
+threads = _threads()
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))  # Open keep-alive connections per worker
+
+# Threads kept free of SSE streams for short requests (read by config.py in the workers)
+os.environ.setdefault('STREAM_MAX_CONCURRENT', str(max(1, threads - int(os.getenv('GUNICORN_RESERVED_THREADS', '4')))))
+
+# Timeouts: gthread workers heartbeat from their main thread, so `timeout`
+# only kills workers that hang; long chats are bounded by REQUEST_TIMEOUT
+# in the app instead. graceful_timeout is how long in-flight requests may
+# run on during reload or shutdown.
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '60'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# Recycle workers to bound memory growth (dataset caches, fragmentation)
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '5000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '500'))
+
+# Loading the app in the master shares its imports with every worker; off by
+# default so a HUP reload picks up new code
+preload_app = os.getenv('GUNICORN_PRELOAD', 'false').lower() == 'true'
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+# The app must not start background threads (warm-up, prefetcher, history
+# maintenance) at import: under preload that would happen in the master,
+# whose threads do not survive fork. Each worker warms up after it loads.
+os.environ['STARTUP_WARMUP'] = 'false'
+
+def when_ready(server):
+    server.log.info(f"Serving with {workers} gthread workers x {threads} threads, up to "
+                    f"{os.environ['STREAM_MAX_CONCURRENT']} streams per worker "
+                    f"(timeout {timeout}s, graceful {graceful_timeout}s)")
+
+def post_worker_init(worker):
+    from startup import readiness
+    readiness.warm_up()
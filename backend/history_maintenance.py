@@ -0,0 +1,279 @@
+# history_maintenance.py - Retention, archival and compaction for the query-history database
+
+import os
+import re
+import json
+import gzip
+import time
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+from config import Config
+from models import db, VulnerableDatabase
+
+# Archived tables and their columns (id and timestamp first)
+ARCHIVED_TABLES = {
+    'log_queries': ['id', 'timestamp', 'client_id', 'query', 'response', 'executed_code'],
+    'access_logs': ['id', 'timestamp', 'client_id', 'accessed_resource', 'ip_address']
+}
+
+class HistoryMaintenance:
+    """Background retention for log_queries/access_logs
+    
+    Rows older than the client's retention age, or beyond its newest
+    max_rows, are moved into gzip JSON-lines archives partitioned by table,
+    client and month (HISTORY_ARCHIVE_DIR/<table>/<client>/<YYYY-MM>.jsonl.gz)
+    and deleted. search_archive() reads them back on demand.
+    
+    Each batch is archived and deleted inside one short BEGIN IMMEDIATE
+    transaction, so concurrent workers never archive a row twice and
+    readers (WAL) are never blocked. The archive is written before the
+    delete commits (a failed commit must not lose rows), so a retried batch
+    can repeat rows in a partition; search_archive() skips the repeats.
+    Freed pages are returned to the filesystem with incremental vacuum, a
+    few pages per step; switching an existing database to incremental
+    vacuum needs one full VACUUM, which only runs once a retention policy
+    is active and below HISTORY_FULL_VACUUM_MAX_MB.
+    """
+    
+    def __init__(self, database: VulnerableDatabase = None):
+        self.db = database or db
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {"runs": 0, "archived": 0, "vacuumed_pages": 0, "last_run_seconds": None, "last_error": None}
+        self._vacuum_skip_logged = False
+    
+    def start(self):
+        if not Config.HISTORY_MAINTENANCE_ENABLED or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="history-maintenance", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+    
+    def _run(self):
+        # First pass shortly after startup, then every HISTORY_MAINTENANCE_INTERVAL seconds
+        delay = min(60.0, Config.HISTORY_MAINTENANCE_INTERVAL)
+        while not self._stop.wait(delay):
+            self.run_once()
+            delay = Config.HISTORY_MAINTENANCE_INTERVAL
+    
+    def policy(self, client_id: str) -> Dict[str, Any]:
+        """{"days": ..., "max_rows": ...} for a client (0 disables that limit)"""
+        policy = {"days": Config.HISTORY_RETENTION_DAYS, "max_rows": Config.HISTORY_MAX_ROWS_PER_CLIENT}
+        policy.update(Config.HISTORY_RETENTION_OVERRIDES.get(client_id, {}))
+        return policy
+    
+    def retention_active(self) -> bool:
+        """True when a global limit or any per-client override would expire rows"""
+        if Config.HISTORY_RETENTION_DAYS or Config.HISTORY_MAX_ROWS_PER_CLIENT:
+            return True
+        return any(override.get("days") or override.get("max_rows")
+                   for override in Config.HISTORY_RETENTION_OVERRIDES.values())
+    
+    def run_once(self) -> Dict[str, Any]:
+        """One maintenance pass: enforce retention on every table and client, then vacuum"""
+        started = time.time()
+        archived = 0
+        try:
+            # Without a retention policy nothing is deleted, so the database is left as it is
+            if self.retention_active():
+                self._enable_incremental_vacuum()
+                for table in ARCHIVED_TABLES:
+                    with self.db.pool.connection() as conn:
+                        clients = [row[0] for row in conn.execute(f'SELECT DISTINCT client_id FROM {table}')]
+                    for client_id in clients:
+                        if self._stop.is_set():
+                            break
+                        archived += self._expire(table, client_id)
+            vacuumed = self._incremental_vacuum()
+            error = None
+        except Exception as e:
+            vacuumed, error = 0, str(e)
+            print(f"[DEBUG] History maintenance failed: {e}")
+        
+        with self._lock:
+            self.stats["runs"] += 1
+            self.stats["archived"] += archived
+            self.stats["vacuumed_pages"] += vacuumed
+            self.stats["last_run_seconds"] = round(time.time() - started, 3)
+            self.stats["last_error"] = error
+        if archived or vacuumed:
+            print(f"[DEBUG] History maintenance archived {archived} rows, vacuumed {vacuumed} pages")
+        return {"archived": archived, "vacuumed_pages": vacuumed, "error": error}
+    
+    def _expire(self, table: str, client_id: str) -> int:
+        """Archive and delete the client's rows outside its retention policy, in batches"""
+        policy = self.policy(client_id)
+        columns = ARCHIVED_TABLES[table]
+        conditions, params = [], []
+        
+        if policy.get("days"):
+            conditions.append('timestamp < ?')
+            params.append((datetime.now() - timedelta(days=policy["days"])).isoformat())
+        if policy.get("max_rows"):
+            # Newest row past the cap; it and everything older go
+            with self.db.pool.connection() as conn:
+                boundary = conn.execute(
+                    f'SELECT timestamp, id FROM {table} WHERE client_id IS ? ORDER BY timestamp DESC, id DESC LIMIT 1 OFFSET ?',
+                    (client_id, policy["max_rows"])
+                ).fetchone()
+            if boundary:
+                conditions.append('(timestamp, id) <= (?, ?)')
+                params.extend(boundary)
+        if not conditions:
+            return 0
+        
+        sql = f"""
+            SELECT {', '.join(columns)} FROM {table}
+            WHERE client_id IS ? AND ({' OR '.join(conditions)})
+            ORDER BY timestamp, id LIMIT ?
+        """
+        archived = 0
+        while not self._stop.is_set():
+            with self.db.pool.connection() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    rows = conn.execute(sql, [client_id] + params + [Config.HISTORY_MAINTENANCE_BATCH]).fetchall()
+                    if rows:
+                        self._archive(table, client_id, columns, rows)
+                        conn.executemany(f'DELETE FROM {table} WHERE id = ?', [(row[0],) for row in rows])
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            archived += len(rows)
+            if len(rows) < Config.HISTORY_MAINTENANCE_BATCH:
+                break
+        return archived
+    
+    def _archive(self, table: str, client_id: str, columns: List[str], rows: List[tuple]):
+        """Append rows to their monthly partitions (gzip members concatenate)"""
+        partitions = {}
+        for row in rows:
+            record = dict(zip(columns, row))
+            month = record['timestamp'][:7] if isinstance(record['timestamp'], str) else 'unknown'
+            partitions.setdefault(month, []).append(json.dumps(record, default=str))
+        
+        directory = self._partition_dir(table, client_id)
+        os.makedirs(directory, exist_ok=True)
+        for month, lines in partitions.items():
+            with gzip.open(os.path.join(directory, f'{month}.jsonl.gz'), 'at', encoding='utf-8') as archive:
+                archive.write('\n'.join(lines) + '\n')
+    
+    def _partition_dir(self, table: str, client_id: Optional[str]) -> str:
+        # client_id comes from requests; keep it to one safe path component
+        safe_client = re.sub(r'[^A-Za-z0-9_.-]', '_', str(client_id)).lstrip('.') or '_'
+        return os.path.join(Config.HISTORY_ARCHIVE_DIR, table, safe_client)
+    
+    def _enable_incremental_vacuum(self):
+        """auto_vacuum=INCREMENTAL only takes effect after one full VACUUM (also for new WAL databases)
+        
+        VACUUM holds the write lock while it rewrites the whole file, so it is
+        skipped (and logged once) for databases over HISTORY_FULL_VACUUM_MAX_MB;
+        run it in a maintenance window or raise the limit to opt in.
+        """
+        with self.db.pool.connection() as conn:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+                return
+            size_mb = conn.execute('PRAGMA page_count').fetchone()[0] * conn.execute('PRAGMA page_size').fetchone()[0] / 1048576
+            if size_mb > Config.HISTORY_FULL_VACUUM_MAX_MB:
+                if not self._vacuum_skip_logged:
+                    self._vacuum_skip_logged = True
+                    print(f"[DEBUG] Skipped enabling incremental vacuum: the history database is {size_mb:.0f} MB "
+                          f"(HISTORY_FULL_VACUUM_MAX_MB={Config.HISTORY_FULL_VACUUM_MAX_MB:g}); run "
+                          f"'PRAGMA auto_vacuum = INCREMENTAL; VACUUM;' in a maintenance window")
+                return
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            print("[DEBUG] Enabled incremental vacuum on the history database")
+    
+    def _incremental_vacuum(self) -> int:
+        """Release free pages a step at a time so writers only wait briefly"""
+        vacuumed = 0
+        with self.db.pool.connection() as conn:
+            while not self._stop.is_set():
+                free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+                if not free:
+                    break
+                # executescript steps the pragma to completion; execute() would not
+                conn.executescript(f'PRAGMA incremental_vacuum({Config.HISTORY_VACUUM_STEP_PAGES});')
+                remaining = conn.execute('PRAGMA freelist_count').fetchone()[0]
+                if remaining >= free:
+                    break
+                vacuumed += free - remaining
+        return vacuumed
+    
+    def search_archive(self, table: str = 'log_queries', client_id: str = None, text: str = None,
+                       since: str = None, until: str = None, limit: int = 50, cursor: str = None) -> Dict[str, Any]:
+        """Newest-first page of archived rows (same shape and cursor as db.search_history)
+        
+        Only partitions overlapping [since, until) are opened; text must
+        appear (case-insensitively) in one of the row's text fields.
+        """
+        limit = max(1, min(int(limit), Config.HISTORY_PAGE_MAX))
+        root = os.path.join(Config.HISTORY_ARCHIVE_DIR, table)
+        if table not in ARCHIVED_TABLES or not os.path.isdir(root):
+            return {"results": [], "count": 0, "next_cursor": None}
+        
+        directories = [self._partition_dir(table, client_id)] if client_id else \
+            [os.path.join(root, name) for name in os.listdir(root)]
+        words = text.lower().split() if text else []
+        position = None
+        if cursor:
+            timestamp, _, last_id = cursor.rpartition('|')
+            position = (timestamp, int(last_id))
+        
+        # Partitions newest month first; stop once a full page is certain
+        partitions = sorted(
+            ((name[:-len('.jsonl.gz')], os.path.join(directory, name))
+             for directory in directories if os.path.isdir(directory)
+             for name in os.listdir(directory) if name.endswith('.jsonl.gz')),
+            reverse=True
+        )
+        matches = []
+        seen = set()  # A batch whose delete failed to commit is archived again on retry
+        for month, path in partitions:
+            if since and month != 'unknown' and month < since[:7]:
+                continue
+            if until and month != 'unknown' and month > until[:7]:
+                continue
+            if position and month != 'unknown' and month > position[0][:7]:
+                continue
+            if len(matches) > limit and month < matches[limit][0][0][:7]:
+                break
+            
+            with gzip.open(path, 'rt', encoding='utf-8') as archive:
+                for line in archive:
+                    record = json.loads(line)
+                    key = (record.get('timestamp') or '', record.get('id') or 0)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    if (since and key[0] < since) or (until and key[0] >= until) or (position and key >= position):
+                        continue
+                    if words:
+                        haystack = ' '.join(str(value) for name, value in record.items() if isinstance(value, str)).lower()
+                        if not all(word in haystack for word in words):
+                            continue
+                    matches.append((key, dict(record, archived=True)))
+            matches.sort(key=lambda match: match[0], reverse=True)
+        
+        results = [record for _, record in matches[:limit]]
+        return {
+            "results": results,
+            "count": len(results),
+            "next_cursor": f"{results[-1]['timestamp']}|{results[-1]['id']}" if len(matches) > limit else None
+        }
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "running": self._thread is not None and self._thread.is_alive()}
+
+# Shared maintenance task (started by app.py)
+history_maintenance = HistoryMaintenance()
@@ -1,18 +1,41 @@
 # llm_provider.py - Flexible LLM Provider Configuration
 
 import os
-import requests
+import time
+import asyncio
+import threading
+from collections import deque
+import heapq
+import itertools
+import weakref
+import httpx
 import json
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple, Iterator, AsyncIterator
 from config import Config
+from tracing import Span, tracer, active_span, in_span
+
+class LLMProviderError(Exception):
+    """Raised by streaming calls when the provider returns an error response"""
+    
+    def __init__(self, message: str, details: str = None):
+        super().__init__(message)
+        self.details = details
 
 class LLMProvider(ABC):
     """Abstract base class for LLM providers"""
     
+    provider_name = None
+    display_name = None
+    
     @abstractmethod
-    def query(self, messages: list, temperature: float = 0.7, max_tokens: int = 2000) -> Dict[str, Any]:
-        """Send query to LLM provider"""
+    def _build_request(self, messages: list, temperature: float, max_tokens: int) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """Build the (url, headers, payload) for a completion request"""
+        pass
+    
+    @abstractmethod
+    def _extract_content(self, ai_response: Dict[str, Any]) -> str:
+        """Extract the completion text from a successful API response"""
         pass
     
     @abstractmethod
@@ -20,15 +43,169 @@ class LLMProvider(ABC):
         """Get the model name being used"""
         pass
 
+    def query(self, messages: list, temperature: float = 0.7, max_tokens: int = 2000, priority: int = None) -> Dict[str, Any]:
+        """Send query to LLM provider"""
+        # Sync callers go through the shared loop so they share admission control
+        return run_async(self.aquery(messages, temperature, max_tokens, priority))
+    
+    async def aquery(self, messages: list, temperature: float = 0.7, max_tokens: int = 2000, priority: int = None) -> Dict[str, Any]:
+        """Send query to LLM provider without blocking the event loop"""
+        with tracer.span("llm.query", "client", provider=self.provider_name, model=self.get_model_name(), max_tokens=max_tokens) as span:
+            result = await self._send_query(messages, temperature, max_tokens, priority, span)
+            span.set(success=result["success"], status_code=result.get("status_code", 200 if result["success"] else None),
+                     **result.get("usage", {}))
+            if not result["success"]:
+                span.record_error(result["error"])
+            return result
+    
+    async def _send_query(self, messages: list, temperature: float, max_tokens: int, priority: int, span) -> Dict[str, Any]:
+        url, headers, payload = self._build_request(messages, temperature, max_tokens)
+        controller = get_admission_controller(self.provider_name)
+        tokens = estimate_tokens(messages) + max_tokens
+        
+        # Rate-limited (429) calls are retried through admission control, which
+        # backs off the concurrency limit and honours Retry-After before resending
+        for attempt in range(Config.LLM_RATE_LIMIT_RETRIES + 1):
+            span.set(attempts=attempt + 1)
+            queued = time.monotonic()
+            try:
+                await controller.acquire(tokens, priority)
+            except AdmissionTimeout as e:
+                return {
+                    "error": f"{self.display_name} request not admitted: {e}",
+                    "provider": self.provider_name,
+                    "status_code": 429,
+                    "success": False
+                }
+            
+            started = time.monotonic()
+            span.add("queued_seconds", started - queued)
+            status_code = None
+            retry_after = None
+            try:
+                response = await get_async_client().post(
+                    url,
+                    headers=headers,
+                    json=payload,
+                    timeout=Config.LLM_TIMEOUT
+                )
+                status_code = response.status_code
+                retry_after = _parse_retry_after(response.headers.get('retry-after'))
+            finally:
+                controller.release(time.monotonic() - started, status_code == 429, retry_after, failed=status_code is None)
+            
+            result = self._build_result(response.status_code, response.text, response.json if response.status_code == 200 else None)
+            if status_code != 429:
+                return result
+        
+        return result
+    
+    def _build_stream_request(self, messages: list, temperature: float, max_tokens: int) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """Build the (url, headers, payload) for a streaming (SSE) completion request"""
+        url, headers, payload = self._build_request(messages, temperature, max_tokens)
+        payload["stream"] = True
+        return url, headers, payload
+    
+    @abstractmethod
+    def _extract_stream_delta(self, event: Dict[str, Any]) -> Optional[str]:
+        """Extract the text delta from one streamed SSE event, if it carries any"""
+        pass
+    
+    def stream(self, messages: list, temperature: float = 0.7, max_tokens: int = 2000, priority: int = None) -> Iterator[str]:
+        """Stream completion text chunks from the LLM provider as they are generated"""
+        return iterate_async(self.astream(messages, temperature, max_tokens, priority))
+    
+    async def astream(self, messages: list, temperature: float = 0.7, max_tokens: int = 2000, priority: int = None) -> AsyncIterator[str]:
+        """Async counterpart of stream()"""
+        url, headers, payload = self._build_stream_request(messages, temperature, max_tokens)
+        controller = get_admission_controller(self.provider_name)
+        # Ended explicitly: a generator's yields may resume in different contexts
+        span = tracer.span("llm.stream", "client", provider=self.provider_name, model=self.get_model_name(), max_tokens=max_tokens)
+        
+        try:
+            await controller.acquire(estimate_tokens(messages) + max_tokens, priority)
+        except AdmissionTimeout as e:
+            span.record_error(e).end()
+            raise LLMProviderError(f"{self.display_name} request not admitted: {e}")
+        
+        started = time.monotonic()
+        rate_limited = False
+        retry_after = None
+        failed = True
+        chunks = 0
+        try:
+            async with get_async_client().stream("POST", url, headers=headers, json=payload, timeout=Config.LLM_TIMEOUT) as response:
+                if response.status_code != 200:
+                    rate_limited = response.status_code == 429
+                    retry_after = _parse_retry_after(response.headers.get('retry-after'))
+                    details = (await response.aread()).decode('utf-8', errors='replace')
+                    raise LLMProviderError(f"{self.display_name} API error: {response.status_code}", details)
+                
+                async for line in response.aiter_lines():
+                    delta = self._parse_sse_line(line)
+                    if delta:
+                        if not chunks:
+                            span.set(first_chunk_seconds=round(time.monotonic() - started, 6))
+                        chunks += 1
+                        yield delta
+                failed = False
+        except (Exception, asyncio.CancelledError) as e:
+            span.record_error(e)
+            raise
+        finally:
+            controller.release(time.monotonic() - started, rate_limited, retry_after, failed=failed and not rate_limited)
+            span.set(success=not failed, chunks=chunks).end()
+    
+    def _extract_usage(self, ai_response: Dict[str, Any]) -> Dict[str, int]:
+        """Token usage reported by the API (OpenAI-compatible format)"""
+        usage = ai_response.get('usage') or {}
+        return {key: usage[key] for key in ('prompt_tokens', 'completion_tokens') if isinstance(usage.get(key), int)}
+    
+    def _parse_sse_line(self, line: str) -> Optional[str]:
+        if not line or not line.startswith('data:'):
+            return None
+        
+        data = line[len('data:'):].strip()
+        if not data or data == '[DONE]':
+            return None
+        
+        try:
+            return self._extract_stream_delta(json.loads(data))
+        except (ValueError, KeyError, IndexError, TypeError):
+            return None
+    
+    def _build_result(self, status_code: int, text: str, load_json) -> Dict[str, Any]:
+        """Convert a raw HTTP response into the provider result format"""
+        if status_code == 200:
+            ai_response = load_json()
+            return {
+                "content": self._extract_content(ai_response),
+                "model": self.get_model_name(),
+                "provider": self.provider_name,
+                "usage": self._extract_usage(ai_response),
+                "success": True
+            }
+        else:
+            return {
+                "error": f"{self.display_name} API error: {status_code}",
+                "details": text,
+                "provider": self.provider_name,
+                "status_code": status_code,
+                "success": False
+            }
+
 class DeepseekProvider(LLMProvider):
     """Deepseek AI provider"""
     
+    provider_name = "deepseek"
+    display_name = "Deepseek"
+    
     def __init__(self):
         self.api_key = Config.DEEPSEEK_API_KEY
         self.base_url = Config.DEEPSEEK_BASE_URL
         self.model = Config.DEEPSEEK_MODEL
     
-    def query(self, messages: list, temperature: float = 0.7, max_tokens: int = 2000) -> Dict[str, Any]:
+    def _build_request(self, messages: list, temperature: float, max_tokens: int):
         headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
@@ -36,34 +213,18 @@ class DeepseekProvider(LLMProvider):
         
         payload = {
             "model": self.model,
-            "messages": messages,
+            "messages": _plain_messages(messages),
             "temperature": temperature,
             "max_tokens": max_tokens
         }
         
-        response = requests.post(
-            f"{self.base_url}/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
-        
-        if response.status_code == 200:
-            ai_response = response.json()
-            content = ai_response['choices'][0]['message']['content']
-            return {
-                "content": content,
-                "model": self.model,
-                "provider": "deepseek",
-                "success": True
-            }
-        else:
-            return {
-                "error": f"Deepseek API error: {response.status_code}",
-                "details": response.text,
-                "provider": "deepseek",
-                "success": False
-            }
+        return f"{self.base_url}/chat/completions", headers, payload
+    
+    def _extract_content(self, ai_response: Dict[str, Any]) -> str:
+        return ai_response['choices'][0]['message']['content']
+    
+    def _extract_stream_delta(self, event: Dict[str, Any]) -> Optional[str]:
+        return event['choices'][0]['delta'].get('content')
     
     def get_model_name(self) -> str:
         return self.model
@@ -71,12 +232,15 @@ class DeepseekProvider(LLMProvider):
 class OpenAIProvider(LLMProvider):
     """OpenAI provider"""
     
+    provider_name = "openai"
+    display_name = "OpenAI"
+    
     def __init__(self):
         self.api_key = Config.OPENAI_API_KEY
         self.base_url = Config.OPENAI_BASE_URL
         self.model = Config.OPENAI_MODEL
     
-    def query(self, messages: list, temperature: float = 0.7, max_tokens: int = 2000) -> Dict[str, Any]:
+    def _build_request(self, messages: list, temperature: float, max_tokens: int):
         headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
@@ -84,34 +248,18 @@ class OpenAIProvider(LLMProvider):
         
         payload = {
             "model": self.model,
-            "messages": messages,
+            "messages": _plain_messages(messages),
             "temperature": temperature,
             "max_tokens": max_tokens
         }
         
-        response = requests.post(
-            f"{self.base_url}/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
-        
-        if response.status_code == 200:
-            ai_response = response.json()
-            content = ai_response['choices'][0]['message']['content']
-            return {
-                "content": content,
-                "model": self.model,
-                "provider": "openai",
-                "success": True
-            }
-        else:
-            return {
-                "error": f"OpenAI API error: {response.status_code}",
-                "details": response.text,
-                "provider": "openai",
-                "success": False
-            }
+        return f"{self.base_url}/chat/completions", headers, payload
+    
+    def _extract_content(self, ai_response: Dict[str, Any]) -> str:
+        return ai_response['choices'][0]['message']['content']
+    
+    def _extract_stream_delta(self, event: Dict[str, Any]) -> Optional[str]:
+        return event['choices'][0]['delta'].get('content')
     
     def get_model_name(self) -> str:
         return self.model
@@ -119,12 +267,15 @@ class OpenAIProvider(LLMProvider):
 class AnthropicProvider(LLMProvider):
     """Anthropic Claude provider"""
     
+    provider_name = "anthropic"
+    display_name = "Anthropic"
+    
     def __init__(self):
         self.api_key = Config.ANTHROPIC_API_KEY
         self.base_url = Config.ANTHROPIC_BASE_URL
         self.model = Config.ANTHROPIC_MODEL
     
-    def query(self, messages: list, temperature: float = 0.7, max_tokens: int = 2000) -> Dict[str, Any]:
+    def _build_request(self, messages: list, temperature: float, max_tokens: int):
         headers = {
             'x-api-key': self.api_key,
             'Content-Type': 'application/json',
@@ -132,12 +283,16 @@ class AnthropicProvider(LLMProvider):
         }
         
         # Convert messages to Anthropic format
-        system_message = ""
+        system_blocks = []
         user_messages = []
         
         for msg in messages:
             if msg['role'] == 'system':
-                system_message = msg['content']
+                block = {"type": "text", "text": msg['content']}
+                if msg.get('cache'):
+                    # Stable prefix: let Anthropic prompt caching reuse it across calls
+                    block["cache_control"] = {"type": "ephemeral"}
+                system_blocks.append(block)
             else:
                 user_messages.append(msg['content'])
         
@@ -155,32 +310,23 @@ class AnthropicProvider(LLMProvider):
             ]
         }
         
-        if system_message:
-            payload["system"] = system_message
-        
-        response = requests.post(
-            f"{self.base_url}/v1/messages",
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
+        if system_blocks:
+            payload["system"] = system_blocks
         
-        if response.status_code == 200:
-            ai_response = response.json()
-            content = ai_response['content'][0]['text']
-            return {
-                "content": content,
-                "model": self.model,
-                "provider": "anthropic",
-                "success": True
-            }
-        else:
-            return {
-                "error": f"Anthropic API error: {response.status_code}",
-                "details": response.text,
-                "provider": "anthropic",
-                "success": False
-            }
+        return f"{self.base_url}/v1/messages", headers, payload
+    
+    def _extract_content(self, ai_response: Dict[str, Any]) -> str:
+        return ai_response['content'][0]['text']
+    
+    def _extract_usage(self, ai_response: Dict[str, Any]) -> Dict[str, int]:
+        usage = ai_response.get('usage') or {}
+        return {"prompt_tokens": usage.get('input_tokens', 0), "completion_tokens": usage.get('output_tokens', 0)}
+    
+    def _extract_stream_delta(self, event: Dict[str, Any]) -> Optional[str]:
+        # Only content_block_delta events carry text; message_start/stop etc. are skipped
+        if event.get('type') == 'content_block_delta':
+            return event['delta'].get('text')
+        return None
     
     def get_model_name(self) -> str:
         return self.model
@@ -188,12 +334,15 @@ class AnthropicProvider(LLMProvider):
 class GoogleAIProvider(LLMProvider):
     """Google AI (Gemini) provider"""
     
+    provider_name = "google"
+    display_name = "Google AI"
+    
     def __init__(self):
         self.api_key = Config.GOOGLE_API_KEY
         self.base_url = Config.GOOGLE_BASE_URL
         self.model = Config.GOOGLE_MODEL
     
-    def query(self, messages: list, temperature: float = 0.7, max_tokens: int = 2000) -> Dict[str, Any]:
+    def _build_request(self, messages: list, temperature: float, max_tokens: int):
         headers = {
             'Content-Type': 'application/json'
         }
@@ -214,32 +363,436 @@ class GoogleAIProvider(LLMProvider):
             }
         }
         
-        response = requests.post(
-            f"{self.base_url}/models/{self.model}:generateContent?key={self.api_key}",
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
+        return f"{self.base_url}/models/{self.model}:generateContent?key={self.api_key}", headers, payload
+    
+    def _extract_content(self, ai_response: Dict[str, Any]) -> str:
+        return ai_response['candidates'][0]['content']['parts'][0]['text']
+    
+    def _extract_usage(self, ai_response: Dict[str, Any]) -> Dict[str, int]:
+        usage = ai_response.get('usageMetadata') or {}
+        return {"prompt_tokens": usage.get('promptTokenCount', 0), "completion_tokens": usage.get('candidatesTokenCount', 0)}
+    
+    def _build_stream_request(self, messages: list, temperature: float, max_tokens: int):
+        # Gemini streams from a separate method; alt=sse switches it to SSE framing
+        url, headers, payload = self._build_request(messages, temperature, max_tokens)
+        url = f"{self.base_url}/models/{self.model}:streamGenerateContent?alt=sse&key={self.api_key}"
+        return url, headers, payload
+    
+    def _extract_stream_delta(self, event: Dict[str, Any]) -> Optional[str]:
+        return event['candidates'][0]['content']['parts'][0].get('text')
+    
+    def get_model_name(self) -> str:
+        return self.model
+
+# Admission priorities: lower values are admitted first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+class AdmissionTimeout(Exception):
+    """Raised when a queued LLM call is not admitted before its deadline"""
+    pass
+
+class TokenBucket:
+    """Refills continuously at `per_minute`; a zero rate means unlimited"""
+    
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be consumed (0 if available now)"""
+        # A Retry-After pause applies even when the bucket has no rate limit
+        wait = max(0.0, self.paused_until - time.monotonic())
+        if not self.rate:
+            return wait
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens < amount:
+            wait = max(wait, (amount - self.tokens) / self.rate)
+        return wait
+    
+    def consume(self, amount: float):
+        if self.rate:
+            self.tokens -= min(amount, self.capacity)
+    
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class AdmissionController:
+    """Per-provider admission control for LLM calls
+    
+    Calls wait in a priority queue until the request and token buckets allow
+    them and fewer than `limit` calls are in flight. The limit follows AIMD:
+    it grows by ~1 per window of successful calls and is cut multiplicatively
+    on 429s (hard) or on latency above the target (soft).
+    """
+    
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.limit = float(Config.LLM_INITIAL_CONCURRENCY)
+        self.in_flight = 0
+        self.waiters = []  # heap of [priority, seq, tokens, future]
+        self.sequence = itertools.count()
+        self.last_decrease = 0.0
+        self.timer = None
+        self.stats = {"admitted": 0, "rate_limited": 0, "timed_out": 0}
+    
+    async def acquire(self, tokens: int, priority: int = None, timeout: float = None):
+        if priority is None:
+            priority = PRIORITY_INTERACTIVE
+        if timeout is None:
+            timeout = Config.LLM_QUEUE_TIMEOUT
         
-        if response.status_code == 200:
-            ai_response = response.json()
-            content = ai_response['candidates'][0]['content']['parts'][0]['text']
-            return {
-                "content": content,
-                "model": self.model,
-                "provider": "google",
-                "success": True
-            }
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self.sequence), tokens, future]
+        heapq.heappush(self.waiters, entry)
+        self._schedule()
+        
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if future.done():
+                # Admitted just as the deadline hit; keep the slot
+                return
+            future.cancel()
+            self.stats["timed_out"] += 1
+            raise AdmissionTimeout(f"queued longer than {timeout:.1f}s")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted, but the caller went away: give the slot back
+                self.release(0.0, False, failed=True)
+            future.cancel()
+            raise
+    
+    def release(self, latency: float, rate_limited: bool, retry_after: float = None, failed: bool = False):
+        self.in_flight -= 1
+        now = time.monotonic()
+        
+        if rate_limited:
+            self.stats["rate_limited"] += 1
+            self._decrease(Config.LLM_AIMD_DECREASE, now, now - latency)
+            # A 429 applies to the whole account, so hold every queued call back
+            self.request_bucket.pause(retry_after or Config.LLM_RATE_LIMIT_BACKOFF)
+        elif latency > Config.LLM_LATENCY_TARGET:
+            self._decrease(Config.LLM_AIMD_LATENCY_DECREASE, now, now - latency)
+        elif not failed:
+            self.limit = min(Config.LLM_MAX_CONCURRENCY, self.limit + 1.0 / self.limit)
+        
+        self._schedule()
+    
+    def _decrease(self, factor: float, now: float, started: float):
+        # Calls sent before the last cut were admitted under the old limit, so a
+        # burst of 429s from the same window only cuts the limit once
+        if started >= self.last_decrease:
+            self.limit = max(1.0, self.limit * factor)
+            self.last_decrease = now
+    
+    def _schedule(self):
+        """Admit queued calls in priority order while capacity allows"""
+        while self.waiters and self.in_flight < int(self.limit):
+            priority, seq, tokens, future = self.waiters[0]
+            if future.done():
+                heapq.heappop(self.waiters)
+                continue
+            
+            wait = max(self.request_bucket.wait_time(1), self.token_bucket.wait_time(tokens))
+            if wait > 0:
+                # Re-arm when the head's deadline is sooner than the pending wake-up,
+                # e.g. an interactive call queued ahead of a large background one
+                loop = asyncio.get_running_loop()
+                if self.timer is None or loop.time() + wait < self.timer.when():
+                    if self.timer is not None:
+                        self.timer.cancel()
+                    self.timer = loop.call_later(wait, self._on_timer)
+                return
+            
+            heapq.heappop(self.waiters)
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(tokens)
+            self.in_flight += 1
+            self.stats["admitted"] += 1
+            future.set_result(True)
+    
+    def _on_timer(self):
+        self.timer = None
+        self._schedule()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": sum(1 for entry in self.waiters if not entry[3].done()),
+            **self.stats
+        }
+
+_admission_controllers = {}
+
+def get_admission_controller(provider_name: str) -> AdmissionController:
+    """Shared admission controller for a provider (limits from <PROVIDER>_REQUESTS_PER_MINUTE etc.)"""
+    controller = _admission_controllers.get(provider_name)
+    if controller is None:
+        prefix = provider_name.upper()
+        controller = AdmissionController(
+            float(os.getenv(f'{prefix}_REQUESTS_PER_MINUTE', Config.LLM_REQUESTS_PER_MINUTE)),
+            float(os.getenv(f'{prefix}_TOKENS_PER_MINUTE', Config.LLM_TOKENS_PER_MINUTE))
+        )
+        _admission_controllers[provider_name] = controller
+    return controller
+
+def get_admission_stats() -> Dict[str, Any]:
+    """Admission control state for every provider used so far"""
+    return {name: controller.get_stats() for name, controller in _admission_controllers.items()}
+
+def estimate_tokens(messages: list) -> int:
+    """Rough prompt token count (~4 characters per token)"""
+    return sum(len(msg.get('content', '')) for msg in messages) // 4 + 1
+
+def _plain_messages(messages: list) -> list:
+    """Strip local hints (e.g. the "cache" prefix flag) from OpenAI-style messages"""
+    return [{"role": msg["role"], "content": msg["content"]} for msg in messages]
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+class ProviderStats:
+    """Rolling latency and error statistics for one provider"""
+    
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)  # (latency_seconds, success)
+        self.lock = threading.Lock()
+    
+    def record(self, latency: float, success: bool):
+        with self.lock:
+            self.samples.append((latency, success))
+    
+    def percentile(self, pct: float) -> Optional[float]:
+        with self.lock:
+            latencies = sorted(latency for latency, success in self.samples if success)
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, int(round(pct / 100.0 * (len(latencies) - 1))))
+        return latencies[index]
+    
+    def error_rate(self) -> float:
+        with self.lock:
+            if not self.samples:
+                return 0.0
+            return sum(1 for _, success in self.samples if not success) / len(self.samples)
+    
+    def count(self) -> int:
+        return len(self.samples)
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures, half-open after a cooldown"""
+    
+    def __init__(self, failure_threshold: int, error_rate_threshold: float, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+    
+    def is_available(self) -> bool:
+        """Whether allow_request() would admit a call now (no state change)"""
+        with self.lock:
+            return self.state == "closed" or (self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown)
+    
+    def allow_request(self) -> bool:
+        """Admit a call that is about to be sent; after a cooldown this claims the single trial"""
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                # Let a single trial request through
+                self.state = "half_open"
+                return True
+            return False
+    
+    def abandon_trial(self):
+        """The trial ended without an answer (e.g. lost a hedge race): let the next call retry"""
+        with self.lock:
+            if self.state == "half_open":
+                self.state = "open"
+    
+    def record_success(self):
+        with self.lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+    
+    def record_failure(self, stats: ProviderStats):
+        with self.lock:
+            self.consecutive_failures += 1
+            too_many_errors = stats.count() >= 10 and stats.error_rate() >= self.error_rate_threshold
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold or too_many_errors:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+class RoutedLLMProvider(LLMProvider):
+    """Routes each call across several providers with hedging, failover and circuit breakers
+    
+    The fastest healthy provider (by rolling p50) is tried first. If it has not
+    answered within its p95 latency budget a hedged duplicate is sent to the next
+    provider and the first successful answer wins. Failed answers fail over to the
+    next provider immediately, and providers that keep failing are skipped until
+    their circuit breaker cools down.
+    """
+    
+    provider_name = "router"
+    display_name = "LLM router"
+    
+    def __init__(self, provider_names: list):
+        self.providers = {name: LLMProviderFactory.create_provider(name) for name in provider_names}
+        self.stats = {name: ProviderStats(Config.LLM_ROUTER_WINDOW) for name in self.providers}
+        self.breakers = {
+            name: CircuitBreaker(Config.LLM_CIRCUIT_FAILURES, Config.LLM_CIRCUIT_ERROR_RATE, Config.LLM_CIRCUIT_COOLDOWN)
+            for name in self.providers
+        }
+    
+    def _candidates(self) -> list:
+        """Healthy providers ordered fastest first; configured order breaks ties"""
+        names = list(self.providers)
+        healthy = [name for name in names if self.breakers[name].is_available()]
+        if not healthy:
+            # Everything is open: try the least-recently opened rather than failing outright
+            healthy = sorted(names, key=lambda name: self.breakers[name].opened_at)
+        return sorted(healthy, key=lambda name: (self.stats[name].percentile(50) or float('inf'), names.index(name)))
+    
+    def _claim(self, name: str) -> bool:
+        """Whether a call may be sent to name now; claims its half-open trial if due"""
+        if self.breakers[name].allow_request():
+            return True
+        # Everything is open: the least-recently opened fallback is still tried
+        return not any(breaker.is_available() for breaker in self.breakers.values())
+    
+    def _hedge_delay(self, name: str) -> float:
+        if self.stats[name].count() < Config.LLM_HEDGE_MIN_SAMPLES:
+            return Config.LLM_HEDGE_DELAY
+        return max(self.stats[name].percentile(95) or Config.LLM_HEDGE_DELAY, Config.LLM_HEDGE_MIN_DELAY)
+    
+    async def _attempt(self, name: str, messages: list, temperature: float, max_tokens: int, priority: int) -> Dict[str, Any]:
+        started = time.monotonic()
+        try:
+            response = await self.providers[name].aquery(messages, temperature, max_tokens, priority)
+        except asyncio.CancelledError:
+            # Losing a hedge race is not a failure
+            self.breakers[name].abandon_trial()
+            raise
+        except Exception as e:
+            response = {"error": f"{name} request failed: {e}", "provider": name, "success": False}
+        self._record(name, time.monotonic() - started, response.get("success", False))
+        return response
+    
+    def _record(self, name: str, latency: float, success: bool):
+        self.stats[name].record(latency, success)
+        if success:
+            self.breakers[name].record_success()
         else:
-            return {
-                "error": f"Google AI API error: {response.status_code}",
-                "details": response.text,
-                "provider": "google",
-                "success": False
-            }
+            self.breakers[name].record_failure(self.stats[name])
+    
+    async def aquery(self, messages: list, temperature: float = 0.7, max_tokens: int = 2000, priority: int = None) -> Dict[str, Any]:
+        candidates = self._candidates()
+        pending = set()
+        last_error = None
+        
+        try:
+            while candidates or pending:
+                if candidates:
+                    name = candidates.pop(0)
+                    if not self._claim(name):
+                        # Another call took its half-open trial since candidates were listed
+                        continue
+                    pending.add(asyncio.ensure_future(self._attempt(name, messages, temperature, max_tokens, priority)))
+                    # Wait for any in-flight request, but only up to this provider's
+                    # hedge budget while there is still someone to hedge to
+                    timeout = self._hedge_delay(name) if candidates else None
+                else:
+                    timeout = None
+                
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    response = task.result()
+                    if response.get("success"):
+                        return response
+                    last_error = response
+        finally:
+            for task in pending:
+                task.cancel()
+        
+        return last_error or {"error": "No LLM providers available", "provider": self.provider_name, "success": False}
+    
+    async def astream(self, messages: list, temperature: float = 0.7, max_tokens: int = 2000, priority: int = None) -> AsyncIterator[str]:
+        # Tokens cannot be merged from two streams, so streaming only fails over:
+        # the next provider is tried if the current one errors before its first token
+        last_error = None
+        for name in self._candidates():
+            if not self._claim(name):
+                continue
+            started = time.monotonic()
+            received = False
+            try:
+                async for delta in self.providers[name].astream(messages, temperature, max_tokens, priority):
+                    received = True
+                    yield delta
+            except (GeneratorExit, asyncio.CancelledError):
+                # Closed by the consumer: neither a success nor a failure
+                self.breakers[name].abandon_trial()
+                raise
+            except Exception as e:
+                self._record(name, time.monotonic() - started, False)
+                if received:
+                    raise
+                last_error = e
+                continue
+            self._record(name, time.monotonic() - started, True)
+            return
+        
+        raise last_error or LLMProviderError("No LLM providers available")
+    
+    def _primary(self) -> LLMProvider:
+        return self.providers[self._candidates()[0]]
+    
+    def _build_request(self, messages: list, temperature: float, max_tokens: int):
+        return self._primary()._build_request(messages, temperature, max_tokens)
+    
+    def _extract_content(self, ai_response: Dict[str, Any]) -> str:
+        return self._primary()._extract_content(ai_response)
+    
+    def _extract_usage(self, ai_response: Dict[str, Any]) -> Dict[str, int]:
+        return self._primary()._extract_usage(ai_response)
+    
+    def _extract_stream_delta(self, event: Dict[str, Any]) -> Optional[str]:
+        return self._primary()._extract_stream_delta(event)
     
     def get_model_name(self) -> str:
-        return self.model
+        return self._primary().get_model_name()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-provider latency, error rate and circuit state"""
+        return {
+            name: {
+                "model": provider.get_model_name(),
+                "p50_latency": self.stats[name].percentile(50),
+                "p95_latency": self.stats[name].percentile(95),
+                "error_rate": self.stats[name].error_rate(),
+                "samples": self.stats[name].count(),
+                "circuit": self.breakers[name].state
+            }
+            for name, provider in self.providers.items()
+        }
 
 class LLMProviderFactory:
     """Factory for creating LLM providers"""
@@ -249,6 +802,10 @@ class LLMProviderFactory:
         """Create LLM provider based on configuration"""
         
         if provider_name is None:
+            # Several configured providers are routed with hedging and failover
+            provider_names = [name.strip().lower() for name in Config.LLM_PROVIDERS.split(',') if name.strip()]
+            if len(provider_names) > 1:
+                return RoutedLLMProvider(provider_names)
             provider_name = Config.LLM_PROVIDER
         
         provider_name = provider_name.lower()
@@ -266,5 +823,83 @@ class LLMProviderFactory:
             print(f"Warning: Unknown provider '{provider_name}', defaulting to Deepseek")
             return DeepseekProvider()
 
+# Shared event loop for async LLM calls. Sync callers (Flask request threads)
+# submit coroutines here so all in-flight completions are multiplexed over one
+# loop and one pooled HTTP client instead of holding a socket per thread.
+_async_loop = None
+_async_clients = weakref.WeakKeyDictionary()
+_async_lock = threading.Lock()
+
+def _get_async_loop() -> asyncio.AbstractEventLoop:
+    global _async_loop
+    
+    with _async_lock:
+        if _async_loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="llm-event-loop", daemon=True)
+            thread.start()
+            _async_loop = loop
+    return _async_loop
+
+def get_async_client() -> httpx.AsyncClient:
+    """Get the pooled async HTTP client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=Config.LLM_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=Config.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.LLM_MAX_CONNECTIONS
+            )
+        )
+        _async_clients[loop] = client
+    return client
+
+def run_async(coro, timeout: Optional[float] = None):
+    """Run a coroutine on the shared LLM event loop and wait for its result
+    
+    On timeout the coroutine is cancelled (freeing its admission slot and
+    connection) and TimeoutError is raised.
+    """
+    parent = active_span()
+    if parent is not None:
+        # The loop thread does not inherit this thread's context
+        coro = in_span(coro, parent)
+    future = asyncio.run_coroutine_threadsafe(coro, _get_async_loop())
+    try:
+        return future.result(timeout)
+    except TimeoutError:
+        future.cancel()
+        raise
+
+def iterate_async(agen, timeout: Optional[float] = None, parent: Optional[Span] = None) -> Iterator[Any]:
+    """Drive an async generator on the shared LLM event loop from a sync caller
+    
+    timeout bounds the whole iteration, not each item. parent, if a span,
+    becomes the parent of the spans agen starts (a sync generator cannot
+    hold it open as the current span across its yields).
+    """
+    deadline = time.monotonic() + timeout if timeout else None
+    parent = parent if isinstance(parent, Span) else None
+    try:
+        while True:
+            remaining = max(deadline - time.monotonic(), 0) if deadline else None
+            step = agen.__anext__()
+            try:
+                yield run_async(in_span(step, parent) if parent else step, remaining)
+            except StopAsyncIteration:
+                return
+    finally:
+        # Closing early (e.g. client disconnect) must still run the generator's cleanup
+        run_async(_aclose(agen))
+
+async def _aclose(agen):
+    # A step cancelled by a timeout may still be unwinding on the loop
+    while agen.ag_running:
+        await asyncio.sleep(0)
+    await agen.aclose()
+
 # Global provider instance
-llm_provider = LLMProviderFactory.create_provider() 
\ No newline at end of file
+llm_provider = LLMProviderFactory.create_provider()
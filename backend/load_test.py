@@ -0,0 +1,198 @@
+# load_test.py - Concurrent chat-session load test against a running backend
+#
+# Usage: python load_test.py --url http://localhost:5000 --levels 8,32,128 --duration 30
+#        python load_test.py --mode stream --levels 8,16,32,64
+#
+# For each concurrency level, that many simulated users send chat requests
+# back to back for --duration seconds. A level is "sustained" when no
+# request fails and p95 latency stays within --slo seconds. Run it against
+# the dev server (`python app.py`) and gunicorn (`gunicorn -c gunicorn.conf.py
+# app:app`) with the same LLM backend to compare them.
+#
+# --mode stream holds that many /api/chat/stream responses open at once and
+# reads each to its done event; latency is time to the last event, and time
+# to the first event is reported as well. Meanwhile a probe requests
+# /api/health every --probe-interval seconds: each open stream pins a server
+# thread, so probe latency (and 503s from STREAM_MAX_CONCURRENT) show where
+# streams start to crowd out short requests.
+
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import httpx
+
+DEFAULT_MESSAGES = [
+    "Show me all ERROR entries in the app logs",
+    "Are there failed logins in syslog?",
+    "Summarize rejected network connections",
+    "Hello, what can you do?"
+]
+
+def _percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def _user(client: httpx.AsyncClient, args, user_id: int, deadline: float, results: dict):
+    turn = 0
+    while time.monotonic() < deadline:
+        payload = {
+            "message": args.messages[(user_id + turn) % len(args.messages)],
+            "client_id": args.client_id,
+            "session_token": args.session_token
+        }
+        turn += 1
+        started = time.monotonic()
+        try:
+            if args.mode == "stream":
+                ok = await _stream(client, args, payload, started, results)
+            else:
+                response = await client.post(f"{args.url}/api/chat", json=payload, timeout=args.timeout)
+                await response.aread()
+                ok = response.status_code == 200
+                results["statuses"][response.status_code] = results["statuses"].get(response.status_code, 0) + 1
+        except httpx.TimeoutException:
+            ok = False
+            results["statuses"]["timeout"] = results["statuses"].get("timeout", 0) + 1
+        except httpx.HTTPError as e:
+            ok = False
+            results["statuses"][type(e).__name__] = results["statuses"].get(type(e).__name__, 0) + 1
+        elapsed = time.monotonic() - started
+        if ok:
+            results["latencies"].append(elapsed)
+        else:
+            results["errors"] += 1
+
+async def _stream(client: httpx.AsyncClient, args, payload: dict, started: float, results: dict) -> bool:
+    """One streamed chat, read to the end; True when it finished with a done event"""
+    event = None
+    async with client.stream("POST", f"{args.url}/api/chat/stream", json=payload, timeout=args.timeout) as response:
+        results["statuses"][response.status_code] = results["statuses"].get(response.status_code, 0) + 1
+        if response.status_code != 200:
+            await response.aread()
+            if response.status_code == 503:
+                # Stream limit reached: back off as the server asks instead of hammering it
+                await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+            return False
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                if event is None:
+                    results["first_event_latencies"].append(time.monotonic() - started)
+                event = line[6:].strip()
+                if event == "error":
+                    results["statuses"]["error_event"] = results["statuses"].get("error_event", 0) + 1
+    return event == "done"
+
+async def _probe(client: httpx.AsyncClient, args, deadline: float, results: dict):
+    """Time a short request at a fixed interval while the level runs"""
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            response = await client.get(f"{args.url}/api/health", timeout=args.timeout)
+            if response.status_code == 200:
+                results["probe_latencies"].append(time.monotonic() - started)
+            else:
+                results["probe_errors"] += 1
+        except httpx.HTTPError:
+            results["probe_errors"] += 1
+        await asyncio.sleep(args.probe_interval)
+
+async def run_level(args, concurrency: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    results = {"latencies": [], "errors": 0, "statuses": {},
+               "first_event_latencies": [], "probe_latencies": [], "probe_errors": 0}
+    async with httpx.AsyncClient(limits=limits) as client, httpx.AsyncClient() as probe_client:
+        started = time.monotonic()
+        deadline = started + args.duration
+        tasks = [_user(client, args, user_id, deadline, results) for user_id in range(concurrency)]
+        if args.mode == "stream":
+            tasks.append(_probe(probe_client, args, deadline, results))
+        await asyncio.gather(*tasks)
+        wall = time.monotonic() - started
+    
+    latencies = results["latencies"]
+    completed = len(latencies)
+    p95 = _percentile(latencies, 0.95)
+    level = {
+        "mode": args.mode,
+        "concurrency": concurrency,
+        "completed": completed,
+        "errors": results["errors"],
+        "statuses": {str(status): count for status, count in results["statuses"].items()},
+        "throughput_rps": round(completed / wall, 2),
+        "p50_seconds": round(_percentile(latencies, 0.50), 3),
+        "p95_seconds": round(p95, 3),
+        "p99_seconds": round(_percentile(latencies, 0.99), 3),
+        "mean_seconds": round(statistics.mean(latencies), 3) if latencies else None,
+        "sustained": completed > 0 and results["errors"] == 0 and p95 <= args.slo
+    }
+    if args.mode == "stream":
+        level.update({
+            "first_event_p50_seconds": round(_percentile(results["first_event_latencies"], 0.50), 3),
+            "first_event_p95_seconds": round(_percentile(results["first_event_latencies"], 0.95), 3),
+            "probe_p95_seconds": round(_percentile(results["probe_latencies"], 0.95), 3),
+            "probe_errors": results["probe_errors"]
+        })
+        # Streams must not starve short requests either
+        level["sustained"] = level["sustained"] and results["probe_errors"] == 0 and level["probe_p95_seconds"] <= args.probe_slo
+    return level
+
+async def main_async(args) -> dict:
+    async with httpx.AsyncClient() as client:
+        health = await client.get(f"{args.url}/api/health", timeout=10)
+        health.raise_for_status()
+    
+    levels = []
+    for concurrency in args.levels:
+        level = await run_level(args, concurrency)
+        levels.append(level)
+        streaming = (f"first event p95 {level['first_event_p95_seconds']:6.2f}s  probe p95 {level['probe_p95_seconds']:6.2f}s  "
+                     if args.mode == "stream" else "")
+        print(f"{level['concurrency']:5d} users  {level['throughput_rps']:8.2f} req/s  "
+              f"p50 {level['p50_seconds']:6.2f}s  p95 {level['p95_seconds']:6.2f}s  {streaming}"
+              f"errors {level['errors']:4d}  {'ok' if level['sustained'] else 'NOT sustained'}")
+        if args.stop_on_failure and not level["sustained"]:
+            break
+    
+    sustained = [level["concurrency"] for level in levels if level["sustained"]]
+    return {
+        "url": args.url,
+        "mode": args.mode,
+        "duration_seconds": args.duration,
+        "slo_p95_seconds": args.slo,
+        "levels": levels,
+        "max_sustained_concurrency": max(sustained) if sustained else 0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test concurrent chat sessions")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--mode", choices=["chat", "stream"], default="chat",
+                        help="blocking /api/chat requests, or concurrent /api/chat/stream responses")
+    parser.add_argument("--levels", default="4,8,16,32,64,128",
+                        type=lambda value: [int(level) for level in value.split(",")],
+                        help="comma-separated concurrent user counts")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per level")
+    parser.add_argument("--slo", type=float, default=10, help="p95 latency (s) a sustained level must meet")
+    parser.add_argument("--timeout", type=float, default=120, help="client timeout per request (s)")
+    parser.add_argument("--probe-interval", type=float, default=0.5, help="seconds between /api/health probes (stream mode)")
+    parser.add_argument("--probe-slo", type=float, default=1, help="p95 probe latency (s) a sustained stream level must meet")
+    parser.add_argument("--client-id", default="maze_bank")
+    parser.add_argument("--session-token", default="maze-user-session-001")
+    parser.add_argument("--messages", type=lambda value: value.split("|"), default=DEFAULT_MESSAGES,
+                        help="'|'-separated chat messages to cycle through")
+    parser.add_argument("--stop-on-failure", action="store_true", help="stop at the first level not sustained")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+    
+    report = asyncio.run(main_async(args))
+    print(f"\nMax sustained concurrency: {report['max_sustained_concurrency']} {'streams' if args.mode == 'stream' else 'users'}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
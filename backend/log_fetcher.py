@@ -6,16 +6,19 @@ import json
 from io import StringIO
 from config import Config
 from models import db
+from tracing import tracer, traced, current_span
 
 class VulnerableLogFetcher:
     def __init__(self):
         self.clients = Config.CLIENTS
     
+    @traced("log_fetcher.fetch_log_data")
     def fetch_log_data(self, client_id, log_type, user_request=None):
         """
         VULNERABILITY: No proper authorization - any client can access any logs
         VULNERABILITY: User input directly influences data access
         """
+        current_span().set(client_id=client_id, log_type=log_type)
         
         # VULNERABILITY: Weak client validation
         if user_request and "admin" in user_request.lower():
@@ -46,11 +49,15 @@ class VulnerableLogFetcher:
             url = client_config['logs'][log_type]
             
             # VULNERABILITY: No request validation or rate limiting
-            response = requests.get(url, timeout=30)
+            with tracer.span("s3.get", "client", log_type=log_type) as span:
+                response = requests.get(url, timeout=30)
+                span.set(status_code=response.status_code, bytes=len(response.content))
             response.raise_for_status()
             
             # Parse CSV data using built-in csv module
-            csv_data = list(csv.DictReader(StringIO(response.text)))
+            with tracer.span("csv.parse", log_type=log_type) as span:
+                csv_data = list(csv.DictReader(StringIO(response.text)))
+                span.set(rows=len(csv_data))
             
             if not csv_data:
                 return {"error": "Empty or invalid log file"}
@@ -4,16 +4,70 @@ import sqlite3
 import json
 from datetime import datetime
 from config import Config
+from db_pool import ConnectionPool
+from audit_writer import AuditWriter
+
+# Schema migrations, applied in order; PRAGMA user_version records the last one
+# applied, so existing databases are upgraded in place. Scripts are idempotent.
+MIGRATIONS = [
+    # 1: per-client, time-ordered history lookups
+    """
+    CREATE INDEX IF NOT EXISTS idx_log_queries_client_ts ON log_queries (client_id, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_access_logs_client_ts ON access_logs (client_id, timestamp);
+    """,
+    # 2: full-text index over queries and responses, kept in sync by triggers
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS log_queries_fts USING fts5(query, response, content='log_queries', content_rowid='id');
+    CREATE TRIGGER IF NOT EXISTS log_queries_fts_insert AFTER INSERT ON log_queries BEGIN
+        INSERT INTO log_queries_fts (rowid, query, response) VALUES (new.id, new.query, new.response);
+    END;
+    CREATE TRIGGER IF NOT EXISTS log_queries_fts_delete AFTER DELETE ON log_queries BEGIN
+        INSERT INTO log_queries_fts (log_queries_fts, rowid, query, response) VALUES ('delete', old.id, old.query, old.response);
+    END;
+    CREATE TRIGGER IF NOT EXISTS log_queries_fts_update AFTER UPDATE OF query, response ON log_queries BEGIN
+        INSERT INTO log_queries_fts (log_queries_fts, rowid, query, response) VALUES ('delete', old.id, old.query, old.response);
+        INSERT INTO log_queries_fts (rowid, query, response) VALUES (new.id, new.query, new.response);
+    END;
+    INSERT INTO log_queries_fts (log_queries_fts) VALUES ('rebuild');
+    """
+]
 
 class VulnerableDatabase:
     def __init__(self):
         self.db_path = Config.DATABASE_PATH
+        self.pool = ConnectionPool(self.db_path)
+        self.audit = AuditWriter(self.pool)
         self.init_db()
     
     def init_db(self):
         """Initialize the vulnerable database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.pool.transaction() as conn:
+            self._create_schema(conn.cursor())
+        self._migrate()
+        
+        with self.pool.connection() as conn:
+            self.fts_enabled = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'log_queries_fts'"
+            ).fetchone() is not None
+    
+    def _migrate(self):
+        """Bring an existing database up to the latest schema version"""
+        with self.pool.connection() as conn:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for number, script in enumerate(MIGRATIONS[version:], version + 1):
+                try:
+                    # One transaction per migration; IMMEDIATE serializes concurrent workers
+                    conn.executescript(f"BEGIN IMMEDIATE; {script} PRAGMA user_version = {number}; COMMIT;")
+                    print(f"[DEBUG] Applied database migration {number}")
+                except sqlite3.OperationalError as e:
+                    # e.g. SQLite built without FTS5: stay on the previous version
+                    if conn.in_transaction:
+                        conn.rollback()
+                    print(f"[DEBUG] Database migration {number} failed: {e}")
+                    break
+    
+    def _create_schema(self, cursor):
+        """Tables and seed rows (runs inside init_db's transaction)"""
         
         # VULNERABILITY: No proper schema validation or constraints
         cursor.execute('''
@@ -52,61 +106,96 @@ class VulnerableDatabase:
             INSERT OR IGNORE INTO user_sessions (id, client_id, session_token, created_at, is_admin)
             VALUES (1, 'admin', 'admin-token-123', ?, 1)
         ''', (datetime.now().isoformat(),))
-        
-        conn.commit()
-        conn.close()
     
     def vulnerable_query(self, query_string):
         """VULNERABILITY: Direct SQL execution without sanitization"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.pool.connection() as conn:
+            try:
+                # MAJOR VULNERABILITY: Direct string interpolation in SQL
+                sql = f"SELECT * FROM log_queries WHERE query LIKE '%{query_string}%'"
+                return conn.execute(sql).fetchall()
+            except Exception as e:
+                return f"SQL Error: {str(e)}"
+    
+    def search_history(self, text=None, client_id=None, since=None, until=None, limit=50, cursor=None):
+        """Newest-first page of log_queries, parameterized and index-backed
+        
+        text is matched with the full-text index (every word must appear in
+        the query or response); client_id/since/until use the
+        (client_id, timestamp) index. Pass the returned next_cursor back as
+        cursor for the following page.
+        """
+        limit = max(1, min(int(limit), Config.HISTORY_PAGE_MAX))
+        source = 'log_queries q'
+        conditions, params = [], []
+        # Whitespace-only text has no words to match; treat it as no text filter
+        text = text.strip() if text else None
+        
+        if text and self.fts_enabled:
+            source = 'log_queries_fts JOIN log_queries q ON q.id = log_queries_fts.rowid'
+            conditions.append('log_queries_fts MATCH ?')
+            # Quote each word so user text is never parsed as FTS query syntax
+            params.append(' '.join('"' + word.replace('"', '""') + '"' for word in text.split()))
+        elif text:
+            conditions.append("(q.query LIKE ? ESCAPE '\\' OR q.response LIKE ? ESCAPE '\\')")
+            pattern = '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            params.extend([pattern, pattern])
+        
+        if client_id:
+            conditions.append('q.client_id = ?')
+            params.append(client_id)
+        if since:
+            conditions.append('q.timestamp >= ?')
+            params.append(since)
+        if until:
+            conditions.append('q.timestamp < ?')
+            params.append(until)
+        if cursor:
+            timestamp, _, last_id = cursor.rpartition('|')
+            conditions.append('(q.timestamp, q.id) < (?, ?)')
+            params.extend([timestamp, int(last_id)])
         
-        try:
-            # MAJOR VULNERABILITY: Direct string interpolation in SQL
-            sql = f"SELECT * FROM log_queries WHERE query LIKE '%{query_string}%'"
-            cursor.execute(sql)
-            results = cursor.fetchall()
-            conn.close()
-            return results
-        except Exception as e:
-            conn.close()
-            return f"SQL Error: {str(e)}"
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        sql = f"""
+            SELECT q.id, q.client_id, q.query, q.response, q.timestamp, q.executed_code
+            FROM {source} {where}
+            ORDER BY q.timestamp DESC, q.id DESC
+            LIMIT ?
+        """
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params + [limit + 1]).fetchall()
+        
+        columns = ['id', 'client_id', 'query', 'response', 'timestamp', 'executed_code']
+        results = [dict(zip(columns, row)) for row in rows[:limit]]
+        return {
+            "results": results,
+            "count": len(results),
+            "next_cursor": f"{results[-1]['timestamp']}|{results[-1]['id']}" if len(rows) > limit else None
+        }
     
     def log_query(self, client_id, query, response, executed_code=None):
-        """Log user queries with vulnerabilities"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        """Log user queries with vulnerabilities (written behind, in batches)"""
         # VULNERABILITY: No input validation or sanitization
         timestamp = datetime.now().isoformat()
-        cursor.execute('''
-            INSERT INTO log_queries (client_id, query, response, timestamp, executed_code)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (client_id, query, response, timestamp, executed_code))
-        
-        conn.commit()
-        conn.close()
+        self.audit.submit('log_queries', (client_id, query, response, timestamp, executed_code))
+    
+    def log_access(self, client_id, accessed_resource, ip_address=None):
+        """Record a resource access (written behind, in batches)"""
+        # VULNERABILITY: No input validation or sanitization
+        timestamp = datetime.now().isoformat()
+        self.audit.submit('access_logs', (client_id, accessed_resource, timestamp, ip_address))
     
     def get_client_data(self, client_id):
         """VULNERABILITY: No authorization checks"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # VULNERABILITY: Can access any client's data
-        cursor.execute('SELECT * FROM log_queries WHERE client_id = ?', (client_id,))
-        results = cursor.fetchall()
-        conn.close()
-        return results
+        with self.pool.connection() as conn:
+            # VULNERABILITY: Can access any client's data
+            return conn.execute('SELECT * FROM log_queries WHERE client_id = ?', (client_id,)).fetchall()
     
     def check_admin_access(self, token):
         """VULNERABILITY: Weak admin check"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # VULNERABILITY: Predictable admin token and weak validation
-        cursor.execute('SELECT is_admin FROM user_sessions WHERE session_token = ?', (token,))
-        result = cursor.fetchone()
-        conn.close()
+        with self.pool.connection() as conn:
+            # VULNERABILITY: Predictable admin token and weak validation
+            result = conn.execute('SELECT is_admin FROM user_sessions WHERE session_token = ?', (token,)).fetchone()
         
         return result and result[0] == 1
 
@@ -0,0 +1,122 @@
+# prefetcher.py - Background warm-up and refresh of client datasets
+
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple
+from config import Config
+from dataset_store import dataset_store, DatasetStore, Dataset
+
+class DatasetPrefetcher:
+    """Loads every client's log types at startup and refreshes them before they expire
+    
+    - each dataset is refreshed after a jittered fraction of DATASET_TTL, so
+      interactive requests find warm data and refreshes do not all line up
+    - due datasets are refreshed in order of recent access frequency, at most
+      PREFETCH_CONCURRENCY at a time
+    - new versions are fetched and indexed off to the side and swapped in
+      atomically by the dataset store; a failed refresh keeps the old version
+    """
+    
+    TICK_SECONDS = 5.0
+    
+    def __init__(self, store: DatasetStore = None):
+        self.store = store or dataset_store
+        self._next_due = {}
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+        self.stats = {"refreshes": 0, "errors": 0, "last_refresh_seconds": None}
+    
+    def start(self):
+        """Start the scheduler thread (no-op when disabled or already running)"""
+        if not Config.PREFETCH_ENABLED or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=Config.PREFETCH_CONCURRENCY, thread_name_prefix="dataset-prefetch")
+        self._thread = threading.Thread(target=self._run, name="dataset-prefetcher", daemon=True)
+        self._thread.start()
+        print(f"[DEBUG] Dataset prefetcher started for {len(self.keys())} datasets")
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.TICK_SECONDS)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    def keys(self) -> List[Tuple[str, str]]:
+        return [(client_id, log_type) for client_id, client in Config.CLIENTS.items() for log_type in client['logs']]
+    
+    def due(self, now: float = None) -> List[Tuple[str, str]]:
+        """Keys to refresh now, most accessed first (never-loaded keys are always due)"""
+        now = time.time() if now is None else now
+        scores = self.store.access_scores()
+        with self._lock:
+            keys = [key for key in self.keys() if key not in self._in_flight and self._next_due.get(key, 0) <= now]
+        return sorted(keys, key=lambda key: -scores.get(key, 0.0))
+    
+    def tick(self):
+        """Submit due refreshes within the concurrency budget"""
+        due = self.due()
+        with self._lock:
+            budget = Config.PREFETCH_CONCURRENCY - len(self._in_flight)
+            due = due[:max(budget, 0)]
+            self._in_flight.update(due)
+        for key in due:
+            self._executor.submit(self._refresh, key)
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"[DEBUG] Dataset prefetch tick failed: {e}")
+            self._stop.wait(self.TICK_SECONDS)
+    
+    def _refresh(self, key: Tuple[str, str]):
+        started = time.time()
+        try:
+            dataset, error = self.store.refresh(*key, warm=self.warm)
+        except Exception as e:
+            dataset, error = None, {"error": str(e)}
+        
+        elapsed = time.time() - started
+        with self._lock:
+            self._in_flight.discard(key)
+            if dataset is not None:
+                self.stats["refreshes"] += 1
+                self.stats["last_refresh_seconds"] = round(elapsed, 3)
+                interval = self.store.ttl * Config.PREFETCH_REFRESH_FRACTION
+            else:
+                self.stats["errors"] += 1
+                interval = Config.PREFETCH_RETRY_SECONDS
+            self._next_due[key] = time.time() + interval * (1 - random.uniform(0, Config.PREFETCH_JITTER))
+        
+        if dataset is not None:
+            print(f"[DEBUG] Prefetched {key[0]}/{key[1]} ({len(dataset)} rows) in {elapsed:.2f}s")
+        else:
+            print(f"[DEBUG] Prefetch of {key[0]}/{key[1]} failed: {error.get('error') if error else 'unknown error'}")
+    
+    def warm(self, dataset: Dataset):
+        """Build what interactive requests need first, before the swap"""
+        dataset.fingerprint()
+        if Config.PREFETCH_WARM_INDEXES:
+            for column in dataset.columns:
+                dataset.text_index(column)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            return {
+                **self.stats,
+                "running": self._thread is not None and self._thread.is_alive(),
+                "in_flight": [f"{client_id}/{log_type}" for client_id, log_type in self._in_flight],
+                "next_refresh_in": {f"{client_id}/{log_type}": round(due - now, 1) for (client_id, log_type), due in self._next_due.items()}
+            }
+
+# Shared prefetcher (started by app.py; each worker process warms its own cache)
+dataset_prefetcher = DatasetPrefetcher()
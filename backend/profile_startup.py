@@ -0,0 +1,111 @@
+# profile_startup.py - Import-time and warm-up profiling report for the backend
+#
+# Usage: python profile_startup.py [--top N] [--runs N] [--json]
+#
+# Each measurement runs in a fresh interpreter (nothing cached in-process):
+#   - wall time of `import app` (median of --runs cold starts)
+#   - the slowest modules by cumulative import time (python -X importtime)
+#   - per-component initialization time from the background warm-up
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# No network or background services while profiling
+PROFILE_ENV = {
+    "PREFETCH_ENABLED": "false",
+    "HISTORY_MAINTENANCE_ENABLED": "false"
+}
+
+IMPORT_SNIPPET = """
+import time
+started = time.perf_counter()
+import app
+print("IMPORT_SECONDS", time.perf_counter() - started)
+"""
+
+WARMUP_SNIPPET = """
+import json, time
+started = time.perf_counter()
+import app
+app.readiness.warm_up(wait=True)
+status = app.readiness.get_status()
+status["total_seconds"] = time.perf_counter() - started
+print("WARMUP_STATUS", json.dumps(status))
+"""
+
+def _run(snippet: str, *flags: str) -> subprocess.CompletedProcess:
+    env = {**os.environ, **PROFILE_ENV, "STARTUP_WARMUP": "false"}
+    return subprocess.run(
+        [sys.executable, *flags, "-c", snippet],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+
+def _marker(output: str, marker: str) -> str:
+    for line in output.splitlines():
+        if line.startswith(marker + " "):
+            return line[len(marker) + 1:]
+    raise RuntimeError(f"{marker} not found in output")
+
+def import_seconds(runs: int) -> list:
+    return [float(_marker(_run(IMPORT_SNIPPET).stdout, "IMPORT_SECONDS")) for _ in range(runs)]
+
+def slowest_imports(top: int) -> list:
+    """[(cumulative_us, self_us, module)] for the modules app.py imports, slowest first"""
+    children, app_children = [], []
+    for line in _run(IMPORT_SNIPPET, "-X", "importtime").stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        # Children are printed before their parent, so collect depth-1 entries
+        # until the top-level module they belong to shows up
+        if depth == 1:
+            children.append((int(cumulative_us), int(self_us), module.strip()))
+        elif depth == 0:
+            if module.strip() == "app":
+                app_children = children
+            children = []
+    return sorted(app_children, reverse=True)[:top]
+
+def warmup_status() -> dict:
+    return json.loads(_marker(_run(WARMUP_SNIPPET).stdout, "WARMUP_STATUS"))
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile backend import and warm-up time")
+    parser.add_argument("--top", type=int, default=15, help="number of modules to list")
+    parser.add_argument("--runs", type=int, default=5, help="cold imports to time")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    
+    imports = import_seconds(args.runs)
+    modules = slowest_imports(args.top)
+    warmup = warmup_status()
+    report = {
+        "import_app_seconds": {"median": statistics.median(imports), "min": min(imports), "max": max(imports)},
+        "slowest_imports": [{"module": module, "cumulative_ms": cumulative / 1000, "self_ms": own / 1000}
+                            for cumulative, own, module in modules],
+        "warmup": warmup
+    }
+    
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    
+    timings = report["import_app_seconds"]
+    print(f"import app: median {timings['median'] * 1000:.0f} ms (min {timings['min'] * 1000:.0f}, max {timings['max'] * 1000:.0f}, {args.runs} runs)")
+    print("\nSlowest imports made by app.py (cumulative):")
+    for entry in report["slowest_imports"]:
+        print(f"  {entry['cumulative_ms']:8.1f} ms  {entry['module']}")
+    print(f"\nWarm-up: {warmup['total_seconds'] * 1000:.0f} ms to {warmup['state']}")
+    for name, component in sorted(warmup["components"].items(), key=lambda item: -(item[1]["load_seconds"] or 0)):
+        detail = component["error"] or f"{(component['load_seconds'] or 0) * 1000:.0f} ms"
+        print(f"  {name:22s} {component['state']:9s} {detail}")
+
+if __name__ == '__main__':
+    main()
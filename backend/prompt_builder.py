@@ -0,0 +1,132 @@
+# prompt_builder.py - Compact, budgeted LLM prompts with cached schema digests
+
+import threading
+import pandas as pd
+from typing import Dict, Any, List, Optional
+from config import Config
+from llm_provider import estimate_tokens
+from dataset_store import frame_fingerprint
+
+class PromptBuilder:
+    """Builds LLM messages as a stable, cacheable prefix plus per-call context
+    
+    Static instructions go first in their own system message flagged with
+    "cache" so providers can reuse the prefix (Anthropic cache_control, automatic
+    prefix caching on OpenAI/Deepseek). Table context is a compact digest -
+    column types, cardinalities and top values - instead of raw sample rows,
+    computed once per dataset and trimmed to fit the per-call token budget.
+    """
+    
+    def __init__(self):
+        self._digests = {}
+        self._lock = threading.Lock()
+    
+    def schema_digest(self, table_name: str, df: pd.DataFrame, fingerprint: str = None, compact: bool = False) -> str:
+        """Digest of a table's columns, cached by content
+        
+        fingerprint is the frame's Dataset.fingerprint() when the caller has
+        one (cached with the dataset version); otherwise the frame is hashed,
+        so a refreshed dataset never gets the previous version's digest.
+        """
+        key = (table_name, fingerprint or frame_fingerprint(df))
+        
+        with self._lock:
+            cached = self._digests.get(key)
+        if cached is None:
+            cached = self._build_digest(table_name, df)
+            with self._lock:
+                if len(self._digests) >= Config.PROMPT_DIGEST_CACHE_SIZE:
+                    self._digests.pop(next(iter(self._digests)))
+                self._digests[key] = cached
+        
+        return cached["compact" if compact else "full"]
+    
+    def _build_digest(self, table_name: str, df: pd.DataFrame) -> Dict[str, str]:
+        full_lines = [f"Table '{table_name}' ({len(df)} rows):"]
+        compact_lines = [f"Table '{table_name}' ({len(df)} rows): {', '.join(df.columns)}"]
+        
+        for column in df.columns:
+            series = df[column].dropna()
+            kind, value_range = self._describe_type(series)
+            distinct = series.nunique()
+            line = f"  - {column}: {kind}, {distinct} distinct"
+            
+            if value_range:
+                line += f", range {value_range}"
+            elif distinct > len(series) // 2:
+                # Identifier-like column: frequencies are meaningless, two examples suffice
+                line += f", e.g. {', '.join(self._short(value) for value in series.head(2))}"
+            elif distinct:
+                top_values = [self._short(value) for value in series.value_counts().index[:Config.PROMPT_DIGEST_TOP_VALUES]]
+                if distinct <= Config.PROMPT_DIGEST_TOP_VALUES:
+                    line += f": {', '.join(top_values)}"
+                else:
+                    line += f", top: {', '.join(top_values)}"
+            
+            full_lines.append(line)
+        
+        return {"full": "\n".join(full_lines), "compact": "\n".join(compact_lines)}
+    
+    def _describe_type(self, series: pd.Series):
+        """Infer a column type (CSV values arrive as strings) and its range"""
+        if series.empty:
+            return "empty", None
+        
+        sample = series.head(200)
+        numeric = pd.to_numeric(sample, errors='coerce')
+        if numeric.notna().mean() > 0.95:
+            values = pd.to_numeric(series, errors='coerce')
+            kind = "int" if (numeric.dropna() % 1 == 0).all() else "float"
+            return kind, f"{self._short(values.min())}..{self._short(values.max())}"
+        
+        if series.dtype == object and sample.astype(str).str.contains(r'^\d{4}-\d{2}-\d{2}', regex=True).mean() > 0.95:
+            values = series.astype(str)
+            return "datetime", f"{values.min()}..{values.max()}"
+        
+        return "string", None
+    
+    def _short(self, value: Any, limit: int = 40) -> str:
+        text = str(value)
+        if isinstance(value, float) and value.is_integer():
+            text = str(int(value))
+        return text if len(text) <= limit else text[:limit - 3] + "..."
+    
+    def build_messages(self, instructions: str, user_content: str, context_sections: Optional[List[Any]] = None, budget: int = None) -> list:
+        """Assemble messages, shrinking context sections to fit the token budget
+        
+        Each context section is either a string or a (full, compact) pair; the
+        compact variants are used first, then sections are truncated.
+        """
+        budget = budget or Config.PROMPT_TOKEN_BUDGET
+        messages = [{"role": "system", "content": instructions, "cache": True}]
+        
+        if context_sections:
+            sections = [section if isinstance(section, tuple) else (section, section) for section in context_sections]
+            remaining = budget - estimate_tokens(messages + [{"content": user_content}])
+            context = "\n\n".join(full for full, _ in sections)
+            
+            if estimate_tokens([{"content": context}]) > remaining:
+                context = "\n\n".join(compact for _, compact in sections)
+            if estimate_tokens([{"content": context}]) > remaining:
+                context = context[:max(0, remaining) * 4].rsplit("\n", 1)[0] + "\n  ... (truncated)"
+            
+            messages.append({"role": "system", "content": context})
+        
+        messages.append({"role": "user", "content": user_content})
+        return messages
+    
+    def digest_sections(self, tables: Dict[str, pd.DataFrame], fingerprints: Dict[str, str] = None) -> List[tuple]:
+        """(full, compact) digest pairs for build_messages"""
+        sections = []
+        for table_name, df in tables.items():
+            if df is None or df.empty:
+                continue
+            fingerprint = (fingerprints or {}).get(table_name) or frame_fingerprint(df)
+            sections.append((
+                self.schema_digest(table_name, df, fingerprint),
+                self.schema_digest(table_name, df, fingerprint, compact=True)
+            ))
+        return sections
+
+# Shared prompt builder (digest cache is process-wide)
+prompt_builder = PromptBuilder()
@@ -0,0 +1,297 @@
+# query_engine.py - Declarative filter IR: validation, planning and vectorized execution
+
+import re
+import json
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+from config import Config
+from dataset_store import Dataset, RequestDataContext
+from result_set import ResultSet
+
+class QueryIRError(Exception):
+    """Raised when the model's query IR is malformed or references unknown columns"""
+    pass
+
+class QueryPlan:
+    """Access path for one log type: index lookups first, then vectorized scans
+    
+    index_steps produce candidate row ids (intersected smallest first);
+    scan_steps are evaluated only on the surviving candidates.
+    """
+    
+    def __init__(self, log_type: str, query: Dict[str, Any]):
+        self.log_type = log_type
+        self.query = query
+        self.index_steps = []   # (kind, predicate)
+        self.scan_steps = []    # predicate
+    
+    def explain(self) -> List[str]:
+        lines = []
+        for kind, predicate in self.index_steps:
+            lines.append(f"index {kind}: {QueryEngine.describe_predicate(predicate)}")
+        for predicate in self.scan_steps:
+            lines.append(f"scan: {QueryEngine.describe_predicate(predicate)}")
+        if not lines:
+            lines.append("full scan")
+        if self.query.get("group_by"):
+            lines.append(f"group by {', '.join(self.query['group_by'])} (count)")
+        elif self.query.get("select"):
+            lines.append(f"project {', '.join(self.query['select'])}")
+        if self.query.get("limit") is not None:
+            lines.append(f"limit {self.query['limit']}")
+        return lines
+
+class QueryEngine:
+    """Executes the filter IR against cached datasets
+    
+    IR shape (one entry per log type, predicates are ANDed):
+    {"queries": [{"log_type": "app_logs",
+                  "where": [{"column": "level", "op": "eq", "value": "ERROR"}],
+                  "time_range": {"column": "timestamp", "start": "2024-01-01", "end": "2024-01-31"},
+                  "select": ["timestamp", "user"], "group_by": ["user"], "limit": 100}]}
+    """
+    
+    OPERATORS = ('eq', 'ne', 'in', 'not_in', 'contains', 'not_contains', 'startswith', 'gt', 'gte', 'lt', 'lte')
+    
+    # Cheapest predicates are scanned first
+    SCAN_COST = {'eq': 1, 'ne': 1, 'in': 1, 'not_in': 1, 'gt': 2, 'gte': 2, 'lt': 2, 'lte': 2,
+                 'startswith': 3, 'contains': 4, 'not_contains': 4}
+    
+    def __init__(self):
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"executions": 0, "plan_hits": 0, "plans_built": 0, "rows_total": 0, "rows_examined": 0}
+    
+    def parse(self, ir_text: Any) -> Dict[str, Any]:
+        """Accept the model's IR as a dict, list or JSON text (markdown fences allowed)"""
+        if isinstance(ir_text, str):
+            match = re.search(r'[\[{].*[\]}]', ir_text, re.DOTALL)
+            if not match:
+                raise QueryIRError("No JSON query found in model output")
+            try:
+                ir_text = json.loads(match.group(0))
+            except json.JSONDecodeError as e:
+                raise QueryIRError(f"Invalid query JSON: {e}")
+        
+        if isinstance(ir_text, list):
+            ir_text = {"queries": ir_text}
+        if not isinstance(ir_text, dict) or not isinstance(ir_text.get("queries", []), list):
+            raise QueryIRError("Query IR must be an object with a 'queries' list")
+        return ir_text
+    
+    def execute(self, ir: Any, log_types: List[str], context: RequestDataContext) -> Dict[str, Any]:
+        """Run the IR for each requested log type; same result shape as the pandas path"""
+        ir = self.parse(ir)
+        queries = {}
+        for query in ir.get("queries", []):
+            if not isinstance(query, dict) or query.get("log_type") not in log_types:
+                continue
+            queries[query["log_type"]] = query
+        
+        results = {}
+        for log_type in log_types:
+            dataset = context.dataset(log_type)
+            if dataset is None:
+                results[log_type] = {'data': [], 'count': 0, 'columns': []}
+                continue
+            
+            plan = self.plan(queries.get(log_type, {}), dataset)
+            result = self._run(plan, dataset)
+            print(f"[DEBUG] Query plan for {log_type}: {plan.explain()}")
+            results[log_type] = {
+                'data': result,
+                'count': len(result),
+                'columns': result.columns,
+                'plan': plan.explain()
+            }
+        
+        return results
+    
+    def plan(self, query: Dict[str, Any], dataset: Dataset) -> QueryPlan:
+        """Build (or reuse) a plan; plans are cached per dataset version"""
+        key = (json.dumps(query, sort_keys=True, default=str), dataset.client_id, dataset.log_type, dataset.version)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.stats["plan_hits"] += 1
+                return plan
+        
+        plan = self._build_plan(self._validate(query, dataset), dataset)
+        
+        with self._lock:
+            self.stats["plans_built"] += 1
+            self._plans[key] = plan
+            while len(self._plans) > Config.QUERY_PLAN_CACHE_SIZE:
+                self._plans.popitem(last=False)
+        return plan
+    
+    def _validate(self, query: Dict[str, Any], dataset: Dataset) -> Dict[str, Any]:
+        columns = set(dataset.columns)
+        
+        def check_column(column):
+            if column not in columns:
+                raise QueryIRError(f"Unknown column '{column}' in {dataset.log_type}")
+            return column
+        
+        where = []
+        for predicate in query.get("where") or []:
+            if not isinstance(predicate, dict) or predicate.get("op") not in self.OPERATORS:
+                raise QueryIRError(f"Invalid predicate: {predicate}")
+            check_column(predicate.get("column"))
+            if predicate["op"] in ('in', 'not_in') and not isinstance(predicate.get("value"), list):
+                raise QueryIRError(f"'{predicate['op']}' needs a list value: {predicate}")
+            where.append(predicate)
+        
+        time_range = query.get("time_range")
+        if time_range:
+            if not isinstance(time_range, dict):
+                raise QueryIRError(f"Invalid time_range: {time_range}")
+            time_range = dict(time_range, column=check_column(time_range.get("column", "timestamp")))
+        
+        limit = query.get("limit")
+        if limit is not None and (not isinstance(limit, int) or limit < 0):
+            raise QueryIRError(f"Invalid limit: {limit}")
+        
+        return {
+            "where": where,
+            "time_range": time_range,
+            "select": [check_column(column) for column in query.get("select") or []],
+            "group_by": [check_column(column) for column in query.get("group_by") or []],
+            "limit": limit
+        }
+    
+    def _build_plan(self, query: Dict[str, Any], dataset: Dataset) -> QueryPlan:
+        plan = QueryPlan(dataset.log_type, query)
+        
+        if query["time_range"]:
+            plan.index_steps.append(("time", dict(query["time_range"], op="range")))
+        
+        for predicate in query["where"]:
+            op, value = predicate["op"], predicate.get("value")
+            if op in ('eq', 'in') and dataset.cardinality(predicate["column"]) <= Config.QUERY_CATEGORICAL_MAX_VALUES:
+                plan.index_steps.append(("categorical", predicate))
+                continue
+            if op in ('contains', 'startswith') and len(str(value)) >= 3:
+                # Trigrams only narrow candidates; the predicate is still verified by a scan
+                plan.index_steps.append(("trigram", predicate))
+            plan.scan_steps.append(predicate)
+        
+        plan.scan_steps.sort(key=lambda predicate: self.SCAN_COST[predicate["op"]])
+        return plan
+    
+    def _run(self, plan: QueryPlan, dataset: Dataset) -> ResultSet:
+        ids = None
+        lookups = sorted((self._lookup(kind, predicate, dataset) for kind, predicate in plan.index_steps), key=len)
+        for candidates in lookups:
+            ids = candidates if ids is None else np.intersect1d(ids, candidates, assume_unique=True)
+            if not len(ids):
+                break
+        
+        examined = 0
+        for predicate in plan.scan_steps:
+            if ids is not None and not len(ids):
+                break
+            examined += len(dataset) if ids is None else len(ids)
+            mask = self._evaluate(predicate, dataset, ids)
+            ids = np.flatnonzero(mask) if ids is None else ids[mask]
+        
+        with self._lock:
+            self.stats["executions"] += 1
+            self.stats["rows_total"] += len(dataset)
+            self.stats["rows_examined"] += examined
+        
+        # Results stay row ids into the cached frame; only group-by builds a new one
+        query = plan.query
+        result = ResultSet(dataset.df, ids, query["group_by"] or query["select"])
+        if query["group_by"]:
+            grouped = result.frame().groupby(query["group_by"]).size()
+            result = ResultSet(grouped.reset_index(name='count').sort_values('count', ascending=False))
+        if query["limit"] is not None:
+            result = result.limit(query["limit"])
+        return result
+    
+    def _lookup(self, kind: str, predicate: Dict[str, Any], dataset: Dataset) -> np.ndarray:
+        """Sorted candidate row ids from an index"""
+        column = predicate["column"]
+        empty = np.array([], dtype=np.int64)
+        
+        if kind == "time":
+            sorted_values, order = dataset.time_index(column)
+            start, end = predicate.get("start"), predicate.get("end")
+            lo = np.searchsorted(sorted_values, str(start), 'left') if start else 0
+            # Treat the end bound as a prefix so "2024-01-31" includes that whole day
+            hi = np.searchsorted(sorted_values, str(end) + '\uffff', 'right') if end else len(sorted_values)
+            return np.sort(order[lo:hi])
+        
+        if kind == "categorical":
+            index = dataset.categorical_index(column)
+            values = predicate["value"] if predicate["op"] == 'in' else [predicate["value"]]
+            postings = [index[key] for key in {self._as_text(value) for value in values} if key in index]
+            return np.sort(np.concatenate(postings)) if postings else empty
+        
+        # Trigram: rows containing every trigram of the search text
+        index = dataset.trigram_index(column)
+        text = str(predicate["value"]).lower()
+        ids = None
+        for gram in {text[i:i + 3] for i in range(len(text) - 2)}:
+            if gram not in index:
+                return empty
+            ids = index[gram] if ids is None else np.intersect1d(ids, index[gram], assume_unique=True)
+        return ids if ids is not None else empty
+    
+    def _evaluate(self, predicate: Dict[str, Any], dataset: Dataset, ids: Optional[np.ndarray]) -> np.ndarray:
+        """Vectorized boolean mask for a predicate over the candidate rows"""
+        column, op, value = predicate["column"], predicate["op"], predicate.get("value")
+        
+        def take(array):
+            return array if ids is None else array[ids]
+        
+        if op in ('gt', 'gte', 'lt', 'lte'):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values, value = take(dataset.numeric(column)), float(value)
+            else:
+                values, value = take(dataset.values(column)), str(value)
+            with np.errstate(invalid='ignore'):
+                return {'gt': values > value, 'gte': values >= value, 'lt': values < value, 'lte': values <= value}[op]
+        
+        if op in ('eq', 'ne'):
+            mask = take(dataset.values(column)) == self._as_text(value)
+            return mask if op == 'eq' else ~mask
+        
+        if op in ('in', 'not_in'):
+            mask = np.isin(take(dataset.values(column)), [self._as_text(item) for item in value])
+            return mask if op == 'in' else ~mask
+        
+        text = pd.Series(take(dataset.lowered(column)), dtype=object)
+        if op == 'startswith':
+            return text.str.startswith(str(value).lower()).to_numpy(dtype=bool)
+        mask = text.str.contains(str(value).lower(), regex=False).to_numpy(dtype=bool)
+        return mask if op == 'contains' else ~mask
+    
+    @staticmethod
+    def _as_text(value: Any) -> str:
+        """Compare as CSV text (443.0 -> "443")"""
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+    
+    @staticmethod
+    def describe_predicate(predicate: Dict[str, Any]) -> str:
+        if predicate.get("op") == "range":
+            return f"{predicate['column']} in [{predicate.get('start') or '-inf'}, {predicate.get('end') or '+inf'}]"
+        return f"{predicate['column']} {predicate['op']} {predicate.get('value')!r}"
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "cached_plans": len(self._plans),
+                "fraction_examined": round(self.stats["rows_examined"] / self.stats["rows_total"], 3) if self.stats["rows_total"] else 0.0
+            }
+
+# Shared query engine (plan cache is process-wide)
+query_engine = QueryEngine()
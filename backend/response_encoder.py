@@ -0,0 +1,223 @@
+# response_encoder.py - Content-negotiated encoding for bulk API responses
+
+import io
+import json
+import hashlib
+import pandas as pd
+from typing import Dict, Any, Iterator, Optional
+from flask import Response, request, stream_with_context
+from config import Config
+from result_set import ResultSet
+from compression import negotiate_encoding, compress, compress_stream, coalesce
+from tracing import tracer
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # Optional: Arrow responses are not offered without it
+    pa = None
+
+JSON = 'application/json'
+COLUMNAR_JSON = 'application/vnd.traceagent.columnar+json'
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+
+class ResponseEncoder:
+    """Encodes payloads straight to bytes, bypassing marshalling
+    
+    - application/json: the usual records shape, encoded with orjson when installed
+    - columnar JSON: every table (ResultSet or list of records) becomes
+      {"columns": [...], "rows": [[...], ...]}, so keys are not repeated per row
+    - Arrow IPC stream: the payload's single table as Arrow, other fields in
+      the schema metadata under "payload" (needs pyarrow)
+    
+    Bodies are compressed with the best accepted coding (zstd, br, gzip).
+    Payloads with at least STREAM_JSON_MIN_ROWS rows are written
+    incrementally, a page of rows at a time, and sent chunked, so memory
+    stays bounded and the download starts immediately.
+    
+    Conditional GETs: callers derive a tag with etag() from what determines
+    the payload and check not_modified() before building it.
+    """
+    
+    def supported_types(self):
+        return [JSON, COLUMNAR_JSON] + ([ARROW_STREAM] if pa is not None else [])
+    
+    def negotiate(self) -> str:
+        """Best supported media type for the current request's Accept header"""
+        return request.accept_mimetypes.best_match(self.supported_types(), default=JSON)
+    
+    def response(self, payload: Dict[str, Any], status: int = 200, headers: Optional[Dict[str, str]] = None, etag: Optional[str] = None) -> Response:
+        media_type = self.negotiate()
+        if media_type == ARROW_STREAM and self._single_table(payload) is None:
+            media_type = COLUMNAR_JSON
+        encoding = negotiate_encoding()
+        rows = self.row_count(payload)
+        
+        with tracer.span("response.encode", media_type=media_type, rows=rows) as span:
+            if rows >= Config.STREAM_JSON_MIN_ROWS:
+                # Encoded while the body is sent, so only the setup is timed here
+                chunks = coalesce(self.iter_encode(payload, media_type))
+                if encoding:
+                    chunks = compress_stream(chunks, encoding)
+                response = Response(stream_with_context(chunks), status=status, mimetype=media_type)
+                response.headers['X-Accel-Buffering'] = 'no'  # Let nginx pass chunks through
+                span.set(streamed=True)
+            else:
+                body = self.encode(payload, media_type)
+                if encoding and len(body) >= Config.COMPRESSION_MIN_SIZE:
+                    body = compress(body, encoding)
+                else:
+                    encoding = None
+                response = Response(body, status=status, mimetype=media_type)
+                span.set(bytes=len(body), encoding=encoding)
+        
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept, Accept-Encoding'
+        if etag:
+            response.set_etag(etag)
+        for name, value in (headers or {}).items():
+            response.headers[name] = value
+        return response
+    
+    def etag(self, *parts: Any) -> str:
+        """Strong ETag for a payload identified by parts, in the negotiated representation
+        
+        Media type and content coding are part of the tag, since each
+        combination is a different byte sequence.
+        """
+        key = json.dumps([self.negotiate(), negotiate_encoding(), *parts], default=str)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+    
+    def not_modified(self, etag: str, headers: Optional[Dict[str, str]] = None) -> Optional[Response]:
+        """304 response if the request's If-None-Match has etag, else None"""
+        if not request.if_none_match.contains_weak(etag):
+            return None
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Vary'] = 'Accept, Accept-Encoding'
+        for name, value in (headers or {}).items():
+            response.headers[name] = value
+        return response
+    
+    def encode(self, payload: Any, media_type: str = JSON) -> bytes:
+        if media_type == ARROW_STREAM:
+            return b''.join(self._iter_arrow(payload))
+        if media_type == COLUMNAR_JSON:
+            payload = self.columnar(payload)
+        return self.dumps(payload)
+    
+    def iter_encode(self, payload: Any, media_type: str = JSON) -> Iterator[bytes]:
+        """Encode incrementally; output is identical to encode()"""
+        if media_type == ARROW_STREAM:
+            return self._iter_arrow(payload)
+        return self._iter_json(payload, media_type == COLUMNAR_JSON)
+    
+    def row_count(self, value: Any) -> int:
+        """Total rows across the tables in a payload"""
+        if isinstance(value, ResultSet):
+            return len(value)
+        if isinstance(value, dict):
+            return sum(self.row_count(item) for item in value.values())
+        if isinstance(value, list) and value and isinstance(value[0], dict):
+            return len(value)
+        return 0
+    
+    def _iter_json(self, value: Any, columnar: bool) -> Iterator[bytes]:
+        page_size = Config.STREAM_JSON_PAGE_ROWS
+        
+        if isinstance(value, ResultSet):
+            yield b'{"columns":' + self.dumps(value.columns) + b',"rows":[' if columnar else b'['
+            for page, start in enumerate(range(0, len(value), page_size)):
+                if columnar:
+                    rows = value.frame(start, start + page_size).to_numpy(dtype=object).tolist()
+                else:
+                    rows = value.records(start, start + page_size)
+                yield (b',' if page else b'') + self.dumps(rows)[1:-1]
+            yield b']}' if columnar else b']'
+        elif isinstance(value, dict):
+            yield b'{'
+            for index, (key, item) in enumerate(value.items()):
+                yield (b',' if index else b'') + self.dumps(str(key)) + b':'
+                yield from self._iter_json(item, columnar)
+            yield b'}'
+        elif isinstance(value, list) and len(value) > page_size:
+            if columnar and all(isinstance(item, dict) for item in value):
+                yield from self._iter_json(self.columnar(value), columnar)
+                return
+            yield b'['
+            for page, start in enumerate(range(0, len(value), page_size)):
+                yield (b',' if page else b'') + self.dumps(value[start:start + page_size])[1:-1]
+            yield b']'
+        else:
+            yield self.dumps(self.columnar(value) if columnar else value)
+    
+    def dumps(self, payload: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(payload, default=self._default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        return json.dumps(payload, default=self._default, separators=(',', ':')).encode('utf-8')
+    
+    def _default(self, value: Any) -> Any:
+        if isinstance(value, ResultSet):
+            return value.records()
+        if hasattr(value, 'item'):  # numpy scalars (stdlib path)
+            return value.item()
+        return str(value)
+    
+    def columnar(self, value: Any) -> Any:
+        """Replace tables anywhere in the payload with columns + rows arrays"""
+        if isinstance(value, ResultSet):
+            return {"columns": value.columns, "rows": value.frame().to_numpy(dtype=object).tolist()}
+        if isinstance(value, dict):
+            return {key: self.columnar(item) for key, item in value.items()}
+        if isinstance(value, list):
+            if value and all(isinstance(item, dict) for item in value):
+                columns = list(dict.fromkeys(key for item in value for key in item))
+                return {"columns": columns, "rows": [[item.get(column) for column in columns] for item in value]}
+            return [self.columnar(item) for item in value]
+        return value
+    
+    def _single_table(self, payload: Any) -> Optional[str]:
+        """Key of the payload's only bulk table (full_data preferred), if any"""
+        if not isinstance(payload, dict):
+            return None
+        if isinstance(payload.get('full_data'), (ResultSet, list)):
+            return 'full_data'
+        tables = [key for key, value in payload.items() if isinstance(value, ResultSet)]
+        return tables[0] if len(tables) == 1 else None
+    
+    def _iter_arrow(self, payload: Dict[str, Any]) -> Iterator[bytes]:
+        """Arrow IPC stream of the payload's table, one record batch per page"""
+        key = self._single_table(payload)
+        table_data = payload[key]
+        rest = {name: value for name, value in payload.items() if name != key}
+        metadata = {"payload": self.dumps(self.columnar(rest)), "table": key}
+        page_size = Config.STREAM_JSON_PAGE_ROWS
+        
+        sink = io.BytesIO()
+        writer = None
+        for start in range(0, len(table_data), page_size):
+            if isinstance(table_data, ResultSet):
+                frame = table_data.frame(start, start + page_size)
+            else:
+                frame = pd.DataFrame(table_data[start:start + page_size])
+            batch = pa.RecordBatch.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pa.ipc.new_stream(sink, batch.schema.with_metadata(metadata))
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+        
+        if writer is None:
+            columns = table_data.columns if isinstance(table_data, ResultSet) else []
+            writer = pa.ipc.new_stream(sink, pa.schema([(column, pa.string()) for column in columns], metadata=metadata))
+        writer.close()
+        yield sink.getvalue()
+
+# Shared encoder
+response_encoder = ResponseEncoder()
@@ -0,0 +1,109 @@
+# result_set.py - Lazy query results, materialized page by page
+
+import time
+import uuid
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Dict, Any, List, Iterator, Optional, Tuple
+from config import Config
+
+class ResultSet:
+    """Query result as a reference to a DataFrame plus row ids and columns
+    
+    Filtering produces row ids instead of copied frames; records are only
+    built when a caller at the serialization boundary asks for a page.
+    len() and iteration work like the list of records it replaces.
+    """
+    
+    ITER_PAGE_SIZE = 10000
+    
+    def __init__(self, df: pd.DataFrame, row_ids=None, columns: List[str] = None):
+        self._df = df
+        self._row_ids = None if row_ids is None else np.asarray(row_ids, dtype=np.int64)
+        self.columns = list(columns) if columns else list(df.columns)
+    
+    def __len__(self):
+        return len(self._df) if self._row_ids is None else len(self._row_ids)
+    
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for _, records in self.pages(self.ITER_PAGE_SIZE):
+            yield from records
+    
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step not in (None, 1):
+            raise TypeError("ResultSet supports contiguous slices only; use records()")
+        start, stop, _ = index.indices(len(self))
+        return self.records(start, stop)
+    
+    def limit(self, count: int) -> 'ResultSet':
+        row_ids = np.arange(min(count, len(self))) if self._row_ids is None else self._row_ids[:count]
+        return ResultSet(self._df, row_ids, self.columns)
+    
+    def frame(self, start: int = 0, stop: int = None) -> pd.DataFrame:
+        """Rows [start, stop) as a DataFrame with only the result's columns
+        
+        A whole unfiltered result returns the shared frame itself; treat it as read-only.
+        """
+        if start == 0 and stop is None and self._row_ids is None and self.columns == list(self._df.columns):
+            return self._df
+        stop = len(self) if stop is None else min(stop, len(self))
+        positions = np.arange(start, stop) if self._row_ids is None else self._row_ids[start:stop]
+        return self._df.iloc[positions, self._df.columns.get_indexer(self.columns)]
+    
+    def records(self, start: int = 0, stop: int = None) -> List[Dict[str, Any]]:
+        if start == 0 and stop is None and self._row_ids is None and self.columns == list(self._df.columns):
+            return self._df.to_dict('records')
+        return self.frame(start, stop).to_dict('records')
+    
+    def pages(self, page_size: int) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        """(page number, records) for consecutive pages"""
+        for page, start in enumerate(range(0, len(self), page_size)):
+            yield page, self.records(start, start + page_size)
+
+def to_records(data: Any, start: int = 0, stop: int = None) -> List[Dict[str, Any]]:
+    """Materialize a ResultSet (or slice a plain list of records)"""
+    if isinstance(data, ResultSet):
+        return data.records(start, stop)
+    return list(data[start:stop])
+
+def json_default(value: Any) -> Any:
+    """json.dumps default: ResultSets become records, anything else a string"""
+    if isinstance(value, ResultSet):
+        return value.records()
+    return str(value)
+
+class ResultRegistry:
+    """Recently executed query results by id, so they can be exported later
+    
+    Entries hold ResultSet handles (row ids into shared frames), not copies.
+    Least recently used entries are evicted past RESULT_REGISTRY_SIZE, and
+    entries older than RESULT_REGISTRY_TTL seconds are dropped.
+    """
+    
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def register(self, client_id: str, results: Dict[str, Any]) -> str:
+        query_id = uuid.uuid4().hex
+        with self._lock:
+            self._entries[query_id] = {"client_id": client_id, "results": results, "created_at": time.time()}
+            while len(self._entries) > Config.RESULT_REGISTRY_SIZE:
+                self._entries.popitem(last=False)
+        return query_id
+    
+    def get(self, query_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(query_id)
+            if entry is None:
+                return None
+            if time.time() - entry["created_at"] > Config.RESULT_REGISTRY_TTL:
+                del self._entries[query_id]
+                return None
+            self._entries.move_to_end(query_id)
+            return entry
+
+# Shared registry of executed query results
+result_registry = ResultRegistry()
@@ -2,11 +2,15 @@
 
 import pandas as pd
 import json
+import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
-from llm_provider import llm_provider
-from log_fetcher import log_fetcher
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+from llm_provider import llm_provider, run_async, PRIORITY_BACKGROUND
+from dataset_store import RequestDataContext
+from result_set import ResultSet, json_default
+from prompt_builder import prompt_builder
 from config import Config
+from tracing import traced, current_span
 
 class SecurityLogAnalyzer:
     def __init__(self):
@@ -39,10 +43,7 @@ class SecurityLogAnalyzer:
             ]
         }
     
-    def parse_security_query(self, query: str, client_id: str) -> Dict[str, Any]:
-        """Use LLM to parse natural language query into structured parameters"""
-        
-        system_prompt = """You are a security log analysis expert. Parse the user's query into structured parameters for log analysis.
+    PARSE_QUERY_INSTRUCTIONS = """You are a security log analysis expert. Parse the user's query into structured parameters for log analysis.
 
 Available log types and their schemas:
 - syslog: timestamp, host, process, pid, message (system events, login attempts, warnings)
@@ -72,18 +73,29 @@ Example JSON response:
         }
     },
     "correlation": "cross_reference_ips"
-}
-
-User query: {query}
-
-Return ONLY the JSON object, no other text, no newlines."""
-
-        messages = [
-            {"role": "system", "content": system_prompt.format(query=query)}
-        ]
-        
-        response = llm_provider.query(messages, temperature=0.1, max_tokens=1000)
-        
+}"""
+    
+    @traced("analyzer.parse_query")
+    def parse_security_query(self, query: str, client_id: str) -> Dict[str, Any]:
+        """Use LLM to parse natural language query into structured parameters"""
+        response = llm_provider.query(self._parse_query_messages(query), temperature=0.1, max_tokens=1000)
+        return self._parse_query_response(response)
+    
+    @traced("analyzer.parse_query")
+    async def aparse_security_query(self, query: str, client_id: str) -> Dict[str, Any]:
+        """Async counterpart of parse_security_query"""
+        response = await llm_provider.aquery(self._parse_query_messages(query), temperature=0.1, max_tokens=1000)
+        return self._parse_query_response(response)
+    
+    def _parse_query_messages(self, query: str) -> list:
+        # The instructions never change, so they form a cacheable prefix and are
+        # no longer str.format()ed (the JSON example's braces broke formatting)
+        return prompt_builder.build_messages(
+            self.PARSE_QUERY_INSTRUCTIONS,
+            f"User query: {query}\nReturn ONLY the JSON object, no other text, no newlines."
+        )
+    
+    def _parse_query_response(self, response: Dict[str, Any]) -> Dict[str, Any]:
         print(f"[DEBUG] LLM provider response: {response}")
         
         if response.get("success"):
@@ -143,8 +155,10 @@ Return ONLY the JSON object, no other text, no newlines."""
             "correlation": "timeline_analysis"
         }
     
-    def search_logs(self, params: Dict[str, Any], client_id: str) -> Dict[str, Any]:
+    @traced("analyzer.search")
+    def search_logs(self, params: Dict[str, Any], client_id: str, context: RequestDataContext = None) -> Dict[str, Any]:
         """Search logs based on parsed parameters"""
+        context = context or RequestDataContext(client_id)
         results = {
             'log_entries': {},
             'insights': {},
@@ -153,14 +167,14 @@ Return ONLY the JSON object, no other text, no newlines."""
         
         # Load relevant log data
         for log_type in params['log_types']:
-            log_data = log_fetcher.fetch_log_data(client_id, log_type)
+            dataset = context.dataset(log_type)
             
-            if 'error' in log_data:
-                results['log_entries'][log_type] = {'error': log_data['error']}
+            if dataset is None:
+                results['log_entries'][log_type] = {'error': context.error(log_type)}
                 continue
             
-            # Convert to DataFrame for analysis
-            df = pd.DataFrame(log_data['full_data'])
+            # Shared DataFrame for analysis (_apply_filters never mutates it)
+            df = dataset.df
             if df.empty:
                 results['log_entries'][log_type] = {'data': [], 'count': 0}
                 continue
@@ -168,8 +182,8 @@ Return ONLY the JSON object, no other text, no newlines."""
             # Apply filters
             filtered_df = self._apply_filters(df, params, log_type)
             
-            # Convert back to records
-            filtered_records = filtered_df.to_dict('records') if not filtered_df.empty else []
+            # Keep the filtered frame; records are built only when serialized
+            filtered_records = ResultSet(filtered_df)
             
             results['log_entries'][log_type] = {
                 'data': filtered_records,
@@ -177,6 +191,9 @@ Return ONLY the JSON object, no other text, no newlines."""
                 'total_available': len(df)
             }
         
+        current_span().set(client_id=client_id, log_types=params['log_types'],
+                           rows=sum(entry.get('count', 0) for entry in results['log_entries'].values()))
+        
         # Generate insights
         results['insights'] = self._generate_insights(results['log_entries'], params)
         
@@ -186,13 +203,20 @@ Return ONLY the JSON object, no other text, no newlines."""
         
         return results
     
+    @traced("analyzer.filter")
     def _apply_filters(self, df: pd.DataFrame, params: Dict[str, Any], log_type: str) -> pd.DataFrame:
-        """Apply various filters to the DataFrame"""
-        filtered_df = df.copy()
+        """Apply various filters to the DataFrame
+        
+        The shared frame is never copied or mutated; only the rows that pass
+        every filter are copied, with their timestamps parsed.
+        """
+        span = current_span().set(log_type=log_type, rows_in=len(df))
+        filtered_df = df
+        timestamps = None
         
         # Time-based filtering
         if 'time_range' in params['filters']:
-            filtered_df = self._apply_time_filter(filtered_df, params['filters']['time_range'])
+            filtered_df, timestamps = self._apply_time_filter(filtered_df, params['filters']['time_range'])
         
         # Security pattern filtering
         if 'security_patterns' in params['filters']:
@@ -202,29 +226,34 @@ Return ONLY the JSON object, no other text, no newlines."""
         if 'specific_filters' in params['filters']:
             filtered_df = self._apply_specific_filters(filtered_df, params['filters']['specific_filters'], log_type)
         
+        if timestamps is not None:
+            filtered_df = filtered_df.assign(timestamp=timestamps.loc[filtered_df.index])
+        
+        span.set(rows=len(filtered_df))
         return filtered_df
     
-    def _apply_time_filter(self, df: pd.DataFrame, time_range: str) -> pd.DataFrame:
-        """Apply time-based filtering"""
+    def _apply_time_filter(self, df: pd.DataFrame, time_range: str) -> Tuple[pd.DataFrame, Optional[pd.Series]]:
+        """Apply time-based filtering, returning the kept rows and their parsed timestamps"""
         if 'timestamp' not in df.columns:
-            return df
+            return df, None
         
         try:
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
+            timestamps = pd.to_datetime(df['timestamp'])
             
             if time_range == 'today':
                 today = datetime.now().date()
-                return df[df['timestamp'].dt.date == today]
+                keep = timestamps.dt.date == today
             elif time_range == 'yesterday':
                 yesterday = (datetime.now() - timedelta(days=1)).date()
-                return df[df['timestamp'].dt.date == yesterday]
+                keep = timestamps.dt.date == yesterday
             elif time_range == 'week':
                 week_ago = datetime.now() - timedelta(days=7)
-                return df[df['timestamp'] >= week_ago]
+                keep = timestamps >= week_ago
             else:
-                return df
+                return df, timestamps
+            return df[keep], timestamps[keep]
         except:
-            return df
+            return df, None
     
     def _apply_security_patterns(self, df: pd.DataFrame, patterns: List[str], log_type: str) -> pd.DataFrame:
         """Apply security pattern filtering"""
@@ -237,17 +266,18 @@ Return ONLY the JSON object, no other text, no newlines."""
         if not message_col:
             return df
         
-        # Create a mask for matching patterns
-        mask = pd.Series([False] * len(df))
+        # Lowercase the messages once instead of a case-insensitive regex per keyword
+        messages = df[message_col].astype(str).str.lower()
+        mask = pd.Series(False, index=df.index)
         
         for pattern in patterns:
             if pattern in self.security_patterns:
                 pattern_keywords = self.security_patterns[pattern]
                 
                 for keyword in pattern_keywords:
-                    mask |= df[message_col].str.contains(keyword, case=False, na=False)
+                    mask |= messages.str.contains(keyword.lower(), regex=False)
         
-        return df[mask]
+        return df[mask & df[message_col].notna()]
     
     def _apply_specific_filters(self, df: pd.DataFrame, filters: Dict[str, Any], log_type: str) -> pd.DataFrame:
         """Apply specific filters (users, IPs, endpoints, etc.)"""
@@ -266,8 +296,29 @@ Return ONLY the JSON object, no other text, no newlines."""
         
         return df
     
+    def _entry_frames(self, log_entries: Dict[str, Any]) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """(log type, DataFrame) for each searched log, without building records"""
+        for log_type, data in log_entries.items():
+            if 'error' in data or 'data' not in data:
+                continue
+            
+            entries = data['data']
+            yield log_type, entries.frame() if isinstance(entries, ResultSet) else pd.DataFrame(list(entries))
+    
+    def _matches_any(self, messages: pd.Series, patterns: List[str]) -> pd.Series:
+        """Rows whose (already lowercased) message contains one of the patterns verbatim"""
+        mask = pd.Series(False, index=messages.index)
+        for pattern in patterns:
+            mask |= messages.str.contains(pattern, regex=False)
+        return mask
+    
+    @traced("analyzer.insights")
     def _generate_insights(self, log_entries: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate security insights from log data"""
+        """Generate security insights from log data
+        
+        Counts are computed column-wise on the filtered frames; records are
+        only built later, when the entries are serialized.
+        """
         insights = {
             'total_events': 0,
             'security_events': 0,
@@ -280,75 +331,74 @@ Return ONLY the JSON object, no other text, no newlines."""
             'critical_endpoints': set()
         }
         
-        for log_type, data in log_entries.items():
-            if 'error' in data or 'data' not in data:
+        for log_type, frame in self._entry_frames(log_entries):
+            insights['total_events'] += len(frame)
+            if frame.empty:
                 continue
             
-            for entry in data['data']:
-                insights['total_events'] += 1
-                
-                # Count security events
-                message = entry.get('message', '').lower()
-                
-                if any(pattern in message for pattern in self.security_patterns['failed_logins']):
-                    insights['failed_logins'] += 1
-                    insights['security_events'] += 1
-                
-                if any(pattern in message for pattern in self.security_patterns['sql_injection']):
-                    insights['sql_injections'] += 1
-                    insights['security_events'] += 1
-                
-                if any(pattern in message for pattern in self.security_patterns['system_warnings']):
-                    insights['system_warnings'] += 1
-                    insights['security_events'] += 1
-                
-                # Track IPs and users
-                if 'src_ip' in entry:
-                    insights['suspicious_ips'].add(entry['src_ip'])
-                
-                if 'user' in entry:
-                    insights['affected_users'].add(entry['user'])
-                
-                if 'endpoint' in entry:
-                    insights['critical_endpoints'].add(entry['endpoint'])
-                
-                # Network-specific insights
-                if log_type == 'network_logs' and entry.get('action') in ['DROP', 'REJECT']:
-                    insights['blocked_connections'] += 1
-                    insights['security_events'] += 1
+            # Count security events
+            if 'message' in frame.columns:
+                message = frame['message'].fillna('').astype(str).str.lower()
+                for insight, pattern in [('failed_logins', 'failed_logins'),
+                                         ('sql_injections', 'sql_injection'),
+                                         ('system_warnings', 'system_warnings')]:
+                    count = int(self._matches_any(message, self.security_patterns[pattern]).sum())
+                    insights[insight] += count
+                    insights['security_events'] += count
+            
+            # Track IPs and users
+            if 'src_ip' in frame.columns:
+                insights['suspicious_ips'].update(frame['src_ip'].unique().tolist())
+            
+            if 'user' in frame.columns:
+                insights['affected_users'].update(frame['user'].unique().tolist())
+            
+            if 'endpoint' in frame.columns:
+                insights['critical_endpoints'].update(frame['endpoint'].unique().tolist())
+            
+            # Network-specific insights
+            if log_type == 'network_logs' and 'action' in frame.columns:
+                blocked = int(frame['action'].isin(['DROP', 'REJECT']).sum())
+                insights['blocked_connections'] += blocked
+                insights['security_events'] += blocked
         
         # Convert sets to lists for JSON serialization
         insights['suspicious_ips'] = list(insights['suspicious_ips'])
         insights['affected_users'] = list(insights['affected_users'])
         insights['critical_endpoints'] = list(insights['critical_endpoints'])
         
+        current_span().set(rows=insights['total_events'])
         return insights
     
+    def _present(self, values: pd.Series) -> pd.Series:
+        """Mask of values that are set (not missing and not empty)"""
+        return values.notna() & (values.astype(str) != '')
+    
+    @traced("analyzer.correlate")
     def _correlate_logs(self, log_entries: Dict[str, Any], correlation_type: str) -> Dict[str, Any]:
         """Perform cross-log correlation analysis"""
+        current_span().set(correlation=correlation_type, rows=sum(data.get('count', 0) for data in log_entries.values()))
         correlations = {}
         
         if correlation_type == 'cross_reference_ips':
-            # Find IPs that appear across multiple log types
+            # Find IPs that appear across multiple log types (source IP, else destination IP)
             ip_activity = {}
             
-            for log_type, data in log_entries.items():
-                if 'data' not in data:
-                    continue
+            for log_type, frame in self._entry_frames(log_entries):
+                ips = frame['src_ip'] if 'src_ip' in frame.columns else pd.Series(index=frame.index, dtype=object)
+                if 'dest_ip' in frame.columns:
+                    ips = ips.where(self._present(ips), frame['dest_ip'])
                 
-                for entry in data['data']:
-                    ip = entry.get('src_ip') or entry.get('dest_ip')
-                    if ip:
-                        if ip not in ip_activity:
-                            ip_activity[ip] = {'log_types': set(), 'events': []}
-                        ip_activity[ip]['log_types'].add(log_type)
-                        ip_activity[ip]['events'].append(entry)
+                for ip, count in ips[self._present(ips)].value_counts().items():
+                    activity = ip_activity.setdefault(ip, {'log_types': set(), 'event_count': 0})
+                    activity['log_types'].add(log_type)
+                    activity['event_count'] += int(count)
             
             # Filter IPs with activity across multiple log types
             correlations['cross_log_ips'] = {
                 ip: {
                     'log_types': list(activity['log_types']),
-                    'event_count': len(activity['events'])
+                    'event_count': activity['event_count']
                 }
                 for ip, activity in ip_activity.items()
                 if len(activity['log_types']) > 1
@@ -358,31 +408,83 @@ Return ONLY the JSON object, no other text, no newlines."""
             # Track user activity across different log types
             user_activity = {}
             
-            for log_type, data in log_entries.items():
-                if 'data' not in data:
+            for log_type, frame in self._entry_frames(log_entries):
+                if 'user' not in frame.columns:
                     continue
                 
-                for entry in data['data']:
-                    user = entry.get('user')
-                    if user:
-                        if user not in user_activity:
-                            user_activity[user] = {'log_types': set(), 'events': []}
-                        user_activity[user]['log_types'].add(log_type)
-                        user_activity[user]['events'].append(entry)
+                users = frame['user']
+                for user, count in users[self._present(users)].value_counts().items():
+                    activity = user_activity.setdefault(user, {'log_types': set(), 'event_count': 0})
+                    activity['log_types'].add(log_type)
+                    activity['event_count'] += int(count)
             
             correlations['user_activity'] = {
                 user: {
                     'log_types': list(activity['log_types']),
-                    'event_count': len(activity['events'])
+                    'event_count': activity['event_count']
                 }
                 for user, activity in user_activity.items()
             }
         
         return correlations
     
+    def process_security_query(self, query: str, client_id: str) -> Dict[str, Any]:
+        """Parse, search and summarize a security query (blocking)"""
+        return run_async(self.aprocess_security_query(query, client_id))
+    
+    @traced("analyzer.process_security_query")
+    async def aprocess_security_query(self, query: str, client_id: str) -> Dict[str, Any]:
+        """Parse, search and summarize a security query with non-blocking LLM calls"""
+        current_span().set(client_id=client_id)
+        # Load the data while the LLM parses the query; search and summary share it
+        context = RequestDataContext(client_id)
+        parsed, _ = await asyncio.gather(
+            self.aparse_security_query(query, client_id),
+            context.aload(list(self.log_schemas.keys())),
+            return_exceptions=True
+        )
+        if isinstance(parsed, Exception):
+            print(f"[DEBUG] Falling back to keyword query parsing: {parsed}")
+            params = self._fallback_query_parsing(query)
+        else:
+            params = parsed
+        
+        results = await asyncio.to_thread(self.search_logs, params, client_id, context)
+        
+        # The summary only needs the insights, so let the LLM work while the
+        # (potentially large) log entries are converted to JSON-safe records
+        summary, logs = await asyncio.gather(
+            self.agenerate_security_summary(query, results),
+            asyncio.to_thread(self._serialize_log_entries, results['log_entries'])
+        )
+        
+        return {
+            "type": "security_analysis",
+            "message": summary,
+            "logs": logs,
+            "insights": results['insights'],
+            "correlations": results['correlations']
+        }
+    
+    @traced("analyzer.serialize")
+    def _serialize_log_entries(self, log_entries: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert log entries to JSON-safe values (timestamps become ISO strings)"""
+        return json.loads(json.dumps(log_entries, default=json_default))
+    
+    @traced("analyzer.summary")
     def generate_security_summary(self, query: str, results: Dict[str, Any]) -> str:
         """Generate a human-readable security summary"""
-        
+        # Summaries are background work: queue them behind interactive chat calls
+        response = llm_provider.query(self._summary_messages(query, results), temperature=0.3, max_tokens=300, priority=PRIORITY_BACKGROUND)
+        return self._summary_from_response(response, results)
+    
+    @traced("analyzer.summary")
+    async def agenerate_security_summary(self, query: str, results: Dict[str, Any]) -> str:
+        """Async counterpart of generate_security_summary"""
+        response = await llm_provider.aquery(self._summary_messages(query, results), temperature=0.3, max_tokens=300, priority=PRIORITY_BACKGROUND)
+        return self._summary_from_response(response, results)
+    
+    def _summary_messages(self, query: str, results: Dict[str, Any]) -> list:
         system_prompt = """You are a security analyst. Generate a concise, professional summary of security log analysis results.
 
 Focus on:
@@ -424,8 +526,9 @@ Generate a 2-3 sentence summary highlighting the most important security finding
             )}
         ]
         
-        response = llm_provider.query(messages, temperature=0.3, max_tokens=300)
-        
+        return messages
+    
+    def _summary_from_response(self, response: Dict[str, Any], results: Dict[str, Any]) -> str:
         if response.get("success"):
             return response["content"].strip()
         else:
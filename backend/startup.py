@@ -0,0 +1,129 @@
+# startup.py - Lazy component initialization and readiness tracking
+
+import time
+import importlib
+import threading
+from typing import Dict, Any, Callable
+
+class LazyComponent:
+    """Stand-in for a module-level singleton that is built on first use
+    
+    Attribute access is forwarded to the real object, which is created by
+    importing its module the first time it is needed (by a request or by
+    warm-up), so importing app.py does not pay for pandas, the LLM client or
+    database setup. A failed load is recorded and retried on next use.
+    """
+    
+    def __init__(self, name: str, module: str, attribute: str):
+        self._name = name
+        self._module = module
+        self._attribute = attribute
+        self._value = None
+        self._lock = threading.Lock()
+        # Underscored so they never shadow the wrapped object's attributes
+        self._state = "pending"
+        self._load_seconds = None
+        self._error = None
+    
+    def _load(self) -> Any:
+        value = self._value
+        if value is not None:
+            return value
+        with self._lock:
+            if self._value is None:
+                self._state = "initializing"
+                started = time.perf_counter()
+                try:
+                    self._value = getattr(importlib.import_module(self._module), self._attribute)
+                except Exception as e:
+                    self._state, self._error = "failed", str(e)
+                    print(f"[DEBUG] Failed to initialize {self._name}: {e}")
+                    raise
+                self._load_seconds = round(time.perf_counter() - started, 3)
+                self._state, self._error = "ready", None
+                print(f"[DEBUG] Initialized {self._name} in {self._load_seconds}s")
+            return self._value
+    
+    def __getattr__(self, attribute: str) -> Any:
+        # Only reached for attributes the proxy itself does not have
+        return getattr(self._load(), attribute)
+    
+    def __repr__(self) -> str:
+        return f"<LazyComponent {self._name} ({self._state})>"
+
+class Readiness:
+    """Registry of lazy components and the process's startup state
+    
+    warm_up() loads every component in registration order on a background
+    thread and then runs the on_ready hooks (background services). The
+    process reports "starting" until that finishes, then "ready", or
+    "degraded" if a component failed to load.
+    """
+    
+    def __init__(self):
+        self.components = {}
+        self._on_ready = []
+        self._thread = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.ready_seconds = None
+    
+    def lazy(self, name: str, module: str, attribute: str = None) -> LazyComponent:
+        """Register a component (attribute defaults to name) and return its proxy"""
+        component = LazyComponent(name, module, attribute or name)
+        self.components[name] = component
+        return component
+    
+    def load(self, name: str) -> Any:
+        """The named component, initializing it now if needed"""
+        return self.components[name]._load()
+    
+    def on_ready(self, hook: Callable[[], None]):
+        """Run hook after warm-up has loaded the components"""
+        self._on_ready.append(hook)
+    
+    def warm_up(self, wait: bool = False):
+        """Load every component in the background (once per process)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._warm_up, name="startup-warmup", daemon=True)
+                self._thread.start()
+        if wait:
+            self._done.wait()
+    
+    def _warm_up(self):
+        for component in list(self.components.values()):
+            try:
+                component._load()
+            except Exception:
+                pass  # Recorded on the component; requests retry it
+        for hook in self._on_ready:
+            try:
+                hook()
+            except Exception as e:
+                print(f"[DEBUG] Startup hook {getattr(hook, '__name__', hook)} failed: {e}")
+        self.ready_seconds = round(time.time() - self.started_at, 3)
+        print(f"[DEBUG] Startup complete in {self.ready_seconds}s")
+        self._done.set()
+    
+    @property
+    def state(self) -> str:
+        if not self._done.is_set():
+            return "starting"
+        if any(component._state == "failed" for component in self.components.values()):
+            return "degraded"
+        return "ready"
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "ready_seconds": self.ready_seconds,
+            "components": {
+                name: {"state": component._state, "load_seconds": component._load_seconds, "error": component._error}
+                for name, component in self.components.items()
+            }
+        }
+
+# Shared readiness registry (components are registered by app.py)
+readiness = Readiness()
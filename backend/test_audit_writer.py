@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for the write-behind audit writer
+"""
+
+import sys
+import os
+import time
+import sqlite3
+import tempfile
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from db_pool import ConnectionPool
+from audit_writer import AuditWriter
+
+def _database(directory: str) -> str:
+    path = os.path.join(directory, 'audit.db')
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE access_logs (id INTEGER PRIMARY KEY, client_id TEXT, accessed_resource TEXT, timestamp TEXT, ip_address TEXT)')
+    return path
+
+def _count(path: str) -> int:
+    with sqlite3.connect(path) as conn:
+        return conn.execute('SELECT COUNT(*) FROM access_logs').fetchone()[0]
+
+def test_bad_row_only_drops_itself():
+    """A batch rejected by one malformed row is written row by row"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = _database(directory)
+        writer = AuditWriter(ConnectionPool(path))
+        writer._write([
+            ('access_logs', ('client1', '/a', '2024-01-15 10:00:00', '10.0.0.1')),
+            ('access_logs', ('client1', '/b')),
+            ('access_logs', ('client1', '/c', '2024-01-15 10:00:01', '10.0.0.1'))
+        ])
+        
+        stats = writer.get_stats()
+        assert _count(path) == 2
+        assert stats["written"] == 2
+        assert stats["dropped"] == 1
+        assert stats["errors"] == 1
+
+def test_locked_database_is_retried():
+    """A batch that hits another writer's lock backs off and succeeds once the lock is released"""
+    original = (Config.DB_BUSY_TIMEOUT_MS, Config.AUDIT_RETRY_BACKOFF, Config.AUDIT_WRITE_RETRIES)
+    Config.DB_BUSY_TIMEOUT_MS, Config.AUDIT_RETRY_BACKOFF, Config.AUDIT_WRITE_RETRIES = 10, 0.1, 3
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = _database(directory)
+            writer = AuditWriter(ConnectionPool(path))
+            
+            blocker = sqlite3.connect(path, check_same_thread=False)
+            blocker.execute('BEGIN IMMEDIATE')
+            threading.Timer(0.15, blocker.rollback).start()
+            writer._write([('access_logs', ('client1', '/a', '2024-01-15 10:00:00', '10.0.0.1'))])
+            blocker.close()
+            
+            stats = writer.get_stats()
+            assert _count(path) == 1
+            assert stats["retries"] >= 1
+            assert stats["dropped"] == 0
+    finally:
+        Config.DB_BUSY_TIMEOUT_MS, Config.AUDIT_RETRY_BACKOFF, Config.AUDIT_WRITE_RETRIES = original
+
+def test_flush_times_out_on_full_queue():
+    """flush() gives up after its timeout even when the queue has no room for its marker"""
+    original = (Config.AUDIT_QUEUE_SIZE, Config.AUDIT_BATCH_SIZE)
+    Config.AUDIT_QUEUE_SIZE, Config.AUDIT_BATCH_SIZE = 1, 1
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            writer = AuditWriter(ConnectionPool(_database(directory)))
+            release = threading.Event()
+            insert = writer._insert
+            writer._insert = lambda rows: (release.wait(5), insert(rows))
+            
+            row = ('access_logs', ('client1', '/a', '2024-01-15 10:00:00', '10.0.0.1'))
+            writer.submit(*row)
+            while not writer._queue.empty():
+                time.sleep(0.01)
+            writer._queue.put_nowait(row)
+            
+            started = time.monotonic()
+            assert writer.flush(timeout=0.2) is False
+            assert time.monotonic() - started < 1
+            
+            release.set()
+            assert writer.flush(timeout=5) is True
+            assert writer.get_stats()["written"] == 2
+            writer.close()
+    finally:
+        Config.AUDIT_QUEUE_SIZE, Config.AUDIT_BATCH_SIZE = original
+
+if __name__ == "__main__":
+    test_bad_row_only_drops_itself()
+    test_locked_database_is_retried()
+    test_flush_times_out_on_full_queue()
+    print("✅ Audit writer tests passed")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for the generated pandas code validator and cache
+"""
+
+import sys
+import os
+import pandas as pd
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from code_cache import CodeCache, CodeValidationError
+
+SCHEMAS = {'app_logs': ['timestamp', 'level', 'user', 'endpoint', 'message']}
+
+def _rejected(cache: CodeCache, source: str, schemas=SCHEMAS) -> bool:
+    try:
+        cache.get_program(source, schemas)
+    except CodeValidationError:
+        return True
+    return False
+
+def test_rejects_file_io_and_dunder_access():
+    """Restricted mode refuses pandas I/O and attribute escapes"""
+    Config.RESTRICT_GENERATED_CODE = True
+    cache = CodeCache()
+    for source in [
+        "data = pd.read_pickle('/tmp/payload.pkl')",
+        "passwd = pd.read_csv('/etc/passwd')",
+        "app_logs.to_csv('/tmp/x')",
+        "filtered_app = app_logs.query('level == \"ERROR\"')",
+        "filtered_app = app_logs.__class__",
+        "import os"
+    ]:
+        assert _rejected(cache, source), source
+
+def test_accepts_filters_and_derived_columns():
+    """Typical generated filters, including an assigned column that is read back, validate and run"""
+    Config.RESTRICT_GENERATED_CODE = True
+    cache = CodeCache()
+    source = (
+        "app_logs['hour'] = pd.to_datetime(app_logs['timestamp']).dt.hour\n"
+        "filtered_app = app_logs[(app_logs['hour'] >= 2) & app_logs['message'].str.contains('failed', case=False)]"
+    )
+    program = cache.get_program(source, SCHEMAS)
+    
+    app_logs = pd.DataFrame({
+        'timestamp': ['2024-01-15 01:00:00', '2024-01-15 03:00:00', '2024-01-15 04:00:00'],
+        'level': ['INFO', 'WARNING', 'INFO'],
+        'user': ['amy', 'bob', 'cat'],
+        'endpoint': ['/a', '/b', '/c'],
+        'message': ['Login failed', 'Login FAILED', 'ok']
+    })
+    local_vars = {'app_logs': app_logs}
+    exec(program.code, cache.execution_globals({"pd": pd}), local_vars)
+    assert list(local_vars['filtered_app']['user']) == ['bob']
+    
+    assert _rejected(cache, "filtered_app = app_logs[app_logs['nope'] == 1]")
+
+def test_entries_keyed_by_schema():
+    """The same source is validated separately per schema and both entries stay cached"""
+    Config.RESTRICT_GENERATED_CODE = True
+    cache = CodeCache()
+    source = "filtered_app = app_logs[app_logs['region'] == 'eu']"
+    wide = {'app_logs': SCHEMAS['app_logs'] + ['region']}
+    
+    assert _rejected(cache, source, SCHEMAS)
+    cache.get_program(source, wide)
+    assert _rejected(cache, source, SCHEMAS)
+    cache.get_program(source, wide)
+    
+    stats = cache.get_stats()
+    assert stats["misses"] == 2
+    assert stats["hits"] == 2
+    assert stats["entries"] == 2
+
+if __name__ == "__main__":
+    test_rejects_file_io_and_dunder_access()
+    test_accepts_filters_and_derived_columns()
+    test_entries_keyed_by_schema()
+    print("✅ Code cache tests passed")
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Tests for query-history retention and compaction
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from models import VulnerableDatabase
+from history_maintenance import HistoryMaintenance
+
+def _auto_vacuum(database: VulnerableDatabase) -> int:
+    with database.pool.connection() as conn:
+        return conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+
+def test_database_untouched_without_retention():
+    """With retention off (the default) a pass neither archives nor converts the database to incremental vacuum"""
+    original = (Config.DATABASE_PATH, Config.HISTORY_ARCHIVE_DIR, Config.HISTORY_RETENTION_DAYS,
+                Config.HISTORY_MAX_ROWS_PER_CLIENT, Config.HISTORY_RETENTION_OVERRIDES)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            Config.DATABASE_PATH = os.path.join(directory, 'history.db')
+            Config.HISTORY_ARCHIVE_DIR = os.path.join(directory, 'archive')
+            Config.HISTORY_RETENTION_DAYS, Config.HISTORY_MAX_ROWS_PER_CLIENT = 0, 0
+            Config.HISTORY_RETENTION_OVERRIDES = {}
+            database = VulnerableDatabase()
+            maintenance = HistoryMaintenance(database)
+            
+            assert not maintenance.retention_active()
+            assert maintenance.run_once()["error"] is None
+            assert _auto_vacuum(database) == 0
+            
+            # A single client's override is enough to turn maintenance on
+            Config.HISTORY_RETENTION_OVERRIDES = {"maze_bank": {"max_rows": 5000}}
+            assert maintenance.retention_active()
+            assert maintenance.run_once()["error"] is None
+            assert _auto_vacuum(database) == 2
+    finally:
+        (Config.DATABASE_PATH, Config.HISTORY_ARCHIVE_DIR, Config.HISTORY_RETENTION_DAYS,
+         Config.HISTORY_MAX_ROWS_PER_CLIENT, Config.HISTORY_RETENTION_OVERRIDES) = original
+
+if __name__ == "__main__":
+    test_database_untouched_without_retention()
+    print("✅ History maintenance tests passed")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests for LLM provider admission control
+"""
+
+import sys
+import os
+import json
+import time
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from llm_provider import TokenBucket, AdmissionController, OpenAIProvider, RoutedLLMProvider, PRIORITY_BACKGROUND
+
+def test_pause_applies_without_rate_limit():
+    """A Retry-After pause holds calls back even when no requests-per-minute limit is set"""
+    bucket = TokenBucket(0)
+    assert bucket.wait_time(1) == 0.0
+    
+    bucket.pause(30)
+    assert bucket.wait_time(1) > 29
+
+def test_earlier_deadline_rearms_timer():
+    """A call that can run sooner than the queued head brings the wake-up forward"""
+    async def run():
+        controller = AdmissionController(0, 600)
+        controller.token_bucket.tokens = 0
+        
+        background = asyncio.ensure_future(controller.acquire(100, PRIORITY_BACKGROUND, timeout=30))
+        await asyncio.sleep(0)
+        started = time.monotonic()
+        await controller.acquire(1, timeout=5)
+        elapsed = time.monotonic() - started
+        background.cancel()
+        return elapsed
+    
+    # 1 token refills in 0.1s; the background call's 100 tokens would take 10s
+    assert asyncio.run(run()) < 1
+
+def test_rate_limited_retry_waits_for_retry_after():
+    """A 429 with Retry-After delays the resend instead of retrying at once"""
+    received = []
+    
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+        
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            received.append(time.monotonic())
+            if len(received) == 1:
+                body = b'{"error": {"message": "rate limited"}}'
+                self.send_response(429)
+                self.send_header('Retry-After', '1')
+            else:
+                body = json.dumps({"choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}}]}).encode()
+                self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    original_url = Config.OPENAI_BASE_URL
+    Config.OPENAI_BASE_URL = f"http://127.0.0.1:{server.server_port}/v1"
+    try:
+        result = OpenAIProvider().query([{"role": "user", "content": "hi"}], max_tokens=10)
+    finally:
+        Config.OPENAI_BASE_URL = original_url
+        server.shutdown()
+        server.server_close()
+    
+    assert result["success"], result
+    assert len(received) == 2
+    assert received[1] - received[0] >= 0.9
+
+def test_listing_candidates_does_not_claim_half_open_trial():
+    """Only a call that is actually sent takes a cooled-down provider's trial slot"""
+    router = RoutedLLMProvider(['openai', 'deepseek'])
+    breaker = router.breakers['openai']
+    breaker.state = "open"
+    breaker.opened_at = time.monotonic() - breaker.cooldown - 1
+    
+    for _ in range(3):
+        assert 'openai' in router._candidates()
+        router.get_model_name()
+    assert breaker.state == "open"
+    
+    assert router._claim('openai')
+    assert breaker.state == "half_open"
+    assert not router._claim('openai')
+    
+    # A trial that never got an answer (cancelled hedge) frees the slot again
+    breaker.abandon_trial()
+    assert breaker.is_available()
+    assert router._claim('openai')
+
+if __name__ == "__main__":
+    test_pause_applies_without_rate_limit()
+    test_earlier_deadline_rearms_timer()
+    test_rate_limited_retry_waits_for_retry_after()
+    test_listing_candidates_does_not_claim_half_open_trial()
+    print("✅ LLM provider tests passed")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for query-history search
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from models import VulnerableDatabase
+
+ROWS = [
+    ('maze_bank', 'show failed logins', 'Found 3 failed logins', '2024-01-15T10:00:00'),
+    ('maze_bank', 'search "quoted" OR text', 'nothing NEAR here', '2024-01-15T11:00:00'),
+    ('lifeinvader', 'show failed logins', 'Found 1 failed login', '2024-01-15T11:00:00'),
+    ('maze_bank', '100% of users_a', 'matched', '2024-01-15T12:00:00'),
+    ('maze_bank', 'blocked connections', 'Found 7 blocked connections', '2024-01-15T12:00:00')
+]
+
+def _database(directory: str) -> VulnerableDatabase:
+    original = Config.DATABASE_PATH
+    Config.DATABASE_PATH = os.path.join(directory, 'history.db')
+    try:
+        database = VulnerableDatabase()
+    finally:
+        Config.DATABASE_PATH = original
+    with database.pool.transaction() as conn:
+        conn.executemany('INSERT INTO log_queries (client_id, query, response, timestamp) VALUES (?, ?, ?, ?)', ROWS)
+    return database
+
+def _queries(page) -> list:
+    return [row['query'] for row in page['results']]
+
+def test_search_history_text():
+    """Words are matched as plain text with and without the full-text index; blank text is no filter"""
+    with tempfile.TemporaryDirectory() as directory:
+        database = _database(directory)
+        assert database.fts_enabled
+        
+        for fts_enabled in (True, False):
+            database.fts_enabled = fts_enabled
+            assert _queries(database.search_history(text='failed', client_id='maze_bank')) == ['show failed logins']
+            # FTS operators and quotes in user text are searched for, not parsed
+            assert _queries(database.search_history(text='"quoted" OR')) == ['search "quoted" OR text']
+            assert database.search_history(text='   ')['count'] == len(ROWS)
+        
+        # The LIKE fallback escapes its wildcards
+        assert _queries(database.search_history(text='100%')) == ['100% of users_a']
+        assert database.search_history(text='users_')['count'] == 1
+        assert database.search_history(text='_')['count'] == 1
+
+def test_search_history_cursor_pages():
+    """Keyset pages are newest first, break timestamp ties by id and never repeat a row"""
+    with tempfile.TemporaryDirectory() as directory:
+        database = _database(directory)
+        
+        seen, cursor = [], None
+        while True:
+            page = database.search_history(limit=2, cursor=cursor)
+            seen.extend(row['id'] for row in page['results'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        
+        assert seen == [5, 4, 3, 2, 1]
+        first = database.search_history(limit=2)
+        assert first['next_cursor'] == '2024-01-15T12:00:00|4'
+        assert [row['id'] for row in database.search_history(limit=10, cursor=first['next_cursor'])['results']] == [3, 2, 1]
+
+if __name__ == "__main__":
+    test_search_history_text()
+    test_search_history_cursor_pages()
+    print("✅ Query history search tests passed")
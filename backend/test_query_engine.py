@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests that the filter IR engine and the pandas code path select the same rows
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from dataset_store import DatasetStore, RequestDataContext
+from query_engine import QueryEngine
+from vulnerable_agent import trace_agent
+from benchmarks import synthetic
+
+CLIENT_ID = 'test_client'
+
+# (IR query, equivalent generated pandas code)
+CASES = [
+    ({"log_type": "app_logs", "where": [{"column": "level", "op": "eq", "value": "ERROR"},
+                                        {"column": "message", "op": "contains", "value": "sql"}]},
+     "filtered_app = app_logs[(app_logs['level'] == 'ERROR') & app_logs['message'].str.contains('sql', case=False, regex=False)]"),
+    ({"log_type": "app_logs", "where": [{"column": "user", "op": "startswith", "value": "Smith"},
+                                        {"column": "endpoint", "op": "ne", "value": "/api/health"}],
+      "limit": 25},
+     "filtered_app = app_logs[app_logs['user'].str.lower().str.startswith('smith') & (app_logs['endpoint'] != '/api/health')].head(25)"),
+    ({"log_type": "app_logs", "where": [{"column": "level", "op": "eq", "value": "WARNING"}], "limit": 0},
+     "filtered_app = app_logs[app_logs['level'] == 'WARNING'].head(0)"),
+    ({"log_type": "network_logs", "where": [{"column": "action", "op": "in", "value": ["DROP", "REJECT"]},
+                                            {"column": "bytes_sent", "op": "gt", "value": 5000}]},
+     "filtered_network = network_logs[network_logs['action'].isin(['DROP', 'REJECT']) & (pd.to_numeric(network_logs['bytes_sent'], errors='coerce') > 5000)]"),
+    ({"log_type": "network_logs", "where": [{"column": "protocol", "op": "not_in", "value": ["TCP"]},
+                                            {"column": "dest_port", "op": "eq", "value": 443.0}]},
+     "filtered_network = network_logs[~network_logs['protocol'].isin(['TCP']) & (network_logs['dest_port'] == '443')]"),
+    ({"log_type": "syslog", "where": [{"column": "message", "op": "contains", "value": "failed"},
+                                      {"column": "host", "op": "not_in", "value": ["web-01", "db-01"]},
+                                      {"column": "process", "op": "not_contains", "value": "ker"}],
+      "time_range": {"column": "timestamp", "start": "2024-01-10", "end": "2024-01-20"}},
+     "filtered_syslog = syslog[syslog['message'].str.contains('failed', case=False, regex=False) "
+     "& ~syslog['host'].isin(['web-01', 'db-01']) & ~syslog['process'].str.contains('ker', case=False, regex=False) "
+     "& (syslog['timestamp'] >= '2024-01-10') & (syslog['timestamp'].str[:10] <= '2024-01-20')]")
+]
+
+def _context(directory: str) -> RequestDataContext:
+    store = DatasetStore(ttl=float('inf'))
+    for log_type in synthetic.LOG_TYPES:
+        store.put(CLIENT_ID, log_type, synthetic.read_csv(synthetic.write_csv(log_type, 3000, directory)))
+    return RequestDataContext(CLIENT_ID, store)
+
+def _row_ids(logs) -> list:
+    data = logs['data']
+    return [] if isinstance(data, list) else list(data.frame().index)
+
+def _compare_engines(context: RequestDataContext):
+    engine = QueryEngine()
+    for query, pandas_code in CASES:
+        log_type = query["log_type"]
+        expected = _row_ids(trace_agent._execute_pandas_code(pandas_code, [log_type], context)[log_type])
+        ir_logs = engine.execute({"queries": [query]}, [log_type], context)[log_type]
+        assert _row_ids(ir_logs) == expected, (ir_logs['plan'], pandas_code)
+        assert ir_logs['count'] == len(expected)
+
+def test_ir_matches_pandas_with_indexes():
+    """Index lookups (time, categorical, trigram) select the same rows as the pandas code"""
+    with tempfile.TemporaryDirectory() as directory:
+        context = _context(directory)
+        _compare_engines(context)
+        
+        plans = [QueryEngine().plan(query, context.dataset(query["log_type"])) for query, _ in CASES]
+        assert {kind for plan in plans for kind, _ in plan.index_steps} == {"time", "categorical", "trigram"}
+
+def test_ir_matches_pandas_with_scans_only():
+    """With the categorical index disabled, eq/in predicates are scanned and still agree"""
+    original = Config.QUERY_CATEGORICAL_MAX_VALUES
+    Config.QUERY_CATEGORICAL_MAX_VALUES = 0
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            context = _context(directory)
+            _compare_engines(context)
+            
+            plans = [QueryEngine().plan(query, context.dataset(query["log_type"])) for query, _ in CASES]
+            assert all(kind != "categorical" for plan in plans for kind, _ in plan.index_steps)
+    finally:
+        Config.QUERY_CATEGORICAL_MAX_VALUES = original
+
+if __name__ == "__main__":
+    test_ir_matches_pandas_with_indexes()
+    test_ir_matches_pandas_with_scans_only()
+    print("✅ Query engine tests passed")
@@ -5,10 +5,12 @@ Test script for SecurityLogAnalyzer integration
 
 import sys
 import os
+import pandas as pd
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from security_log_analyzer import security_analyzer
 from config import Config
+from result_set import ResultSet
 
 def test_security_analyzer():
     """Test the SecurityLogAnalyzer with sample queries"""
@@ -64,5 +66,53 @@ def test_security_analyzer():
     print("\n" + "=" * 50)
     print("🏁 SecurityLogAnalyzer test completed")
 
+def test_filters_insights_and_correlations_on_frames():
+    """Filtering leaves the shared frame alone; counts match the per-record rules"""
+    app_logs = pd.DataFrame({
+        'timestamp': ['2024-01-15 08:00:00', '2024-01-15 09:00:00', '2024-01-15 10:00:00', '2024-01-15 11:00:00'],
+        'level': ['WARNING', 'ERROR', 'INFO', 'INFO'],
+        'user': ['amy', 'bob', 'amy', None],
+        'endpoint': ['/login', '/search', '/login', '/home'],
+        'message': ['Login failed for amy', "q=' OR 1=1 --", 'Failed login for amy', 'ok']
+    }, index=[10, 11, 12, 13])
+    network_logs = pd.DataFrame({
+        'timestamp': ['2024-01-15 08:00:00', '2024-01-15 08:01:00', '2024-01-15 08:02:00'],
+        'src_ip': ['10.0.0.5', '', '10.0.0.9'],
+        'dest_ip': ['10.0.0.1', '10.0.0.5', '10.0.0.1'],
+        'action': ['DROP', 'ACCEPT', 'REJECT']
+    })
+    params = {"filters": {"time_range": "all", "security_patterns": ["failed_logins", "sql_injection"], "specific_filters": {"users": []}}}
+    
+    filtered = security_analyzer._apply_filters(app_logs, params, 'app_logs')
+    assert list(filtered.index) == [10, 11, 12]
+    assert str(filtered['timestamp'].dtype).startswith('datetime64')
+    assert app_logs['timestamp'].dtype == object
+    
+    app_logs['src_ip'] = ['10.0.0.9', None, None, None]
+    log_entries = {
+        'app_logs': {'data': ResultSet(app_logs, [0, 1, 2]), 'count': 3},
+        'network_logs': {'data': ResultSet(network_logs), 'count': 3},
+        'syslog': {'error': 'unavailable'}
+    }
+    insights = security_analyzer._generate_insights(log_entries, params)
+    assert insights['total_events'] == 6
+    # Patterns are matched as written against the lowercased message
+    assert insights['failed_logins'] == 1
+    assert insights['sql_injections'] == 0
+    assert insights['system_warnings'] == 2
+    assert insights['blocked_connections'] == 2
+    assert insights['security_events'] == 5
+    assert sorted(insights['affected_users']) == ['amy', 'bob']
+    
+    ips = security_analyzer._correlate_logs(log_entries, 'cross_reference_ips')['cross_log_ips']
+    assert list(ips) == ['10.0.0.9']
+    assert sorted(ips['10.0.0.9']['log_types']) == ['app_logs', 'network_logs']
+    assert ips['10.0.0.9']['event_count'] == 2
+    
+    users = security_analyzer._correlate_logs(log_entries, 'user_activity')['user_activity']
+    assert users['amy']['event_count'] == 2
+    assert users['bob']['log_types'] == ['app_logs']
+
 if __name__ == "__main__":
-    test_security_analyzer() 
\ No newline at end of file
+    test_security_analyzer()
+    test_filters_insights_and_correlations_on_frames() 
\ No newline at end of file
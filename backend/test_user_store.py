@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared SQLite user store
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from user_store import SQLiteUserStore
+from auth import VulnerableAuth
+
+USER = {"password": "pw123", "role": "user", "client_id": "maze_bank", "permissions": ["read_logs", "chat"],
+        "created_at": "2024-01-15T10:00:00"}
+
+def test_writes_visible_across_instances():
+    """A user or token written through one store (worker) is seen by another after its generation check"""
+    original = Config.USER_CACHE_CHECK_INTERVAL
+    Config.USER_CACHE_CHECK_INTERVAL = 0
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.db')
+            first, second = SQLiteUserStore(path), SQLiteUserStore(path)
+            assert second.get_user('new_user') is None
+            
+            assert first.add_user('new_user', USER, 'new-user-session-1')
+            assert second.get_user('new_user')["client_id"] == 'maze_bank'
+            assert second.username_for_token('new-user-session-1') == 'new_user'
+            assert not second.add_user('new_user', USER, 'new-user-session-2')
+            
+            second.set_session_token('new_user', 'new-user-session-3')
+            assert first.session_token('new_user') == 'new-user-session-3'
+            assert first.username_for_token('new-user-session-1') is None
+    finally:
+        Config.USER_CACHE_CHECK_INTERVAL = original
+
+def test_login_stores_issued_token():
+    """A token issued at login for a user without one is stored, so other workers accept it"""
+    original = (Config.USER_STORE_BACKEND, Config.USER_STORE_PATH, Config.USER_CACHE_CHECK_INTERVAL)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            Config.USER_STORE_BACKEND = 'sqlite'
+            Config.USER_STORE_PATH = os.path.join(directory, 'users.db')
+            Config.USER_CACHE_CHECK_INTERVAL = 0
+            auth = VulnerableAuth()
+            auth.store.set_session_token('trevor_user1', None)
+            
+            password = auth.store.get_user('trevor_user1')["password"]
+            token = auth.login('trevor_user1', password)["session_token"]
+            assert token.startswith('trevor_user1-session-')
+            assert auth.login('trevor_user1', password)["session_token"] == token
+            
+            other_worker = VulnerableAuth()
+            assert other_worker.get_user_by_token(token)["username"] == 'trevor_user1'
+    finally:
+        Config.USER_STORE_BACKEND, Config.USER_STORE_PATH, Config.USER_CACHE_CHECK_INTERVAL = original
+
+if __name__ == "__main__":
+    test_writes_visible_across_instances()
+    test_login_stores_issued_token()
+    print("✅ User store tests passed")
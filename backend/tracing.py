@@ -0,0 +1,401 @@
+# tracing.py - Lightweight tracing spans, Prometheus metrics and OTLP JSON span export
+
+import json
+import time
+import queue
+import atexit
+import bisect
+import random
+import inspect
+import functools
+import threading
+import contextvars
+from typing import Dict, Any, List, Optional, Callable
+from config import Config
+
+# Innermost open span of the current thread / asyncio task
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+# OTLP SpanKind values
+SPAN_KINDS = {'internal': 1, 'server': 2, 'client': 3}
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ROW_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000, 10000000)
+BYTE_BUCKETS = (1024, 16384, 131072, 1048576, 8388608, 67108864, 536870912)
+
+class Span:
+    """One timed stage; attributes (rows, bytes, cache_hit, tokens, ...) are set while it runs
+    
+    Use as a context manager to make it the parent of spans started inside
+    it, or call end() directly (e.g. across the yields of an async generator).
+    """
+    
+    __slots__ = ('tracer', 'name', 'kind', 'trace_id', 'span_id', 'parent_id', 'attributes',
+                 'start_time', 'duration', 'error', '_started', '_token')
+    
+    def __init__(self, tracer: 'Tracer', name: str, kind: str, parent: Optional['Span'], attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.start_time = time.time_ns()
+        self.duration = None
+        self.error = None
+        self._started = time.perf_counter()
+        self._token = None
+    
+    def set(self, **attributes) -> 'Span':
+        self.attributes.update(attributes)
+        return self
+    
+    def add(self, name: str, value: float) -> 'Span':
+        """Accumulate a numeric attribute (e.g. rows over several tables)"""
+        self.attributes[name] = self.attributes.get(name, 0) + value
+        return self
+    
+    def record_error(self, error: Any) -> 'Span':
+        self.error = f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else str(error)
+        return self
+    
+    def end(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._started
+            self.tracer._finish(self)
+    
+    def __enter__(self) -> 'Span':
+        self._token = _current_span.set(self)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.record_error(exc)
+        _current_span.reset(self._token)
+        self.end()
+        return False
+
+class _NoopSpan:
+    """Returned while tracing is disabled: every operation does nothing"""
+    
+    __slots__ = ()
+    
+    def set(self, **attributes):
+        return self
+    
+    def add(self, name: str, value: float):
+        return self
+    
+    def record_error(self, error: Any):
+        return self
+    
+    def end(self):
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NOOP_SPAN = _NoopSpan()
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense (caller holds the registry lock)"""
+    
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+    
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """Per-stage histograms and counters fed by finished spans
+    
+    Span attributes with well-known names are turned into metrics:
+    rows / bytes -> histograms, cache_hit -> hit/miss counter,
+    prompt_tokens / completion_tokens -> token counter per provider.
+    Values are per process; with several gunicorn workers each scrape sees
+    the worker that answered it.
+    """
+    
+    PREFIX = 'traceagent'
+    
+    def __init__(self):
+        self._durations = {}
+        self._rows = {}
+        self._bytes = {}
+        self._errors = {}
+        self._cache = {}
+        self._tokens = {}
+        self._lock = threading.Lock()
+    
+    def observe_span(self, span: Span):
+        attributes = span.attributes
+        with self._lock:
+            self._histogram(self._durations, span.name, DURATION_BUCKETS).observe(span.duration)
+            if span.error is not None:
+                self._errors[span.name] = self._errors.get(span.name, 0) + 1
+            if 'rows' in attributes:
+                self._histogram(self._rows, span.name, ROW_BUCKETS).observe(attributes['rows'])
+            if 'bytes' in attributes:
+                self._histogram(self._bytes, span.name, BYTE_BUCKETS).observe(attributes['bytes'])
+            if 'cache_hit' in attributes:
+                key = (span.name, 'hit' if attributes['cache_hit'] else 'miss')
+                self._cache[key] = self._cache.get(key, 0) + 1
+            for kind in ('prompt', 'completion'):
+                tokens = attributes.get(f'{kind}_tokens')
+                if tokens:
+                    key = (attributes.get('provider', 'unknown'), kind)
+                    self._tokens[key] = self._tokens.get(key, 0) + tokens
+    
+    @staticmethod
+    def _histogram(histograms: Dict[str, Histogram], name: str, buckets: tuple) -> Histogram:
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram(buckets)
+        return histogram
+    
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            self._render_histograms(lines, 'stage_duration_seconds', 'Time spent in each traced stage', self._durations)
+            self._render_histograms(lines, 'stage_rows', 'Rows handled per traced stage', self._rows)
+            self._render_histograms(lines, 'stage_bytes', 'Bytes handled per traced stage', self._bytes)
+            self._render_counter(lines, 'stage_errors_total', 'Traced stages that raised', ('stage',),
+                                 {(name,): count for name, count in self._errors.items()})
+            self._render_counter(lines, 'cache_requests_total', 'Cache lookups by stage and result', ('stage', 'result'), self._cache)
+            self._render_counter(lines, 'llm_tokens_total', 'LLM tokens reported by the provider APIs', ('provider', 'type'), self._tokens)
+        return "\n".join(lines) + "\n"
+    
+    def _render_histograms(self, lines: List[str], name: str, help_text: str, histograms: Dict[str, Histogram]):
+        metric = f"{self.PREFIX}_{name}"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+        for stage, histogram in sorted(histograms.items()):
+            label = f'stage="{_escape(stage)}"'
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{label},le="{bound:g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{label},le="+Inf"}} {histogram.count}')
+            lines.append(f'{metric}_sum{{{label}}} {histogram.sum:.6f}')
+            lines.append(f'{metric}_count{{{label}}} {histogram.count}')
+    
+    def _render_counter(self, lines: List[str], name: str, help_text: str, labels: tuple, values: Dict[tuple, int]):
+        metric = f"{self.PREFIX}_{name}"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        for key, value in sorted(values.items()):
+            rendered = ",".join(f'{label}="{_escape(part)}"' for label, part in zip(labels, key))
+            lines.append(f'{metric}{{{rendered}}} {value}')
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+_STOP = object()
+
+class SpanExporter:
+    """Appends finished spans to a file as OTLP/JSON lines from a background thread
+    
+    Each line is one ExportTraceServiceRequest (resourceSpans), so the file
+    can be replayed into an OpenTelemetry collector or read with jq. Spans are
+    written in batches of TRACE_EXPORT_BATCH_SIZE or every
+    TRACE_EXPORT_INTERVAL seconds; when the queue (TRACE_EXPORT_QUEUE_SIZE)
+    is full, spans are dropped and counted rather than slowing requests.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._queue = queue.Queue(maxsize=Config.TRACE_EXPORT_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {"exported": 0, "dropped": 0, "batches": 0, "errors": 0}
+    
+    def submit(self, span: Span):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            with self._lock:
+                self.stats["dropped"] += 1
+    
+    def flush(self, timeout: float = None) -> bool:
+        """Block until everything queued so far has been written
+        
+        Returns False when that did not happen within timeout seconds,
+        including time spent waiting for room in a full queue.
+        """
+        if self._thread is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(None if deadline is None else max(deadline - time.monotonic(), 0))
+    
+    def close(self):
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+    
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+    
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = max(deadline - time.monotonic(), 0) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            
+            if item is _STOP or isinstance(item, threading.Event):
+                if batch:
+                    self._write(batch)
+                    batch = []
+                if item is _STOP:
+                    return
+                item.set()
+                continue
+            
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + Config.TRACE_EXPORT_INTERVAL
+                batch.append(item)
+            
+            if batch and (len(batch) >= Config.TRACE_EXPORT_BATCH_SIZE or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+    
+    def _write(self, batch: List[Span]):
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", Config.TRACE_SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [_otlp_span(span) for span in batch]}]
+        }]}
+        try:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(request, separators=(",", ":")) + "\n")
+            with self._lock:
+                self.stats["exported"] += len(batch)
+                self.stats["batches"] += 1
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            print(f"[DEBUG] Span export of {len(batch)} spans failed: {e}")
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    return {"key": key, "value": _otlp_value(value)}
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+    otlp = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": SPAN_KINDS.get(span.kind, 1),
+        "startTimeUnixNano": str(span.start_time),
+        "endTimeUnixNano": str(span.start_time + int(span.duration * 1e9)),
+        "attributes": [_otlp_attribute(key, value) for key, value in span.attributes.items() if value is not None],
+        "status": {"code": 2, "message": span.error} if span.error is not None else {"code": 1}
+    }
+    if span.parent_id:
+        otlp["parentSpanId"] = span.parent_id
+    return otlp
+
+class Tracer:
+    """Creates spans and hands finished ones to the metrics registry and exporter
+    
+    When TRACING_ENABLED is false, span() returns a shared no-op span, so an
+    instrumented stage costs one attribute check and a call.
+    """
+    
+    def __init__(self):
+        self.enabled = Config.TRACING_ENABLED
+        self.metrics = MetricsRegistry()
+        self.exporter = SpanExporter(Config.TRACE_EXPORT_PATH) if Config.TRACE_EXPORT_PATH else None
+    
+    def span(self, name: str, kind: str = 'internal', **attributes) -> Span:
+        """A new span under the current one (entered with `with`, or ended with end())"""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, kind, _current_span.get(), attributes)
+    
+    def _finish(self, span: Span):
+        self.metrics.observe_span(span)
+        if self.exporter is not None:
+            self.exporter.submit(span)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "export_path": Config.TRACE_EXPORT_PATH or None,
+            "exporter": dict(self.exporter.stats) if self.exporter else None
+        }
+
+def current_span():
+    """The innermost open span, or the no-op span outside any"""
+    return _current_span.get() or NOOP_SPAN
+
+def active_span() -> Optional[Span]:
+    return _current_span.get()
+
+async def in_span(coro, parent: Span):
+    """Run coro with parent as its current span (for coroutines started on another thread's loop)"""
+    token = _current_span.set(parent)
+    try:
+        return await coro
+    finally:
+        _current_span.reset(token)
+
+def traced(name: str, kind: str = 'internal'):
+    """Decorator: run the function (sync or async) inside a span named name"""
+    def decorate(function: Callable):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                if not tracer.enabled:
+                    return await function(*args, **kwargs)
+                with tracer.span(name, kind):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+        
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return function(*args, **kwargs)
+            with tracer.span(name, kind):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# Process-wide tracer
+tracer = Tracer()
@@ -0,0 +1,278 @@
+# user_store.py - Storage backends for VulnerableAuth users and session tokens
+
+import json
+import time
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Any, Optional
+from config import Config
+from db_pool import ConnectionPool
+
+class UserStore(ABC):
+    """Abstract base class for user/session storage
+    
+    User records are dicts with password, role, client_id, permissions and
+    created_at; each user has at most one session token.
+    """
+    
+    backend_name = None
+    
+    @abstractmethod
+    def get_user(self, username: str) -> Optional[Dict[str, Any]]:
+        """User record, or None"""
+        pass
+    
+    @abstractmethod
+    def all_users(self) -> Dict[str, Dict[str, Any]]:
+        """Every user record by username"""
+        pass
+    
+    @abstractmethod
+    def session_token(self, username: str) -> Optional[str]:
+        """The user's session token, or None"""
+        pass
+    
+    @abstractmethod
+    def username_for_token(self, token: str) -> Optional[str]:
+        """Owner of a session token, or None"""
+        pass
+    
+    @abstractmethod
+    def add_user(self, username: str, user_data: Dict[str, Any], session_token: str) -> bool:
+        """Create a user with its session token (False when the username exists)"""
+        pass
+    
+    @abstractmethod
+    def set_session_token(self, username: str, token: str):
+        """Replace a user's session token"""
+        pass
+    
+    def seed(self, users: Dict[str, Dict[str, Any]], session_tokens: Dict[str, str]):
+        """Add the given users unless they already exist"""
+        for username, user_data in users.items():
+            self.add_user(username, user_data, session_tokens.get(username))
+    
+    def all_session_tokens(self) -> Dict[str, str]:
+        return {username: self.session_token(username) for username in self.all_users()}
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend_name, "users": len(self.all_users())}
+
+class MemoryUserStore(UserStore):
+    """Per-process dicts (users created in one worker are invisible to the others)"""
+    
+    backend_name = 'memory'
+    
+    def __init__(self):
+        self._users = {}
+        self._tokens = {}
+        self._token_index = {}  # token -> username
+        self._lock = threading.Lock()
+    
+    def get_user(self, username: str) -> Optional[Dict[str, Any]]:
+        return self._users.get(username)
+    
+    def all_users(self) -> Dict[str, Dict[str, Any]]:
+        return dict(self._users)
+    
+    def session_token(self, username: str) -> Optional[str]:
+        return self._tokens.get(username)
+    
+    def username_for_token(self, token: str) -> Optional[str]:
+        return self._token_index.get(token)
+    
+    def add_user(self, username: str, user_data: Dict[str, Any], session_token: str) -> bool:
+        with self._lock:
+            if username in self._users:
+                return False
+            self._users[username] = user_data
+            self._index_token(username, session_token)
+        return True
+    
+    def set_session_token(self, username: str, token: str):
+        with self._lock:
+            self._index_token(username, token)
+    
+    def put(self, username: str, user_data: Dict[str, Any], session_token: Optional[str]):
+        """Insert or replace a user and its session token"""
+        with self._lock:
+            self._users[username] = user_data
+            self._index_token(username, session_token)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend_name, "users": len(self._users), "session_tokens": len(self._token_index)}
+    
+    def _index_token(self, username: str, token: Optional[str]):
+        previous = self._tokens.get(username)
+        if previous is not None and self._token_index.get(previous) == username:
+            del self._token_index[previous]
+        if token is None:
+            self._tokens.pop(username, None)
+            return
+        self._tokens[username] = token
+        self._token_index[token] = username
+
+class SQLiteUserStore(UserStore):
+    """Users and session tokens in SQLite, shared by every worker on the host
+    
+    Each process serves reads from a local copy (a MemoryUserStore) that is
+    kept in step with the database through a generation counter: every write
+    bumps it and stamps the changed row with the new value, so a process
+    that sees the counter move reloads only rows newer than its copy. The
+    counter is checked at most every USER_CACHE_CHECK_INTERVAL seconds, so a
+    request normally costs dict lookups only; a worker's own writes are
+    visible to it immediately and to the other workers within that interval.
+    """
+    
+    backend_name = 'sqlite'
+    
+    def __init__(self, path: str = None):
+        self.pool = ConnectionPool(path or Config.USER_STORE_PATH)
+        self._cache = MemoryUserStore()
+        self._generation = -1
+        self._checked_at = 0.0
+        self._sync_lock = threading.Lock()
+        self.stats = {"syncs": 0, "rows_loaded": 0, "writes": 0}
+        self._create_schema()
+    
+    def _create_schema(self):
+        with self.pool.transaction() as conn:
+            # VULNERABILITY: Passwords stored in plain text
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS auth_users (
+                    username TEXT PRIMARY KEY,
+                    password TEXT,
+                    role TEXT,
+                    client_id TEXT,
+                    permissions TEXT,
+                    created_at TEXT,
+                    session_token TEXT,
+                    version INTEGER NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_auth_users_version ON auth_users (version)')
+            conn.execute('CREATE TABLE IF NOT EXISTS auth_store_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.execute("INSERT OR IGNORE INTO auth_store_meta (key, value) VALUES ('generation', 0)")
+    
+    def _sync(self, force: bool = False):
+        """Pull rows written by other processes since the local copy was loaded"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < Config.USER_CACHE_CHECK_INTERVAL:
+            return
+        with self._sync_lock:
+            if not force and now - self._checked_at < Config.USER_CACHE_CHECK_INTERVAL:
+                return
+            with self.pool.connection() as conn:
+                generation = conn.execute("SELECT value FROM auth_store_meta WHERE key = 'generation'").fetchone()[0]
+                rows = []
+                if generation != self._generation:
+                    rows = conn.execute('''
+                        SELECT username, password, role, client_id, permissions, created_at, session_token
+                        FROM auth_users WHERE version > ?
+                    ''', (self._generation,)).fetchall()
+            
+            for username, password, role, client_id, permissions, created_at, session_token in rows:
+                user_data = {
+                    "password": password,
+                    "role": role,
+                    "client_id": client_id,
+                    "permissions": json.loads(permissions),
+                    "created_at": created_at
+                }
+                self._cache.put(username, user_data, session_token)
+            self._generation = generation
+            self._checked_at = time.monotonic()
+            self.stats["syncs"] += 1
+            self.stats["rows_loaded"] += len(rows)
+    
+    def _write(self, sql: str, params: Dict[str, Any]) -> bool:
+        """Run one row write under a new generation (False when it changed nothing)
+        
+        sql uses named placeholders; the new generation is bound as :version.
+        """
+        with self.pool.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute("UPDATE auth_store_meta SET value = value + 1 WHERE key = 'generation'")
+                generation = conn.execute("SELECT value FROM auth_store_meta WHERE key = 'generation'").fetchone()[0]
+                changed = conn.execute(sql, {**params, "version": generation}).rowcount > 0
+                if changed:
+                    conn.commit()
+                    self.stats["writes"] += 1
+                else:
+                    conn.rollback()
+            except Exception:
+                conn.rollback()
+                raise
+        return changed
+    
+    def get_user(self, username: str) -> Optional[Dict[str, Any]]:
+        self._sync()
+        return self._cache.get_user(username)
+    
+    def all_users(self) -> Dict[str, Dict[str, Any]]:
+        self._sync()
+        return self._cache.all_users()
+    
+    def session_token(self, username: str) -> Optional[str]:
+        self._sync()
+        return self._cache.session_token(username)
+    
+    def username_for_token(self, token: str) -> Optional[str]:
+        self._sync()
+        return self._cache.username_for_token(token)
+    
+    def add_user(self, username: str, user_data: Dict[str, Any], session_token: str) -> bool:
+        # The primary key decides races between workers creating the same user
+        added = self._write('''
+            INSERT INTO auth_users (username, password, role, client_id, permissions, created_at, session_token, version)
+            VALUES (:username, :password, :role, :client_id, :permissions, :created_at, :session_token, :version)
+            ON CONFLICT (username) DO NOTHING
+        ''', {"username": username, "password": user_data["password"], "role": user_data["role"],
+              "client_id": user_data["client_id"], "permissions": json.dumps(user_data["permissions"]),
+              "created_at": user_data["created_at"], "session_token": session_token})
+        if added:
+            # Visible here at once; the generation cursor is left for _sync so
+            # rows other workers wrote in between are still picked up
+            self._cache.add_user(username, user_data, session_token)
+        return added
+    
+    def set_session_token(self, username: str, token: str):
+        changed = self._write('UPDATE auth_users SET session_token = :token, version = :version WHERE username = :username',
+                              {"token": token, "username": username})
+        if not changed:
+            if self.get_user(username) is not None:
+                raise RuntimeError(f"Session token update for existing user '{username}' changed no rows")
+            return
+        self._cache.set_session_token(username, token)
+    
+    def seed(self, users: Dict[str, Dict[str, Any]], session_tokens: Dict[str, str]):
+        self._sync(force=True)
+        missing = {username: user_data for username, user_data in users.items() if self._cache.get_user(username) is None}
+        for username, user_data in missing.items():
+            self.add_user(username, user_data, session_tokens.get(username))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            **self._cache.get_stats(),
+            "backend": self.backend_name,
+            "generation": self._generation,
+            "pool": self.pool.get_stats()
+        }
+
+class UserStoreFactory:
+    """Factory for creating user stores"""
+    
+    @staticmethod
+    def create_store(backend_name: str = None) -> UserStore:
+        """Create the user store based on configuration"""
+        backend_name = (backend_name or Config.USER_STORE_BACKEND).lower()
+        
+        if backend_name == 'sqlite':
+            return SQLiteUserStore()
+        elif backend_name == 'memory':
+            return MemoryUserStore()
+        else:
+            print(f"Warning: Unknown user store '{backend_name}', defaulting to sqlite")
+            return SQLiteUserStore()
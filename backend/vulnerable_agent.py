@@ -1,10 +1,15 @@
 # vulnerable_agent.py - Simple LLM-Powered Log Analysis Agent
 
 import json
+import asyncio
 import pandas as pd
-from typing import Dict, Any, List
-from llm_provider import llm_provider
-from log_fetcher import log_fetcher
+from typing import Dict, Any, List, AsyncIterator
+from llm_provider import llm_provider, LLMProviderError
+from dataset_store import RequestDataContext
+from result_set import ResultSet, to_records, result_registry
+from code_cache import code_cache
+from query_engine import query_engine
+from tracing import traced, current_span
 from config import Config
 
 class VulnerableTraceAgent:
@@ -15,8 +20,10 @@ class VulnerableTraceAgent:
             'syslog': ['timestamp', 'host', 'process', 'pid', 'message']
         }
     
+    @traced("agent.process_user_query")
     def process_user_query(self, user_input: str, client_id: str = None, session_token: str = None) -> Dict[str, Any]:
         """Main entry point for processing user queries"""
+        current_span().set(client_id=client_id)
         
         # Step 1: Classify the request
         request_type = self._classify_request(user_input)
@@ -25,16 +32,93 @@ class VulnerableTraceAgent:
         if request_type == "chat":
             return self._handle_chat_request(user_input)
         elif request_type == "query":
-            return self._handle_query_request(user_input, client_id)
+            return self._register_results(self._handle_query_request(user_input, client_id), client_id)
         else:
             return {
                 "type": "error",
                 "message": f"Unknown request type: {request_type}"
             }
     
-    def _classify_request(self, user_input: str) -> str:
-        """Step 1: Classify if request is chat or query"""
+    @traced("agent.process_user_query")
+    async def aprocess_user_query(self, user_input: str, client_id: str = None, session_token: str = None) -> Dict[str, Any]:
+        """Async entry point: same pipeline as process_user_query with non-blocking LLM calls"""
+        current_span().set(client_id=client_id)
+        
+        request_type = await self._aclassify_request(user_input)
+        print(f"[DEBUG] Classified request as: {request_type}")
+        
+        if request_type == "chat":
+            return await self._ahandle_chat_request(user_input)
+        elif request_type == "query":
+            return self._register_results(await self._ahandle_query_request(user_input, client_id), client_id)
+        else:
+            return {
+                "type": "error",
+                "message": f"Unknown request type: {request_type}"
+            }
+    
+    async def astream_user_query(self, user_input: str, client_id: str = None, session_token: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield progress events for a query: stages, chat tokens, then result pages"""
+        
+        request_type = await self._aclassify_request(user_input)
+        print(f"[DEBUG] Classified request as: {request_type}")
+        yield {"event": "stage", "data": {"stage": "classified", "type": request_type}}
+        
+        if request_type == "chat":
+            tokens = []
+            try:
+                async for token in llm_provider.astream(self._chat_messages(user_input), temperature=0.7, max_tokens=1000):
+                    tokens.append(token)
+                    yield {"event": "token", "data": {"text": token}}
+                result = {"type": "chat", "message": "".join(tokens)}
+            except LLMProviderError as e:
+                result = {"type": "error", "message": f"Failed to process chat request: {e}"}
+        elif request_type == "query":
+            context = RequestDataContext(client_id)
+            log_types, _ = await asyncio.gather(
+                self._adetermine_log_types(user_input),
+                context.aload(list(self.log_schemas.keys()))
+            )
+            yield {"event": "stage", "data": {"stage": "log_types", "log_types": log_types}}
+            
+            result = self._register_results(await self._arun_query(user_input, log_types, context), client_id)
+            logs = result.get("logs", {})
+            yield {"event": "stage", "data": {
+                "stage": "rows_found",
+                "counts": {log_type: log_data.get("count", 0) for log_type, log_data in logs.items()}
+            }}
+            
+            # Rows are materialized one page at a time from the lazy results
+            page_size = Config.STREAM_PAGE_SIZE
+            for log_type, log_data in logs.items():
+                records = log_data.get("data", [])
+                for page, start in enumerate(range(0, len(records), page_size)):
+                    yield {"event": "result_page", "data": {
+                        "log_type": log_type,
+                        "page": page,
+                        "columns": log_data.get("columns", []),
+                        "rows": await asyncio.to_thread(to_records, records, start, start + page_size)
+                    }}
+        else:
+            result = {
+                "type": "error",
+                "message": f"Unknown request type: {request_type}"
+            }
         
+        done = {"type": result["type"], "message": result["message"]}
+        if "query_id" in result:
+            done["query_id"] = result["query_id"]
+        yield {"event": "done", "data": done}
+    
+    def _register_results(self, result: Dict[str, Any], client_id: str) -> Dict[str, Any]:
+        """Keep the query's result sets for export and tag the response with their query_id"""
+        tables = {log_type: log_data['data'] for log_type, log_data in result.get("logs", {}).items()
+                  if isinstance(log_data, dict) and isinstance(log_data.get('data'), ResultSet)}
+        if tables:
+            result["query_id"] = result_registry.register(client_id, tables)
+        return result
+    
+    def _classify_messages(self, user_input: str) -> list:
         system_prompt = """You are a log analysis assistant. Classify the user's request into one of two types:
 
 - "chat": Casual conversation, general questions, greetings, explanations
@@ -56,8 +140,20 @@ User request: {user_input}"""
             {"role": "system", "content": system_prompt.format(user_input=user_input)}
         ]
         
-        response = llm_provider.query(messages, temperature=0.1, max_tokens=50)
-        
+        return messages
+    
+    @traced("agent.classify")
+    def _classify_request(self, user_input: str) -> str:
+        """Step 1: Classify if request is chat or query"""
+        response = llm_provider.query(self._classify_messages(user_input), temperature=0.1, max_tokens=50)
+        return self._parse_classification(response)
+    
+    @traced("agent.classify")
+    async def _aclassify_request(self, user_input: str) -> str:
+        response = await llm_provider.aquery(self._classify_messages(user_input), temperature=0.1, max_tokens=50)
+        return self._parse_classification(response)
+    
+    def _parse_classification(self, response: Dict[str, Any]) -> str:
         if response.get("success"):
             content = response["content"].strip().lower()
             if content in ["chat", "query"]:
@@ -69,9 +165,7 @@ User request: {user_input}"""
             print(f"[DEBUG] Classification failed: {response.get('error')}")
             return "chat"  # Default to chat
     
-    def _handle_chat_request(self, user_input: str) -> Dict[str, Any]:
-        """Handle casual chat requests"""
-        
+    def _chat_messages(self, user_input: str) -> list:
         system_prompt = """You are TraceAgent, an AI-powered log analysis assistant. You help users analyze application logs, network logs, and system logs.
 
 You can:
@@ -89,8 +183,18 @@ User: {user_input}"""
             {"role": "user", "content": user_input}
         ]
         
-        response = llm_provider.query(messages, temperature=0.7, max_tokens=1000)
-        
+        return messages
+    
+    def _handle_chat_request(self, user_input: str) -> Dict[str, Any]:
+        """Handle casual chat requests"""
+        response = llm_provider.query(self._chat_messages(user_input), temperature=0.7, max_tokens=1000)
+        return self._build_chat_response(response)
+    
+    async def _ahandle_chat_request(self, user_input: str) -> Dict[str, Any]:
+        response = await llm_provider.aquery(self._chat_messages(user_input), temperature=0.7, max_tokens=1000)
+        return self._build_chat_response(response)
+    
+    def _build_chat_response(self, response: Dict[str, Any]) -> Dict[str, Any]:
         if response.get("success"):
             return {
                 "type": "chat",
@@ -109,26 +213,58 @@ User: {user_input}"""
         log_types = self._determine_log_types(user_input)
         print(f"[DEBUG] Determined log types: {log_types}")
         
-        # Step 3: Generate pandas code
-        pandas_code = self._generate_pandas_code(user_input, log_types)
-        print(f"[DEBUG] Generated pandas code: {pandas_code}")
+        # Every stage below reads log data through this context (one fetch per log type)
+        context = RequestDataContext(client_id)
         
-        # Step 4: Execute pandas code
+        # Step 3: Generate the query (filter IR or pandas code, per Config.QUERY_ENGINE)
+        query_program = self._generate_query_program(user_input, log_types)
+        print(f"[DEBUG] Generated query: {query_program}")
+        
+        # Step 4: Execute the query
         try:
-            results = self._execute_pandas_code(pandas_code, log_types, client_id)
+            results = self._execute_query_program(query_program, log_types, context)
             return {
                 "type": "query",
                 "message": f"Query executed successfully. Found {sum(len(logs.get('data', [])) for logs in results.values())} matching records.",
                 "logs": results
             }
         except Exception as e:
-            print(f"[DEBUG] Pandas execution failed: {e}")
+            print(f"[DEBUG] Query execution failed: {e}")
             # Fallback: Ask LLM for keywords and perform text search
-            return self._fallback_text_search(user_input, log_types, client_id)
+            return self._fallback_text_search(user_input, log_types, context)
     
-    def _determine_log_types(self, user_input: str) -> List[str]:
-        """Determine which log types to query based on user input"""
+    async def _ahandle_query_request(self, user_input: str, client_id: str) -> Dict[str, Any]:
+        """Handle log query requests, overlapping LLM calls with the S3 fetch"""
+        
+        # Log type selection does not depend on the data, so prefetch every
+        # log type while the LLM decides which ones are relevant
+        context = RequestDataContext(client_id)
+        log_types, _ = await asyncio.gather(
+            self._adetermine_log_types(user_input),
+            context.aload(list(self.log_schemas.keys()))
+        )
+        print(f"[DEBUG] Determined log types: {log_types}")
+        
+        return await self._arun_query(user_input, log_types, context)
+    
+    async def _arun_query(self, user_input: str, log_types: List[str], context: RequestDataContext) -> Dict[str, Any]:
+        """Generate and execute the query, falling back to a keyword search"""
+        query_program = await self._agenerate_query_program(user_input, log_types)
+        print(f"[DEBUG] Generated query: {query_program}")
         
+        try:
+            results = await asyncio.to_thread(self._execute_query_program, query_program, log_types, context)
+            return {
+                "type": "query",
+                "message": f"Query executed successfully. Found {sum(len(logs.get('data', [])) for logs in results.values())} matching records.",
+                "logs": results
+            }
+        except Exception as e:
+            print(f"[DEBUG] Query execution failed: {e}")
+            keywords = await self._agenerate_search_keywords(user_input)
+            return await asyncio.to_thread(self._text_search, keywords, log_types, context)
+    
+    def _log_types_messages(self, user_input: str) -> list:
         system_prompt = """You are analyzing a log query to determine which log types to search.
 
 Available log types:
@@ -152,8 +288,20 @@ Return ONLY the JSON array, no other text."""
             {"role": "system", "content": system_prompt.format(user_input=user_input)}
         ]
         
-        response = llm_provider.query(messages, temperature=0.1, max_tokens=200)
-        
+        return messages
+    
+    @traced("agent.log_types")
+    def _determine_log_types(self, user_input: str) -> List[str]:
+        """Determine which log types to query based on user input"""
+        response = llm_provider.query(self._log_types_messages(user_input), temperature=0.1, max_tokens=200)
+        return self._parse_log_types(response)
+    
+    @traced("agent.log_types")
+    async def _adetermine_log_types(self, user_input: str) -> List[str]:
+        response = await llm_provider.aquery(self._log_types_messages(user_input), temperature=0.1, max_tokens=200)
+        return self._parse_log_types(response)
+    
+    def _parse_log_types(self, response: Dict[str, Any]) -> List[str]:
         if response.get("success"):
             try:
                 content = response["content"].strip()
@@ -172,9 +320,81 @@ Return ONLY the JSON array, no other text."""
         else:
             return ['app_logs', 'network_logs', 'syslog']  # Default to all
     
-    def _generate_pandas_code(self, user_input: str, log_types: List[str]) -> str:
-        """Generate pandas code to filter log data"""
+    @traced("agent.generate_query")
+    def _generate_query_program(self, user_input: str, log_types: List[str]) -> str:
+        if Config.QUERY_ENGINE == 'pandas':
+            return self._generate_pandas_code(user_input, log_types)
+        return self._generate_query_ir(user_input, log_types)
+    
+    @traced("agent.generate_query")
+    async def _agenerate_query_program(self, user_input: str, log_types: List[str]) -> str:
+        if Config.QUERY_ENGINE == 'pandas':
+            return await self._agenerate_pandas_code(user_input, log_types)
+        return await self._agenerate_query_ir(user_input, log_types)
+    
+    @traced("agent.execute_query")
+    def _execute_query_program(self, query_program: str, log_types: List[str], context: RequestDataContext) -> Dict[str, Any]:
+        span = current_span().set(engine=Config.QUERY_ENGINE, log_types=log_types)
+        if Config.QUERY_ENGINE == 'pandas':
+            results = self._execute_pandas_code(query_program, log_types, context)
+        else:
+            results = query_engine.execute(query_program, log_types, context)
+        span.set(rows=sum(len(logs.get('data', [])) for logs in results.values()))
+        return results
+    
+    def _query_ir_messages(self, user_input: str, log_types: List[str]) -> list:
+        schema_desc = ""
+        for log_type in log_types:
+            schema_desc += f"\n{log_type}: {', '.join(self.log_schemas[log_type])}"
+        
+        system_prompt = f"""You translate log search requests into a JSON filter query.
+
+Available log types and their columns:{schema_desc}
+
+Return a JSON object with one entry per relevant log type:
+{{"queries": [{{"log_type": "<log type>",
+  "where": [{{"column": "<column>", "op": "<op>", "value": <value>}}],
+  "time_range": {{"column": "timestamp", "start": "YYYY-MM-DD", "end": "YYYY-MM-DD"}},
+  "select": ["<column>", ...],
+  "group_by": ["<column>", ...],
+  "limit": <number>}}]}}
+
+Operators: eq, ne, in, not_in (list value), contains, not_contains, startswith (case-insensitive text), gt, gte, lt, lte.
+All "where" conditions must hold. Omit time_range, select, group_by and limit unless the query needs them.
+group_by returns one row per group with a "count" column.
+
+Examples:
+- "Show error logs" -> {{"queries": [{{"log_type": "app_logs", "where": [{{"column": "level", "op": "eq", "value": "ERROR"}}]}}]}}
+- "Rejected connections per source IP" -> {{"queries": [{{"log_type": "network_logs", "where": [{{"column": "action", "op": "eq", "value": "REJECT"}}], "group_by": ["src_ip"]}}]}}
+- "Failed logins on Jan 15 2024" -> {{"queries": [{{"log_type": "syslog", "where": [{{"column": "message", "op": "contains", "value": "failed"}}], "time_range": {{"start": "2024-01-15", "end": "2024-01-15"}}}}]}}
+
+User query: {user_input}
+
+Return ONLY the JSON object, no markdown, no explanations."""
         
+        messages = [
+            {"role": "system", "content": system_prompt}
+        ]
+        
+        return messages
+    
+    def _generate_query_ir(self, user_input: str, log_types: List[str]) -> str:
+        """Ask the LLM for a declarative filter query (validated by the query engine)"""
+        response = llm_provider.query(self._query_ir_messages(user_input, log_types), temperature=0.1, max_tokens=500)
+        return self._parse_query_ir(response)
+    
+    async def _agenerate_query_ir(self, user_input: str, log_types: List[str]) -> str:
+        response = await llm_provider.aquery(self._query_ir_messages(user_input, log_types), temperature=0.1, max_tokens=500)
+        return self._parse_query_ir(response)
+    
+    def _parse_query_ir(self, response: Dict[str, Any]) -> str:
+        # JSON extraction (and markdown fences) are handled by query_engine.parse
+        if response.get("success"):
+            return response["content"].strip()
+        else:
+            raise Exception(f"Failed to generate query: {response.get('error')}")
+    
+    def _pandas_code_messages(self, user_input: str, log_types: List[str]) -> list:
         # Create schema description for LLM
         schema_desc = ""
         for log_type in log_types:
@@ -212,8 +432,18 @@ Return ONLY the pandas code, no markdown, no explanations."""
             {"role": "system", "content": system_prompt.format(user_input=user_input)}
         ]
         
-        response = llm_provider.query(messages, temperature=0.1, max_tokens=500)
-        
+        return messages
+    
+    def _generate_pandas_code(self, user_input: str, log_types: List[str]) -> str:
+        """Generate pandas code to filter log data"""
+        response = llm_provider.query(self._pandas_code_messages(user_input, log_types), temperature=0.1, max_tokens=500)
+        return self._parse_pandas_code(response)
+    
+    async def _agenerate_pandas_code(self, user_input: str, log_types: List[str]) -> str:
+        response = await llm_provider.aquery(self._pandas_code_messages(user_input, log_types), temperature=0.1, max_tokens=500)
+        return self._parse_pandas_code(response)
+    
+    def _parse_pandas_code(self, response: Dict[str, Any]) -> str:
         if response.get("success"):
             content = response["content"].strip()
             # Remove markdown code blocks if present
@@ -226,24 +456,24 @@ Return ONLY the pandas code, no markdown, no explanations."""
         else:
             raise Exception(f"Failed to generate pandas code: {response.get('error')}")
     
-    def _execute_pandas_code(self, pandas_code: str, log_types: List[str], client_id: str) -> Dict[str, Any]:
+    def _execute_pandas_code(self, pandas_code: str, log_types: List[str], context: RequestDataContext) -> Dict[str, Any]:
         """Execute pandas code on log data"""
         
-        # Load log data into DataFrames
+        # Copy the request's DataFrames so generated code cannot modify the shared cache
         dataframes = {}
         for log_type in log_types:
-            log_data = log_fetcher.fetch_log_data(client_id, log_type)
-            if 'error' not in log_data and 'full_data' in log_data:
-                dataframes[log_type] = pd.DataFrame(log_data['full_data'])
-            else:
-                dataframes[log_type] = pd.DataFrame()
+            dataframes[log_type] = context.frame(log_type).copy()
         
         # Create local variables for pandas code
         locals_dict = dataframes.copy()
         
+        # Validate and compile once per distinct program/schema; repeats reuse the code object
+        schemas = {log_type: list(df.columns) for log_type, df in dataframes.items()}
+        program = code_cache.get_program(pandas_code, schemas)
+        
         # Execute pandas code
         try:
-            exec(pandas_code, globals(), locals_dict)
+            exec(program.code, code_cache.execution_globals({"pd": pd}), locals_dict)
         except Exception as e:
             print(f"[DEBUG] Pandas execution error: {e}")
             print(f"[DEBUG] Pandas code: {pandas_code}")
@@ -260,7 +490,7 @@ Return ONLY the pandas code, no markdown, no explanations."""
                 df = locals_dict[filtered_name]
                 if not df.empty:
                     results[log_type] = {
-                        'data': df.to_dict('records'),
+                        'data': ResultSet(df),
                         'count': len(df),
                         'columns': list(df.columns)
                     }
@@ -275,7 +505,7 @@ Return ONLY the pandas code, no markdown, no explanations."""
                 df = locals_dict[log_type]
                 if not df.empty:
                     results[log_type] = {
-                        'data': df.to_dict('records'),
+                        'data': ResultSet(df),
                         'count': len(df),
                         'columns': list(df.columns)
                     }
@@ -294,10 +524,22 @@ Return ONLY the pandas code, no markdown, no explanations."""
         
         return results
     
-    def _fallback_text_search(self, user_input: str, log_types: List[str], client_id: str) -> Dict[str, Any]:
+    @traced("agent.fallback_search")
+    def _fallback_text_search(self, user_input: str, log_types: List[str], context: RequestDataContext) -> Dict[str, Any]:
         """Fallback to text search when pandas code fails"""
         
         # Ask LLM for search keywords
+        response = llm_provider.query(self._keywords_messages(user_input), temperature=0.1, max_tokens=100)
+        keywords = self._parse_keywords(response)
+        
+        return self._text_search(keywords, log_types, context)
+    
+    @traced("agent.keywords")
+    async def _agenerate_search_keywords(self, user_input: str) -> List[str]:
+        response = await llm_provider.aquery(self._keywords_messages(user_input), temperature=0.1, max_tokens=100)
+        return self._parse_keywords(response)
+    
+    def _keywords_messages(self, user_input: str) -> list:
         system_prompt = """The user wants to search log data but pandas code execution failed. 
 Generate 2-4 simple keywords to search for in the log data.
 
@@ -310,8 +552,9 @@ Example: ["error", "failed", "login"]"""
             {"role": "system", "content": system_prompt.format(user_input=user_input)}
         ]
         
-        response = llm_provider.query(messages, temperature=0.1, max_tokens=100)
-        
+        return messages
+    
+    def _parse_keywords(self, response: Dict[str, Any]) -> List[str]:
         if response.get("success"):
             try:
                 content = response["content"].strip()
@@ -326,22 +569,25 @@ Example: ["error", "failed", "login"]"""
         else:
             keywords = ["error", "failed"]  # Default keywords
         
+        return keywords
+    
+    @traced("agent.text_search")
+    def _text_search(self, keywords: List[str], log_types: List[str], context: RequestDataContext) -> Dict[str, Any]:
+        """Search log records for any of the keywords"""
+        span = current_span().set(keywords=keywords, log_types=log_types)
+        
         # Perform text search
         results = {}
         for log_type in log_types:
-            log_data = log_fetcher.fetch_log_data(client_id, log_type)
-            if 'error' not in log_data and 'full_data' in log_data:
-                # Simple text search
-                matching_records = []
-                for record in log_data['full_data']:
-                    record_text = ' '.join(str(v) for v in record.values()).lower()
-                    if any(keyword.lower() in record_text for keyword in keywords):
-                        matching_records.append(record)
+            dataset = context.dataset(log_type)
+            if dataset is not None:
+                # Columnar search over the dataset's cached, lowercased text index
+                matching_records = ResultSet(dataset.df, dataset.search(keywords))
                 
                 results[log_type] = {
                     'data': matching_records,
                     'count': len(matching_records),
-                    'columns': log_data.get('columns', [])
+                    'columns': dataset.columns
                 }
             else:
                 results[log_type] = {
@@ -349,10 +595,11 @@ Example: ["error", "failed", "login"]"""
                     'count': 0,
                     'columns': []
                 }
-            
-            return {
+        
+        span.set(rows=sum(len(logs.get('data', [])) for logs in results.values()))
+        return {
             "type": "query",
-            "message": f"Pandas execution failed. Performed text search with keywords: {keywords}. Found {sum(len(logs.get('data', [])) for logs in results.values())} matching records.",
+            "message": f"Query execution failed. Performed text search with keywords: {keywords}. Found {sum(len(logs.get('data', [])) for logs in results.values())} matching records.",
             "logs": results
         }
 
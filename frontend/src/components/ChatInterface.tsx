@@ -19,7 +19,7 @@ import {
   CardContent,
 } from '@mui/material';
 import { Send, Bot, User, Shield, AlertTriangle, Users, Globe, Activity } from 'lucide-react';
-import apiService, { Client, SecurityInsights } from '../services/api';
+import apiService, { ChatStreamEvent, Client, LogData, SecurityInsights } from '../services/api';
 import { useAuth } from '../contexts/AuthContext';
 
 interface Message {
@@ -97,7 +97,7 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ onLogsReceived }) => {
     setIsLoading(true);
     setError(null);
 
-    // Add a loading message
+    // Add a loading message; stream events update it in place
     const loadingMessage: Message = {
       id: (Date.now() + 1).toString(),
       text: 'Analyzing logs and generating response...',
@@ -107,131 +107,122 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ onLogsReceived }) => {
     };
     setMessages(prev => [...prev, loadingMessage]);
 
-    try {
-      // Include authentication token in the request
-      const token = user?.session_token;
-      const response = await apiService.sendChatMessage(inputValue, selectedClient, token);
-      
-            if (response) {
-        console.log('Chat response:', response); // Debug log
-        
-        // Handle the new structured response format
-        let messageText = '';
-        let isError = false;
-        let securityInsights: SecurityInsights | null = null;
-        
-        // Check for error responses
-        if (response.error) {
-          isError = true;
-          const provider = response.provider || 'unknown';
-          const details = response.details ? ` (${response.details})` : '';
-          messageText = `[${provider.toUpperCase()}] Error: ${response.error}${details}`;
-        }
-        // Check for new structured response format
-        else if (response.response) {
-          messageText = response.response;
-          
-          // Handle logs data if present
-          if (response.logs) {
-            console.log('Logs data received:', response.logs);
-            // Pass logs data to parent component
-            if (onLogsReceived) {
-              onLogsReceived(response.logs);
-            }
-          }
-          
-          // Handle security insights if present
-          if (response.insights) {
-            console.log('Security insights received:', response.insights);
-            securityInsights = response.insights;
-          }
-          
-          // Handle security alerts if present
-          if (response.security_alert) {
-            messageText += `\n\n🚨 ${response.security_alert}`;
-          }
-          
-          if (response.suspicious_activity) {
-            messageText += `\n\n⚠️ ${response.suspicious_activity}`;
-          }
-          
-          // Handle SQL query info if present
-          if (response.sql_query) {
-            console.log('SQL query executed:', response.sql_query);
-            messageText += `\n\nSQL Query: ${response.sql_query}`;
+    const updateBotMessage = (update: Partial<Message>) => {
+      setMessages(prev => prev.map(msg =>
+        msg.id === loadingMessage.id ? { ...msg, ...update } : msg
+      ));
+    };
+
+    // Rows arrive one result_page at a time; the table is refreshed when each
+    // log type's first page lands and once more when the stream is done
+    const logs: { [logType: string]: LogData } = {};
+    const publishLogs = () => {
+      if (onLogsReceived && Object.keys(logs).length > 0) {
+        onLogsReceived(Object.fromEntries(Object.entries(logs).map(([logType, logData]) => [
+          logType,
+          { ...logData, sample_data: logData.full_data.slice(0, 10), full_data: logData.full_data.slice() }
+        ])));
+      }
+    };
+
+    const stream = { text: '', error: null as string | null, done: false };
+
+    const handleEvent = ({ event, data }: ChatStreamEvent) => {
+      switch (event) {
+        case 'stage':
+          if (data.stage === 'classified') {
+            updateBotMessage({ text: data.type === 'query' ? 'Choosing which logs to search...' : 'Thinking...' });
+          } else if (data.stage === 'log_types') {
+            updateBotMessage({ text: `Searching ${data.log_types.join(', ')}...` });
+          } else if (data.stage === 'rows_found') {
+            const total = Object.values(data.counts as { [logType: string]: number }).reduce((sum, count) => sum + count, 0);
+            Object.entries(data.counts as { [logType: string]: number }).forEach(([logType, count]) => {
+              logs[logType] = {
+                client: selectedClient,
+                log_type: logType,
+                total_entries: count,
+                columns: [],
+                sample_data: [],
+                full_data: [],
+                url: `converted_from_${logType}`
+              };
+            });
+            updateBotMessage({ text: `Found ${total} matching rows, loading results...` });
           }
-        }
-        // Check for legacy response format
-        else if (response.response) {
-          // Handle case where response.response might be an object
-          if (typeof response.response === 'string') {
-            messageText = response.response;
-          } else if (typeof response.response === 'object') {
-            // If response.response is an object, try to extract meaningful content
-            const responseObj = response.response as any;
-            if (responseObj.error) {
-              isError = true;
-              messageText = `Error: ${responseObj.error}`;
-            } else if (responseObj.content) {
-              messageText = responseObj.content;
-            } else {
-              messageText = JSON.stringify(responseObj, null, 2);
+          break;
+        case 'token':
+          stream.text += data.text;
+          updateBotMessage({ text: stream.text });
+          break;
+        case 'result_page': {
+          const logData = logs[data.log_type];
+          if (logData) {
+            logData.columns = data.columns;
+            logData.full_data.push(...data.rows);
+            if (data.page === 0) {
+              publishLogs();
             }
-          } else {
-            messageText = String(response.response);
           }
+          break;
         }
-        // Handle other response formats
-        else {
-          messageText = typeof response === 'string' ? response : JSON.stringify(response, null, 2);
-        }
-        
-        // Ensure messageText is a string and not too long
-        if (typeof messageText !== 'string') {
-          messageText = String(messageText);
-        }
-        
-        // Truncate very long messages
-        if (messageText.length > 5000) {
-          messageText = messageText.substring(0, 5000) + '\n\n[Message truncated...]';
-        }
-        
-        console.log('Final message text:', messageText); // Debug log
-        
-        // Replace the loading message with the actual response
-        setMessages(prev => prev.map(msg => 
-          msg.isLoading ? {
-            ...msg,
-            text: messageText,
-            isLoading: false,
-            securityInsights: securityInsights
-          } : msg
-        ));
-        
-        if (isError) {
-          setError(`AI Error: ${response.error}`);
-        }
-      } else {
+        case 'done':
+          stream.done = true;
+          stream.text = data.message;
+          if (data.type === 'error') {
+            stream.error = data.message;
+          }
+          if (data.query_id) {
+            Object.values(logs).forEach(logData => { logData.query_id = data.query_id; });
+          }
+          break;
+        case 'error':
+          stream.error = data.error;
+          break;
+      }
+    };
+
+    try {
+      // Include authentication token in the request
+      const token = user?.session_token;
+      const ok = await apiService.streamChatMessage(inputValue, handleEvent, selectedClient, token);
+
+      if (!ok && !stream.done && !stream.error) {
         // Replace loading message with error
-        setMessages(prev => prev.map(msg => 
-          msg.isLoading ? {
-            ...msg,
-            text: 'I apologize, but I\'m having trouble connecting to the backend. Please check if the backend server is running and try again.',
-            isLoading: false
-          } : msg
-        ));
+        updateBotMessage({
+          text: 'I apologize, but I\'m having trouble connecting to the backend. Please check if the backend server is running and try again.',
+          isLoading: false
+        });
         setError('Failed to get response from AI backend');
+        return;
+      }
+
+      publishLogs();
+
+      let messageText = stream.text;
+      if (stream.error && !stream.done) {
+        messageText = `Error: ${stream.error}`;
+      } else if (!stream.done) {
+        messageText = messageText || 'The response ended before it was complete.';
+      }
+
+      // Truncate very long messages
+      if (messageText.length > 5000) {
+        messageText = messageText.substring(0, 5000) + '\n\n[Message truncated...]';
+      }
+
+      // Replace the loading message with the final response
+      updateBotMessage({ text: messageText, isLoading: false });
+
+      if (stream.error) {
+        setError(`AI Error: ${stream.error}`);
       }
     } catch (error) {
       console.error('Chat error:', error);
       // Replace loading message with error
-      setMessages(prev => prev.map(msg => 
-        msg.isLoading ? {
-          ...msg,
-          text: 'I\'m experiencing technical difficulties. Please check your connection and try again.',
-          isLoading: false
-        } : msg
-      ));
+      updateBotMessage({
+        text: 'I\'m experiencing technical difficulties. Please check your connection and try again.',
+        isLoading: false
+      });
       setError('Failed to send message to backend');
     } finally {
       setIsLoading(false);
@@ -239,6 +239,22 @@ const LogTable: React.FC<LogTableProps> = ({ logsData }) => {
     fetchLogs();
   };
 
+  // Exports stream from the server, so large result sets never pass through the browser as JSON
+  const handleExport = () => {
+    let url: string | null = null;
+    if (selectedSource === 'AI') {
+      const queryId = Object.values(logsData || {}).map((data: any) => data?.query_id).find(Boolean);
+      if (queryId) {
+        url = apiService.getQueryExportUrl(queryId, 'ndjson');
+      }
+    } else if (selectedSource !== 'all') {
+      url = apiService.getExportUrl(selectedClient, selectedSource, 'csv', searchTerm);
+    }
+    if (url) {
+      window.open(url, '_blank');
+    }
+  };
+
   const renderLogRow = (log: LogEntry, index: number) => {
     const columns = logData?.columns || [];
     
@@ -335,7 +351,7 @@ const LogTable: React.FC<LogTableProps> = ({ logsData }) => {
             </IconButton>
           </Tooltip>
           <Tooltip title="Export logs">
-            <IconButton size="small">
+            <IconButton size="small" onClick={handleExport}>
               <Download />
             </IconButton>
           </Tooltip>
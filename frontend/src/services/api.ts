@@ -5,6 +5,26 @@ import config from '../config';
 // Centralized API base URL from config
 const API_BASE_URL = config.apiBaseUrl;
 
+// Ask for the compact "columns + rows" shape for bulk responses (plain JSON still accepted)
+const COLUMNAR_ACCEPT = 'application/vnd.traceagent.columnar+json, application/json;q=0.9';
+
+// Expand columnar tables ({columns, rows}) back into arrays of records
+function expandColumnar(value: any): any {
+  if (Array.isArray(value)) {
+    return value.map(expandColumnar);
+  }
+  if (value && typeof value === 'object') {
+    const keys = Object.keys(value);
+    if (keys.length === 2 && Array.isArray(value.columns) && Array.isArray(value.rows)) {
+      return value.rows.map((row: any[]) =>
+        Object.fromEntries(value.columns.map((column: string, i: number) => [column, row[i]]))
+      );
+    }
+    return Object.fromEntries(keys.map((key) => [key, expandColumnar(value[key])]));
+  }
+  return value;
+}
+
 export interface LogEntry {
   [key: string]: string | number;
 }
@@ -17,8 +37,11 @@ export interface LogData {
   sample_data: LogEntry[];
   full_data: LogEntry[];
   url: string;
+  query_id?: string; // Set on chat query results; see getQueryExportUrl
 }
 
+export type ExportFormat = 'csv' | 'ndjson' | 'arrow';
+
 export interface ChatMessage {
   message: string;
   client_id?: string;
@@ -33,6 +56,7 @@ export interface ChatResponse {
   // New fields for enhanced responses
   message?: string; // For new response format
   logs?: { [logType: string]: LogData };
+  query_id?: string;
   insights?: SecurityInsights;
   correlations?: SecurityCorrelations;
   security_alert?: string;
@@ -46,6 +70,13 @@ export interface ChatResponse {
   processed?: boolean;
 }
 
+export type ChatStreamEventType = 'stage' | 'token' | 'result_page' | 'done' | 'error';
+
+export interface ChatStreamEvent {
+  event: ChatStreamEventType;
+  data: any;
+}
+
 export interface SecurityInsights {
   total_events: number;
   security_events: number;
@@ -156,12 +187,12 @@ class ApiService {
         url += `?${params.toString()}`;
       }
 
-      const response = await fetch(url);
+      const response = await fetch(url, { headers: { Accept: COLUMNAR_ACCEPT } });
       if (!response.ok) {
         throw new Error(`HTTP ${response.status}: ${response.statusText}`);
       }
 
-      const data = await response.json();
+      const data = expandColumnar(await response.json());
       
       if (data.error) {
         console.error('Log fetch error:', data.error);
@@ -175,6 +206,24 @@ class ApiService {
     }
   }
 
+  // Download URL streaming a client's logs (same filters as getLogs)
+  getExportUrl(clientId: string, logType: string, format: ExportFormat = 'csv', searchQuery?: string): string {
+    const params = new URLSearchParams({ format });
+    if (searchQuery) {
+      params.append('search', searchQuery);
+    }
+    return `${this.baseUrl}/logs/${clientId}/${logType}/export?${params.toString()}`;
+  }
+
+  // Download URL streaming the results of an executed chat query
+  getQueryExportUrl(queryId: string, format: ExportFormat = 'ndjson', logType?: string): string {
+    const params = new URLSearchParams({ format });
+    if (logType) {
+      params.append('log_type', logType);
+    }
+    return `${this.baseUrl}/logs/query/${queryId}/export?${params.toString()}`;
+  }
+
   // Send chat message to AI
   async sendChatMessage(message: string, clientId: string = 'maze_bank', sessionToken?: string): Promise<ChatResponse | null> {
     try {
@@ -188,6 +237,7 @@ class ApiService {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          Accept: COLUMNAR_ACCEPT,
         },
         body: JSON.stringify(payload),
       });
@@ -196,7 +246,7 @@ class ApiService {
         throw new Error(`HTTP ${response.status}: ${response.statusText}`);
       }
 
-      const data = await response.json();
+      const data = expandColumnar(await response.json());
       return data;
     } catch (error) {
       console.error('Failed to send chat message:', error);
@@ -204,6 +254,73 @@ class ApiService {
     }
   }
 
+  // Stream a chat response over Server-Sent Events, invoking onEvent per event
+  async streamChatMessage(
+    message: string,
+    onEvent: (event: ChatStreamEvent) => void,
+    clientId: string = 'maze_bank',
+    sessionToken?: string
+  ): Promise<boolean> {
+    try {
+      const payload: ChatMessage = {
+        message,
+        client_id: clientId,
+        session_token: sessionToken
+      };
+
+      const response = await fetch(`${this.baseUrl}/chat/stream`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Accept': 'text/event-stream',
+        },
+        body: JSON.stringify(payload),
+      });
+
+      if (!response.ok || !response.body) {
+        throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+
+        // SSE frames are separated by a blank line
+        let boundary = buffer.indexOf('\n\n');
+        while (boundary !== -1) {
+          const frame = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+
+          let eventType = 'message';
+          let data = '';
+          for (const line of frame.split('\n')) {
+            if (line.startsWith('event:')) {
+              eventType = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+              data += line.slice(5).trim();
+            }
+          }
+
+          if (data) {
+            onEvent({ event: eventType as ChatStreamEventType, data: JSON.parse(data) });
+          }
+          boundary = buffer.indexOf('\n\n');
+        }
+      }
+
+      return true;
+    } catch (error) {
+      console.error('Failed to stream chat message:', error);
+      return false;
+    }
+  }
+
   // Get all logs for admin view
   async getAllLogs(): Promise<any> {
     try {